@@ -26,8 +26,8 @@ from mkroesti.registry import ProviderRegistry
 
 
 # Feed these modules to clients that say "from mkroesti import *"
-__all__ = (["algorithm", "errorhandling", "factory", "main", "names",
-            "provider", "registry"])
+__all__ = (["algorithm", "cache", "conversion", "csvhash", "digestindex", "errorhandling", "execution", "factory", "identify",
+            "main", "names", "passwd", "provider", "registry", "sqlitestore", "stdioserver"])
 
 
 # The package version; this is used by "mkroesti --version"
@@ -41,6 +41,10 @@ url = "http://www.herzbube.ch/mkroesti"
 (major, minor, micro, releaselevel, serial) = sys.version_info
 python2 = (major == 2)
 
+# mkroesti.aio uses the async/await syntax of Python 3.5
+if (major, minor) >= (3, 5):
+    __all__.insert(0, "aio")
+
 
 def registerProvider(provider):
     """Registers a single provider.
@@ -0,0 +1,121 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains coroutines that hash and verify without blocking an asyncio event
+loop. This module requires Python 3.5 or later.
+
+Calling getHash() of an algorithm object directly from a coroutine blocks the
+event loop until the hash has been generated, which takes a long time for
+large inputs and for expensive algorithms such as the crypt family. The
+coroutines in this module instead hand the work to an executor, and the event
+loop keeps running in the meantime.
+
+All coroutines have an executor parameter, which must be a
+concurrent.futures.Executor that executes callables in this process (e.g. a
+ThreadPoolExecutor). If executor is None, the event loop's default executor is
+used (see loop.set_default_executor()). Work whose estimated cost (see
+mkroesti.execution.estimateCost()) is less than
+mkroesti.execution.inlineCostThreshold is not handed to the executor, because
+this would take longer than doing the work directly.
+"""
+
+
+# PSL
+import asyncio
+
+# mkroesti
+from mkroesti import execution
+from mkroesti.algorithm import compareHashes
+
+
+async def getHash(algorithm, input, executor = None):
+    """Returns the hash that the given algorithm object generates for input.
+
+    The type of input is the same as for AlgorithmInterface.getHash().
+    """
+    return await run(executor, execution.estimateCost(algorithm, 1, len(input)), algorithm.getHash, input)
+
+
+async def verify(algorithm, input, storedHash, executor = None):
+    """Returns True if input hashes to storedHash, False if it does not.
+
+    Uses the algorithm object's verify() method if it has one (see
+    AlgorithmInterface.verify()), otherwise compares the result of getHash()
+    with storedHash.
+    """
+    algorithmVerify = getattr(algorithm, "verify", None)
+    if algorithmVerify is None:
+        return compareHashes(await getHash(algorithm, input, executor), storedHash)
+    return await run(executor, execution.estimateCost(algorithm, 1, len(input)), algorithmVerify, input, storedHash)
+
+
+async def hashStream(algorithms, chunks, executor = None):
+    """Hashes a stream of binary data with all algorithm objects.
+
+    chunks must be an asynchronous iterable (e.g. an async generator) that
+    yields the data piece by piece, as bytes. All algorithm objects must be
+    streamable (see mkroesti.execution.isStreamable()). Returns a list with
+    one hash for each algorithm object, in the same order as algorithms.
+
+    A chunk is hashed by the executor while the next chunk is being received,
+    so at most two chunks are held in memory. If the task that awaits this
+    coroutine is cancelled, hashing stops before the next chunk; a chunk that
+    is already being hashed by the executor is hashed to the end, but its
+    result is discarded.
+    """
+    hashObjects = execution.createHashObjects(algorithms)
+    pending = None
+    try:
+        async for chunk in chunks:
+            if pending is not None:
+                await pending
+            cost = sum([execution.estimateCost(algorithm, 0, len(chunk)) for algorithm in algorithms])
+            if cost < execution.inlineCostThreshold:
+                updateHashObjects(hashObjects, chunk)
+                pending = None
+                # Give the event loop a chance to deliver a cancellation, even
+                # if chunks never suspends
+                await asyncio.sleep(0)
+            else:
+                pending = asyncio.ensure_future(run(executor, cost, updateHashObjects, hashObjects, chunk))
+        if pending is not None:
+            await pending
+            pending = None
+    finally:
+        if pending is not None:
+            pending.cancel()
+    return [hashObject.hexdigest() for hashObject in hashObjects]
+
+
+def updateHashObjects(hashObjects, chunk):
+    """Feeds chunk into all hash objects. Used by hashStream()."""
+    for hashObject in hashObjects:
+        hashObject.update(chunk)
+
+
+async def run(executor, cost, function, *args):
+    """Returns the result of calling function with args. function is called
+    by the executor, unless cost (in milliseconds) is below
+    mkroesti.execution.inlineCostThreshold.
+    """
+    if cost < execution.inlineCostThreshold:
+        return function(*args)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, function, *args)
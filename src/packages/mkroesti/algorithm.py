@@ -31,15 +31,22 @@ AbstractAlgorithm derives from AlgorithmInterface. It is a base class that
 concrete algorithm classes may inherit from. It requires that algorithm name
 and provider be specified on construction, which allows it to implement
 getters for these attributes.
+
+AlgorithmMetadata describes performance-related traits of an algorithm object
+(see AlgorithmInterface.getMetadata()).
 """
 
 
 # PSL
 import base64
+import binascii
 import crypt
+import functools
 import hashlib
+import hmac
 from random import randint
 import string
+import struct
 import sys
 import zlib
 
@@ -65,11 +72,53 @@ try:
     availableModules.append("aprmd5")
 except ImportError:
     pass
+try:
+    import numpy
+    availableModules.append("numpy")
+    base32Alphabet = numpy.frombuffer(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567", dtype = numpy.uint8)
+except ImportError:
+    pass
 
 # mkroesti
 from mkroesti.names import * #@UnusedWildImport
 import mkroesti   # import stuff from __init__.py (e.g. mkroesti.python2)
-from mkroesti.errorhandling import ConversionError
+from mkroesti.errorhandling import ConversionError, MKRoestiError, UnknownAlgorithmError
+
+
+class AlgorithmMetadata:
+    """Describes performance-related traits of an algorithm object.
+
+    Clients (e.g. caches or schedulers) use the metadata to decide how to
+    treat an algorithm object, without having to know algorithm names. The
+    attributes are:
+    - costEstimate: The estimated time in milliseconds that it takes to hash a
+      short input (e.g. a password). For algorithms that process their input
+      block by block, the time grows with the size of the input.
+    - isDeterministic: True if getHash() always returns the same hash for the
+      same input, False if it does not (e.g. because the algorithm is salted).
+    - isStreamable: True if the algorithm can process its input piece by piece
+      (e.g. while a file is being read), False if it requires the entire input
+      at once. A streamable algorithm object implements createHashObject(),
+      which returns an object with the methods update(), copy(), digest() and
+      hexdigest(), like a hash object of the module hashlib.
+    - releasesGil: True if the algorithm lets other Python threads run while it
+      is working, at least for large inputs. Only such algorithms get faster
+      if they are executed by several threads instead of several processes.
+
+    The cost estimates of the algorithm classes in this module were measured
+    on a 64-bit Linux system. They are meant to tell cheap and expensive
+    algorithms apart, not to predict exact timings.
+    """
+
+    # Used for algorithm objects that do not know better. High enough that
+    # an unknown algorithm is not mistaken for a cheap one.
+    defaultCostEstimate = 1.0
+
+    def __init__(self, costEstimate, isDeterministic, isStreamable = False, releasesGil = False):
+        self.costEstimate = costEstimate
+        self.isDeterministic = isDeterministic
+        self.isStreamable = isStreamable
+        self.releasesGil = releasesGil
 
 
 class AlgorithmInterface:
@@ -109,6 +158,53 @@ class AlgorithmInterface:
         """
         raise NotImplementedError
 
+    def getHashes(self, inputs):
+        """Returns a list of strings that are the result of the algorithm
+        hashing each of the elements of the iterable inputs, in order.
+
+        The type of each input is the same as for getHash(). This method is
+        optional: Clients should use the module function getHashes(), which
+        falls back to calling getHash() for each input if an algorithm object
+        does not implement this method.
+
+        Implementations may override this to bind everything that does not
+        depend on the input (e.g. name dispatch, constructor lookup) only once
+        for the whole batch.
+        """
+        raise NotImplementedError
+
+    def getMetadata(self):
+        """Returns an AlgorithmMetadata object that describes the algorithm.
+
+        This method is optional: Clients should use the module function
+        getMetadata(), which falls back to isDeterministic() and to default
+        values if an algorithm object does not implement this method.
+        """
+        raise NotImplementedError
+
+    def isDeterministic(self):
+        """Returns True if getHash() always returns the same hash for the same
+        input, False if it does not (e.g. because the algorithm is salted).
+
+        Clients may use this to decide whether a hash can be reused instead of
+        being generated again. The result must be the same as the attribute
+        isDeterministic of the object returned by getMetadata().
+        """
+        raise NotImplementedError
+
+    def verify(self, input, storedHash):
+        """Returns True if input hashes to storedHash, False if it does not.
+
+        The type of input is the same as for getHash(). storedHash is a hash
+        previously returned by getHash(), either as a string or as binary data.
+
+        For salted algorithms (e.g. the crypt family) it is not possible to
+        simply compare the result of getHash() with storedHash, because
+        getHash() generates a new random salt on every call. These algorithms
+        must parse the salt and any other parameters from storedHash instead.
+        """
+        raise NotImplementedError
+
 
 class AbstractAlgorithm(AlgorithmInterface):
     """Abstract base class that implements common features of algorithm classes."""
@@ -125,6 +221,86 @@ class AbstractAlgorithm(AlgorithmInterface):
         """This default implementation returns the provider specified on construction."""
         return self.provider
 
+    def getHashes(self, inputs):
+        """This default implementation calls getHash() for each input."""
+        return [self.getHash(input) for input in inputs]
+
+    def getMetadata(self):
+        """This default implementation describes an algorithm that is neither
+        deterministic nor streamable, does not release the GIL, and has the
+        cost AlgorithmMetadata.defaultCostEstimate. These are the safe choices
+        for algorithms that do not know better.
+        """
+        return AlgorithmMetadata(AlgorithmMetadata.defaultCostEstimate, False)
+
+    def isDeterministic(self):
+        """This default implementation returns the isDeterministic attribute
+        of getMetadata(). Subclasses should override getMetadata() instead of
+        this method.
+        """
+        return self.getMetadata().isDeterministic
+
+    def verify(self, input, storedHash):
+        """This default implementation compares the result of getHash() with
+        storedHash. Salted algorithms must override this.
+        """
+        return compareHashes(self.getHash(input), storedHash)
+
+
+def getHashes(algorithm, inputs):
+    """Returns a list with the hashes of all elements of the iterable inputs,
+    generated by the given algorithm object.
+
+    Uses the algorithm object's getHashes() method if it has one, otherwise
+    calls getHash() for each input.
+    """
+    # Materialize inputs so that the fallback can start over if the algorithm
+    # object's getHashes() turns out to be unimplemented
+    if not isinstance(inputs, list):
+        inputs = list(inputs)
+    algorithmGetHashes = getattr(algorithm, "getHashes", None)
+    if algorithmGetHashes is not None:
+        try:
+            return algorithmGetHashes(inputs)
+        except NotImplementedError:
+            pass
+    return [algorithm.getHash(input) for input in inputs]
+
+
+def getMetadata(algorithm):
+    """Returns an AlgorithmMetadata object that describes the given algorithm
+    object.
+
+    Uses the algorithm object's getMetadata() method if it has one. Otherwise
+    the metadata is assembled from the algorithm object's isDeterministic()
+    method (if it has one) and the defaults of AbstractAlgorithm.getMetadata().
+    """
+    algorithmGetMetadata = getattr(algorithm, "getMetadata", None)
+    if algorithmGetMetadata is not None:
+        try:
+            return algorithmGetMetadata()
+        except NotImplementedError:
+            pass
+    isDeterministic = getattr(algorithm, "isDeterministic", None)
+    return AlgorithmMetadata(AlgorithmMetadata.defaultCostEstimate,
+                             isDeterministic is not None and isDeterministic())
+
+
+def compareHashes(hash1, hash2):
+    """Returns True if the two hashes are equal.
+
+    Each hash may be either a string or binary data. The comparison takes the
+    same time regardless of how many characters match, which prevents timing
+    attacks when a password is verified.
+    """
+    if hash1 is None or hash2 is None:
+        return False
+    if type(hash1) is not bytes:
+        hash1 = hash1.encode("utf-8")
+    if type(hash2) is not bytes:
+        hash2 = hash2.encode("utf-8")
+    return hmac.compare_digest(hash1, hash2)
+
 
 class HashlibAlgorithms(AbstractAlgorithm):
     """Implements all algorithms available from the Python Standard Library
@@ -166,28 +342,65 @@ class HashlibAlgorithms(AbstractAlgorithm):
     def needBytesInput(self):
         return True
 
+    def getMetadata(self):
+        # hashlib releases the GIL for inputs larger than 2 KiB
+        return AlgorithmMetadata(0.002, True, isStreamable = True, releasesGil = True)
+
     def getHash(self, input):
+        algorithm = self.createHashObject()
+        if algorithm is None:
+            return AbstractAlgorithm.getHash(self, input)
+        algorithm.update(input)
+        return algorithm.hexdigest()
+
+    def getHashes(self, inputs):
+        hashConstructor = self.getHashConstructor()
+        if hashConstructor is None:
+            return AbstractAlgorithm.getHashes(self, inputs)
+        return [hashConstructor(input).hexdigest() for input in inputs]
+
+    def createHashObject(self):
+        """Returns a new hashlib hash object for this algorithm, or None if
+        hashlib does not know the algorithm.
+        """
+        hashConstructor = self.getHashConstructor()
+        if hashConstructor is None:
+            return None
+        return hashConstructor()
+
+    def getBlockSize(self):
+        """Returns the internal block size in bytes of this algorithm, or None
+        if hashlib does not know the algorithm.
+        """
+        algorithm = self.createHashObject()
+        if algorithm is None:
+            return None
+        return algorithm.block_size
+
+    def getHashConstructor(self):
+        """Returns a function that creates a new hashlib hash object for this
+        algorithm, or None if hashlib does not know the algorithm. The function
+        optionally accepts the initial data to hash.
+        """
         algorithmName = self.getName()
         if ALGORITHM_MD5 == algorithmName:
-            algorithm = hashlib.md5()
+            return hashlib.md5
         elif ALGORITHM_SHA_1 == algorithmName:
-            algorithm = hashlib.sha1()
+            return hashlib.sha1
         elif ALGORITHM_SHA_224 == algorithmName:
-            algorithm = hashlib.sha224()
+            return hashlib.sha224
         elif ALGORITHM_SHA_256 == algorithmName:
-            algorithm = hashlib.sha256()
+            return hashlib.sha256
         elif ALGORITHM_SHA_384 == algorithmName:
-            algorithm = hashlib.sha384()
+            return hashlib.sha384
         elif ALGORITHM_SHA_512 == algorithmName:
-            algorithm = hashlib.sha512()
+            return hashlib.sha512
         else:
             opensslAlgorithmName = HashlibAlgorithms.mapAlgorithmName(algorithmName)
             if opensslAlgorithmName is not None:
-                algorithm = hashlib.new(opensslAlgorithmName)
+                return functools.partial(hashlib.new, opensslAlgorithmName)
             else:
-                return AbstractAlgorithm.getHash(self, input)
-        algorithm.update(input)
-        return algorithm.hexdigest()
+                return None
 
     @staticmethod
     def mapAlgorithmName(algorithmName):
@@ -214,6 +427,9 @@ class Base64Algorithms(AbstractAlgorithm):
     def needBytesInput(self):
         return True
 
+    def getMetadata(self):
+        return AlgorithmMetadata(0.0005, True)
+
     def getHash(self, input):
         algorithmName = self.getName()
         if ALGORITHM_BASE16 == algorithmName:
@@ -237,6 +453,79 @@ class Base64Algorithms(AbstractAlgorithm):
         else:
             return AbstractAlgorithm.getHash(self, input)
 
+    def getHashes(self, inputs):
+        if not isinstance(inputs, list):
+            inputs = list(inputs)
+        return self.encodeMany(inputs)
+
+    def encodeMany(self, inputs):
+        """Returns a list with the encoded form of each binary input in the
+        list inputs. The result is the same as calling getHash() for each
+        input, but much faster for large numbers of inputs.
+
+        base16 and base64 use the C implementations in the str/bytes types
+        and the binascii module directly. base32 is implemented in pure Python
+        by the base64 module, therefore if the third party module numpy is
+        available, all inputs are encoded in one pass with a lookup table, and
+        the result is then sliced into the individual encodings.
+        """
+        algorithmName = self.getName()
+        if ALGORITHM_BASE16 == algorithmName:
+            if mkroesti.python2:
+                return [binascii.hexlify(input).upper() for input in inputs]
+            else:
+                return [input.hex().upper() for input in inputs]
+        elif ALGORITHM_BASE32 == algorithmName:
+            if "numpy" in availableModules:
+                return Base64Algorithms.encodeManyBase32(inputs)
+            else:
+                return [self.getHash(input) for input in inputs]
+        elif ALGORITHM_BASE64 == algorithmName:
+            b2a_base64 = binascii.b2a_base64
+            if mkroesti.python2:
+                # Strip the newline that is always appended
+                return [b2a_base64(input)[:-1] for input in inputs]
+            else:
+                return [b2a_base64(input, newline = False).decode("ascii") for input in inputs]
+        else:
+            return [self.getHash(input) for input in inputs]
+
+    @staticmethod
+    def encodeManyBase32(inputs):
+        """Returns a list with the base32 encoding of each binary input in the
+        list inputs. Requires numpy.
+
+        Each input is padded with zero bytes to a multiple of 5 bytes (one
+        base32 group), then all groups of all inputs are encoded at once. The
+        zero padding only affects characters that are replaced by "=" when
+        the result is sliced.
+        """
+        zeroes = b"\0" * 5
+        padded = b"".join([input + zeroes[:-len(input) % 5] if len(input) % 5 else input for input in inputs])
+        groups = numpy.frombuffer(padded, dtype = numpy.uint8).reshape(-1, 5).astype(numpy.uint64)
+        values = (groups[:, 0] << 32) | (groups[:, 1] << 24) | (groups[:, 2] << 16) | (groups[:, 3] << 8) | groups[:, 4]
+        shifts = numpy.arange(35, -1, -5, dtype = numpy.uint64)
+        indexes = ((values[:, None] >> shifts) & 31).astype(numpy.uint8)
+        encoded = base32Alphabet[indexes].tobytes()
+        if not mkroesti.python2:
+            encoded = encoded.decode("ascii")
+        # Number of significant characters in the last group, indexed by the
+        # number of input bytes in that group
+        significantCharacters = (8, 2, 4, 5, 7)
+        results = []
+        start = 0
+        for input in inputs:
+            (numberOfGroups, remainder) = divmod(len(input), 5)
+            if remainder:
+                end = start + (numberOfGroups + 1) * 8
+                significantEnd = end - 8 + significantCharacters[remainder]
+                results.append(encoded[start:significantEnd] + "=" * (end - significantEnd))
+            else:
+                end = start + numberOfGroups * 8
+                results.append(encoded[start:end])
+            start = end
+        return results
+
 
 class ZlibAlgorithms(AbstractAlgorithm):
     """Implements all algorithms available from the Python Standard Library
@@ -249,6 +538,11 @@ class ZlibAlgorithms(AbstractAlgorithm):
     def needBytesInput(self):
         return True
 
+    def getMetadata(self):
+        # zlib releases the GIL for inputs larger than 5 KiB. A checksum can
+        # be continued with the next piece of input.
+        return AlgorithmMetadata(0.0005, True, isStreamable = True, releasesGil = True)
+
     def getHash(self, input):
         algorithmName = self.getName()
         if ALGORITHM_ADLER32 == algorithmName or ALGORITHM_CRC32B == algorithmName:
@@ -272,6 +566,118 @@ class ZlibAlgorithms(AbstractAlgorithm):
         else:
             return AbstractAlgorithm.getHash(self, input)
 
+    def getHashes(self, inputs):
+        checksumFunction = self.getChecksumFunction()
+        if checksumFunction is None:
+            return AbstractAlgorithm.getHashes(self, inputs)
+        # Python 2: See getHash() for details. The "%x" format does not add
+        # an "L" suffix.
+        return ["%x" % (checksumFunction(input) & 0xffffffff) for input in inputs]
+
+    def createHashObject(self):
+        """Returns a new ChecksumObject for this algorithm, or None if zlib
+        does not know the algorithm.
+        """
+        checksumFunction = self.getChecksumFunction()
+        if checksumFunction is None:
+            return None
+        return ChecksumObject(checksumFunction)
+
+    def getChecksumFunction(self):
+        """Returns the zlib function that implements this algorithm, or None
+        if zlib does not know the algorithm.
+        """
+        algorithmName = self.getName()
+        if ALGORITHM_ADLER32 == algorithmName:
+            return zlib.adler32
+        elif ALGORITHM_CRC32B == algorithmName:
+            return zlib.crc32
+        else:
+            return None
+
+    def getChecksums(self, buffer, offsets):
+        """Returns the checksums of many inputs that are packed into a single
+        buffer.
+
+        buffer contains the binary data of all inputs, one after the other.
+        offsets is a sequence (e.g. a list, or a numpy array) of n+1 integers
+        that delimit n inputs: input i is buffer[offsets[i]:offsets[i+1]].
+        packInputs() can be used to create both arguments.
+
+        If the third party module numpy is available, the result is a numpy
+        array of unsigned 32-bit integers, otherwise it is a list of integers.
+        Use formatChecksums() to convert the checksums into the same strings
+        that getHash() returns.
+
+        This is much faster than calling getHash() for each input, because the
+        checksum function is looked up only once, and result formatting is done
+        separately in bulk. The computation itself is done by zlib in a tight
+        loop; table-driven checksum kernels vectorized with numpy were tried,
+        but for short inputs they are not faster than zlib.
+        """
+        checksumFunction = self.getChecksumFunction()
+        if checksumFunction is None:
+            raise UnknownAlgorithmError(self.getName())
+        if "numpy" in availableModules and isinstance(offsets, numpy.ndarray):
+            offsets = offsets.tolist()
+        buffer = bytes(buffer)
+        checksums = [checksumFunction(buffer[start:end]) for (start, end) in zip(offsets, offsets[1:])]
+        if mkroesti.python2:
+            # See getHash() for details
+            checksums = [checksum & 0xffffffff for checksum in checksums]
+        if "numpy" in availableModules:
+            return numpy.array(checksums, dtype = numpy.uint32)
+        return checksums
+
+    @staticmethod
+    def packInputs(inputs):
+        """Returns a tuple (buffer, offsets) for a list of binary inputs, that
+        can be passed to getChecksums().
+        """
+        offsets = [0]
+        offset = 0
+        for input in inputs:
+            offset += len(input)
+            offsets.append(offset)
+        return (b"".join(inputs), offsets)
+
+    @staticmethod
+    def formatChecksums(checksums):
+        """Returns a list with the hexadecimal string representation of each
+        checksum, in the same format that getHash() returns.
+        """
+        if "numpy" in availableModules and isinstance(checksums, numpy.ndarray):
+            checksums = checksums.tolist()
+        return ["%x" % checksum for checksum in checksums]
+
+
+class ChecksumObject:
+    """Computes a zlib checksum piece by piece, with the same methods as a
+    hash object of the module hashlib.
+    """
+
+    def __init__(self, checksumFunction, value = None):
+        """Initialize with a zlib checksum function (e.g. zlib.crc32), and
+        optionally the value of a checksum that should be continued.
+        """
+        self.checksumFunction = checksumFunction
+        if value is None:
+            value = checksumFunction(b"")
+        self.value = value
+
+    def update(self, data):
+        self.value = self.checksumFunction(data, self.value)
+
+    def copy(self):
+        return ChecksumObject(self.checksumFunction, self.value)
+
+    def digest(self):
+        return struct.pack(">I", self.value & 0xffffffff)
+
+    def hexdigest(self):
+        # Python 2: See ZlibAlgorithms.getHash() for details
+        return "%x" % (self.value & 0xffffffff)
+
 
 class CryptAlgorithm(AbstractAlgorithm):
     """Implements all crypt-based algorithms that can be accessed using the
@@ -297,6 +703,13 @@ class CryptAlgorithm(AbstractAlgorithm):
 
     salt_chars = './' + string.ascii_letters + string.digits
     availableAlgorithms = None
+    # Milliseconds per hash with the default number of rounds of glibc
+    costEstimates = {
+        ALGORITHM_CRYPT_DES : 0.01,
+        ALGORITHM_CRYPT_MD5 : 0.2,
+        ALGORITHM_CRYPT_SHA_256 : 3.0,
+        ALGORITHM_CRYPT_SHA_512 : 2.5,
+        }
 
     @staticmethod
     def isAvailable(algorithmName):
@@ -345,6 +758,12 @@ class CryptAlgorithm(AbstractAlgorithm):
     def needBytesInput(self):
         return False
 
+    def getMetadata(self):
+        # crypt hashes are salted. crypt(3) is not thread-safe, so the crypt
+        # module does not release the GIL.
+        costEstimate = CryptAlgorithm.costEstimates.get(self.getName(), AlgorithmMetadata.defaultCostEstimate)
+        return AlgorithmMetadata(costEstimate, False)
+
     def getHash(self, input):
         algorithmName = self.getName()
         if ALGORITHM_CRYPT_DES == algorithmName:
@@ -374,10 +793,29 @@ class CryptAlgorithm(AbstractAlgorithm):
         else:
             return AbstractAlgorithm.getHash(self, input)
 
+    def verify(self, input, storedHash):
+        """Passes storedHash as the salt to crypt(3). crypt(3) extracts the
+        algorithm, the salt and any other parameters (e.g. the number of rounds)
+        from storedHash, so the result is equal to storedHash only if input is
+        correct.
+        """
+        if type(storedHash) is bytes and not mkroesti.python2:
+            storedHash = storedHash.decode("ascii")
+        try:
+            hash = crypt.crypt(input, storedHash)
+        except (ValueError, OSError):
+            # Python 3 raises OSError if crypt(3) rejects the salt
+            return False
+        return compareHashes(hash, storedHash)
+
 
 class CryptBlowfishAlgorithm(AbstractAlgorithm):
     """Implements the crypt-blowfish algorithm."""
 
+    # Milliseconds per hash with the cost factor 12 that bcrypt.gensalt()
+    # uses by default
+    costEstimate = 250.0
+
     @staticmethod
     def isAvailable():
         moduleName = "bcrypt"
@@ -390,12 +828,32 @@ class CryptBlowfishAlgorithm(AbstractAlgorithm):
     def needBytesInput(self):
         return True
 
+    def getMetadata(self):
+        # crypt hashes are salted. bcrypt releases the GIL while it works.
+        return AlgorithmMetadata(CryptBlowfishAlgorithm.costEstimate, False, releasesGil = True)
+
     def getHash(self, input):
         if ALGORITHM_CRYPT_BLOWFISH != self.getName():
             return AbstractAlgorithm.getHash(self, input)
         salt = bcrypt.gensalt()   # default value for log_rounds parameter = 12
         return bcrypt.hashpw(input, salt)
 
+    def verify(self, input, storedHash):
+        """Passes storedHash as the salt to bcrypt.hashpw(), which extracts
+        the salt and the cost factor from it.
+        """
+        if ALGORITHM_CRYPT_BLOWFISH != self.getName():
+            return AbstractAlgorithm.verify(self, input, storedHash)
+        # bcrypt requires that both arguments have the same type
+        if type(input) is bytes and type(storedHash) is not bytes:
+            storedHash = storedHash.encode("ascii")
+        try:
+            hash = bcrypt.hashpw(input, storedHash)
+        except ValueError:
+            # storedHash is not a valid bcrypt hash
+            return False
+        return compareHashes(hash, storedHash)
+
 
 class WindowsHashAlgorithms(AbstractAlgorithm):
     """Implements the windows-lm and windows-nt algorithms.
@@ -435,6 +893,9 @@ class WindowsHashAlgorithms(AbstractAlgorithm):
     def needBytesInput(self):
         return False
 
+    def getMetadata(self):
+        return AlgorithmMetadata(0.005, True)
+
     def getHash(self, input):
         algorithmName = self.getName()
         if ALGORITHM_WINDOWS_LM == algorithmName:
@@ -461,6 +922,33 @@ class WindowsHashAlgorithms(AbstractAlgorithm):
 class MHashAlgorithms(AbstractAlgorithm):
     """Implements all algorithms available from the third party module mhash."""
 
+    # Internal block sizes in bytes, as required by HMAC. mhash does not
+    # expose them.
+    blockSizes = {
+        ALGORITHM_MD2 : 16,
+        ALGORITHM_MD4 : 64,
+        ALGORITHM_MD5 : 64,
+        ALGORITHM_SHA_1 : 64,
+        ALGORITHM_SHA_224 : 64,
+        ALGORITHM_SHA_256 : 64,
+        ALGORITHM_SHA_384 : 128,
+        ALGORITHM_SHA_512 : 128,
+        ALGORITHM_RIPEMD_128 : 64,
+        ALGORITHM_RIPEMD_160 : 64,
+        ALGORITHM_RIPEMD_256 : 64,
+        ALGORITHM_RIPEMD_320 : 64,
+        ALGORITHM_HAVAL_128_3 : 128,
+        ALGORITHM_HAVAL_160_3 : 128,
+        ALGORITHM_HAVAL_192_3 : 128,
+        ALGORITHM_HAVAL_224_3 : 128,
+        ALGORITHM_HAVAL_256_3 : 128,
+        ALGORITHM_TIGER_128_3 : 64,
+        ALGORITHM_TIGER_160_3 : 64,
+        ALGORITHM_TIGER_192_3 : 64,
+        ALGORITHM_WHIRLPOOL : 64,
+        ALGORITHM_GOST : 32,
+        }
+
     @staticmethod
     def isAvailable():
         moduleName = "mhash"
@@ -473,14 +961,45 @@ class MHashAlgorithms(AbstractAlgorithm):
     def needBytesInput(self):
         return True
 
+    def getMetadata(self):
+        # mhash does not release the GIL
+        return AlgorithmMetadata(0.002, True, isStreamable = True)
+
     def getHash(self, input):
-        mhashAlgorithmName = MHashAlgorithms.mapAlgorithmName(self.getName())
-        if mhashAlgorithmName is None:
+        algorithm = self.createHashObject()
+        if algorithm is None:
             return AbstractAlgorithm.getHash(self, input)
-        algorithm = mhash.MHASH(mhashAlgorithmName)
         algorithm.update(input)
         return algorithm.hexdigest()
 
+    def getHashes(self, inputs):
+        mhashAlgorithmName = MHashAlgorithms.mapAlgorithmName(self.getName())
+        if mhashAlgorithmName is None:
+            return AbstractAlgorithm.getHashes(self, inputs)
+        hashConstructor = mhash.MHASH
+        hashes = list()
+        for input in inputs:
+            algorithm = hashConstructor(mhashAlgorithmName)
+            algorithm.update(input)
+            hashes.append(algorithm.hexdigest())
+        return hashes
+
+    def createHashObject(self):
+        """Returns a new mhash hash object for this algorithm, or None if
+        mhash does not know the algorithm.
+        """
+        mhashAlgorithmName = MHashAlgorithms.mapAlgorithmName(self.getName())
+        if mhashAlgorithmName is None:
+            return None
+        return mhash.MHASH(mhashAlgorithmName)
+
+    def getBlockSize(self):
+        """Returns the internal block size in bytes of this algorithm, or None
+        if the block size is not known (e.g. because the algorithm is a
+        checksum).
+        """
+        return MHashAlgorithms.blockSizes.get(self.getName())
+
     @staticmethod
     def mapAlgorithmName(algorithmName):
         """Maps an algorithm name defined by mkroesti into a name known by mhash."""
@@ -562,6 +1081,12 @@ class AprMD5Algorithms(AbstractAlgorithm):
         else:
             return AbstractAlgorithm.needBytesInput(self)
 
+    def getMetadata(self):
+        if ALGORITHM_CRYPT_APR1 == self.getName():
+            # crypt-apr1 is salted, and iterates MD5 1000 times
+            return AlgorithmMetadata(0.2, False)
+        return AlgorithmMetadata(0.002, True)
+
     def getHash(self, input):
         algorithmName = self.getName()
         if ALGORITHM_MD5 == algorithmName:
@@ -577,3 +1102,209 @@ class AprMD5Algorithms(AbstractAlgorithm):
         else:
             return AbstractAlgorithm.getHash(self, input)
 
+    def verify(self, input, storedHash):
+        """For crypt-apr1, extracts the salt from storedHash, which has the
+        format "$apr1$salt$hash".
+        """
+        if ALGORITHM_CRYPT_APR1 != self.getName():
+            return AbstractAlgorithm.verify(self, input, storedHash)
+        if type(storedHash) is bytes and not mkroesti.python2:
+            storedHash = storedHash.decode("ascii")
+        fields = storedHash.split("$")
+        if len(fields) != 4 or fields[0] != "" or fields[1] != "apr1":
+            return False
+        return compareHashes(aprmd5.md5_encode(input, fields[2]), storedHash)
+
+
+class HmacAlgorithm(AbstractAlgorithm):
+    """Generates keyed hashes (HMAC, RFC 2104) with the digest of another
+    algorithm object.
+
+    The wrapped algorithm object must implement createHashObject() and
+    getBlockSize(), as HashlibAlgorithms and MHashAlgorithms do. The hash
+    objects must implement update(), copy(), digest() and hexdigest().
+
+    The inner and outer pad states are computed once, when the HmacAlgorithm
+    object is created, by letting one hash object each absorb the padded key.
+    For each message, only copies of the two states are made, so the cost of
+    hashing a message does not include processing the key.
+
+    The name of an HmacAlgorithm object is the name of the wrapped algorithm,
+    prefixed with "hmac-". Because the name does not depend on the key, a
+    mkroesti.cache.HashCache must not be shared by HmacAlgorithm objects that
+    use different keys.
+    """
+
+    namePrefix = "hmac-"
+
+    @staticmethod
+    def isSupported(algorithm):
+        """Returns True if the given algorithm object can be used to generate
+        keyed hashes.
+        """
+        getBlockSize = getattr(algorithm, "getBlockSize", None)
+        if getBlockSize is None or getattr(algorithm, "createHashObject", None) is None:
+            return False
+        return getBlockSize() is not None
+
+    def __init__(self, algorithm, key):
+        """Initialize with the algorithm object whose digest should be used, and
+        the key (binary data).
+        """
+        if not HmacAlgorithm.isSupported(algorithm):
+            raise MKRoestiError("Algorithm cannot be used with a key: " + algorithm.getName())
+        AbstractAlgorithm.__init__(self, HmacAlgorithm.namePrefix + algorithm.getName(), algorithm.getProvider())
+        self.algorithm = algorithm
+        blockSize = algorithm.getBlockSize()
+        # Keys longer than the block size are hashed first
+        if len(key) > blockSize:
+            keyHash = algorithm.createHashObject()
+            keyHash.update(key)
+            key = keyHash.digest()
+        key = bytearray(key) + bytearray(blockSize - len(key))
+        self.innerState = algorithm.createHashObject()
+        self.innerState.update(bytes(bytearray([byte ^ 0x36 for byte in key])))
+        self.outerState = algorithm.createHashObject()
+        self.outerState.update(bytes(bytearray([byte ^ 0x5c for byte in key])))
+
+    def needBytesInput(self):
+        return True
+
+    def getMetadata(self):
+        # Two hash operations per input, like the wrapped algorithm object,
+        # which may process its input piece by piece
+        metadata = getMetadata(self.algorithm)
+        return AlgorithmMetadata(2 * metadata.costEstimate, True, isStreamable = True,
+                                 releasesGil = metadata.releasesGil)
+
+    def getHash(self, input):
+        innerHash = self.innerState.copy()
+        innerHash.update(input)
+        outerHash = self.outerState.copy()
+        outerHash.update(innerHash.digest())
+        return outerHash.hexdigest()
+
+    def createHashObject(self):
+        """Returns a new HmacHashObject that continues from the inner and
+        outer pad states.
+        """
+        return HmacHashObject(self.innerState.copy(), self.outerState)
+
+    def getHashes(self, inputs):
+        innerState = self.innerState
+        outerState = self.outerState
+        hashes = list()
+        for input in inputs:
+            innerHash = innerState.copy()
+            innerHash.update(input)
+            outerHash = outerState.copy()
+            outerHash.update(innerHash.digest())
+            hashes.append(outerHash.hexdigest())
+        return hashes
+
+
+class HmacHashObject:
+    """Computes a keyed hash piece by piece, with the same methods as a hash
+    object of the module hashlib. Created by HmacAlgorithm.createHashObject().
+    """
+
+    def __init__(self, innerHash, outerState):
+        """Initialize with the hash object that absorbs the message, and the
+        outer pad state. The outer pad state is never modified.
+        """
+        self.innerHash = innerHash
+        self.outerState = outerState
+
+    def update(self, data):
+        self.innerHash.update(data)
+
+    def copy(self):
+        return HmacHashObject(self.innerHash.copy(), self.outerState)
+
+    def digest(self):
+        return self.getOuterHash().digest()
+
+    def hexdigest(self):
+        return self.getOuterHash().hexdigest()
+
+    def getOuterHash(self):
+        outerHash = self.outerState.copy()
+        outerHash.update(self.innerHash.digest())
+        return outerHash
+
+
+class PrefixAlgorithm(AbstractAlgorithm):
+    """Hashes each input with a fixed prefix prepended, using another algorithm
+    object.
+
+    The result of getHash(input) is the same as the result of the wrapped
+    algorithm object's getHash(prefix + input). If the wrapped algorithm
+    object implements createHashObject() (as HashlibAlgorithms and
+    MHashAlgorithms do), the prefix is absorbed only once, when the
+    PrefixAlgorithm object is created, and the state is copied for each input.
+    Otherwise the prefix is prepended to each input.
+
+    The wrapped algorithm object must require binary input. The name and
+    provider of a PrefixAlgorithm object are the same as those of the wrapped
+    algorithm object, therefore a mkroesti.cache.HashCache must not be shared
+    by PrefixAlgorithm objects that use different prefixes, or by
+    PrefixAlgorithm objects and the algorithm objects they wrap.
+    """
+
+    @staticmethod
+    def isSupported(algorithm):
+        """Returns True if the given algorithm object can be used with a
+        prefix.
+        """
+        return algorithm.needBytesInput()
+
+    def __init__(self, algorithm, prefix):
+        """Initialize with the algorithm object that should be used, and the
+        prefix (binary data).
+        """
+        if not PrefixAlgorithm.isSupported(algorithm):
+            raise MKRoestiError("Algorithm cannot be used with a prefix: " + algorithm.getName())
+        AbstractAlgorithm.__init__(self, algorithm.getName(), algorithm.getProvider())
+        self.algorithm = algorithm
+        self.prefix = prefix
+        self.prefixState = None
+        createHashObject = getattr(algorithm, "createHashObject", None)
+        if createHashObject is not None:
+            self.prefixState = createHashObject()
+            if self.prefixState is not None:
+                self.prefixState.update(prefix)
+
+    def needBytesInput(self):
+        return True
+
+    def getMetadata(self):
+        # Copying the prefix state is cheap, so the wrapped algorithm object
+        # determines the traits
+        return getMetadata(self.algorithm)
+
+    def createHashObject(self):
+        """Returns a copy of the prefix state, or None if the wrapped
+        algorithm object cannot create hash objects.
+        """
+        if self.prefixState is None:
+            return None
+        return self.prefixState.copy()
+
+    def getHash(self, input):
+        if self.prefixState is None:
+            return self.algorithm.getHash(self.prefix + input)
+        algorithm = self.prefixState.copy()
+        algorithm.update(input)
+        return algorithm.hexdigest()
+
+    def getHashes(self, inputs):
+        prefix = self.prefix
+        prefixState = self.prefixState
+        if prefixState is None:
+            return getHashes(self.algorithm, [prefix + input for input in inputs])
+        hashes = list()
+        for input in inputs:
+            algorithm = prefixState.copy()
+            algorithm.update(input)
+            hashes.append(algorithm.hexdigest())
+        return hashes
@@ -0,0 +1,177 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains the HashCache class."""
+
+
+# PSL
+import collections
+import hashlib
+import threading
+
+# mkroesti
+from mkroesti.algorithm import getHashes, getMetadata
+
+
+class HashCache:
+    """Bounded cache that remembers hashes generated for recently seen inputs.
+
+    HashCache is useful for workloads with many repeated inputs (e.g. the
+    same tokens, or empty strings, appearing over and over again). Clients call
+    getHash() instead of calling the algorithm object's getHash() directly. If
+    the same algorithm object (more precisely: the same algorithm name from
+    the same provider) has already hashed the same input, the remembered hash
+    is returned without invoking the algorithm again.
+
+    Only algorithms that are deterministic (according to their metadata, see
+    mkroesti.algorithm.getMetadata()) are cached. Salted algorithms, and
+    algorithm objects that describe neither their metadata nor whether they
+    are deterministic, are always invoked.
+
+    Inputs up to shortInputLength bytes are remembered as they are. Longer
+    inputs are remembered only by their SHA-256 digest, so that the memory used
+    by the cache does not depend on the size of the inputs.
+
+    When the cache is full, the least recently used hash is discarded.
+
+    A HashCache object may be shared by several threads. Algorithms are
+    invoked without holding the lock that protects the cache, so threads do
+    not wait for each other while hashing.
+    """
+
+    defaultMaxSize = 10000
+    shortInputLength = 64
+
+    def __init__(self, maxSize = None):
+        """Initialize with the maximum number of hashes to remember."""
+        if maxSize is None:
+            maxSize = HashCache.defaultMaxSize
+        self.maxSize = maxSize
+        self.hashes = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def getHash(self, algorithm, input):
+        """Returns the same as algorithm.getHash(input), invoking the algorithm
+        only if the hash is not in the cache.
+        """
+        if not HashCache.isCacheable(algorithm):
+            return algorithm.getHash(input)
+        key = (algorithm.getName(), algorithm.getProvider(), HashCache.makeInputKey(input))
+        with self.lock:
+            if key in self.hashes:
+                # Re-insert to mark the entry as most recently used
+                hash = self.hashes.pop(key)
+                self.hashes[key] = hash
+                self.hits += 1
+                return hash
+            self.misses += 1
+        hash = algorithm.getHash(input)
+        self.remember(key, hash)
+        return hash
+
+    def getHashes(self, algorithm, inputs):
+        """Returns the same as mkroesti.algorithm.getHashes(algorithm,
+        inputs), invoking the algorithm only for inputs whose hash is not in
+        the cache.
+
+        All inputs that are not in the cache are hashed in a single batch. An
+        input that occurs more than once in the batch is hashed only once; its
+        repeated occurrences count as hits.
+        """
+        if not isinstance(inputs, list):
+            inputs = list(inputs)
+        if not HashCache.isCacheable(algorithm):
+            return getHashes(algorithm, inputs)
+        algorithmKey = (algorithm.getName(), algorithm.getProvider())
+        hashes = [None] * len(inputs)
+        # Key = cache key of a missing input, value = list of indexes at
+        # which the input occurs in the batch
+        missingIndexes = collections.OrderedDict()
+        keys = [algorithmKey + (HashCache.makeInputKey(input),) for input in inputs]
+        with self.lock:
+            for (index, key) in enumerate(keys):
+                if key in self.hashes:
+                    hash = self.hashes.pop(key)
+                    self.hashes[key] = hash
+                    self.hits += 1
+                    hashes[index] = hash
+                elif key in missingIndexes:
+                    self.hits += 1
+                    missingIndexes[key].append(index)
+                else:
+                    self.misses += 1
+                    missingIndexes[key] = [index]
+        if len(missingIndexes) > 0:
+            missingInputs = [inputs[indexes[0]] for indexes in missingIndexes.values()]
+            missingHashes = getHashes(algorithm, missingInputs)
+            for ((key, indexes), hash) in zip(missingIndexes.items(), missingHashes):
+                for index in indexes:
+                    hashes[index] = hash
+                self.remember(key, hash)
+        return hashes
+
+    def remember(self, key, hash):
+        """Adds hash to the cache, discarding the least recently used entry
+        if the cache is full.
+        """
+        if self.maxSize <= 0:
+            return
+        with self.lock:
+            if key in self.hashes:
+                # Another thread has hashed the same input in the meantime
+                del self.hashes[key]
+            elif len(self.hashes) >= self.maxSize:
+                self.hashes.popitem(last = False)
+            self.hashes[key] = hash
+
+    def getStatistics(self):
+        """Returns a tuple (hits, misses).
+
+        Calls to getHash() for algorithms that are not cacheable are counted
+        neither as hit nor as miss.
+        """
+        return (self.hits, self.misses)
+
+    def clear(self):
+        """Discards all remembered hashes. Statistics are not reset."""
+        with self.lock:
+            self.hashes.clear()
+
+    @staticmethod
+    def isCacheable(algorithm):
+        """Returns True if hashes generated by the given algorithm object may
+        be cached.
+        """
+        return getMetadata(algorithm).isDeterministic
+
+    @staticmethod
+    def makeInputKey(input):
+        """Returns a key that identifies input within the cache."""
+        if type(input) is bytes:
+            data = input
+        else:
+            # Lone surrogates may occur in command line arguments that cannot
+            # be decoded
+            data = input.encode("utf-8", "surrogatepass")
+        if len(data) <= HashCache.shortInputLength:
+            return (type(input), data)
+        return (type(input), len(data), hashlib.sha256(data).digest())
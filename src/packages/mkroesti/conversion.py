@@ -0,0 +1,78 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Functions that convert hash input between string and binary data.
+
+Algorithms declare via AlgorithmInterface.needBytesInput() which type of input
+they require. The functions in this module perform the conversion that is
+necessary to satisfy that requirement, using a character encoding specified by
+the caller. Conversion failures are reported by raising ConversionError.
+
+In Python 2.6 no conversion takes place because Python 2.6 has no binary data
+type that might require converting; the input is always returned unchanged.
+"""
+
+
+# mkroesti
+import mkroesti   # import stuff from __init__.py (e.g. mkroesti.python2)
+from mkroesti.errorhandling import ConversionError
+
+
+def toBytes(hashInput, encoding):
+    """Returns hashInput as binary data.
+
+    If hashInput already is binary data, it is returned unchanged. Otherwise it
+    is encoded using the given encoding.
+    """
+    if mkroesti.python2 or type(hashInput) is bytes:
+        return hashInput
+    try:
+        return hashInput.encode(encoding)
+    except UnicodeEncodeError:
+        # This happens, for instance, if we try to encode a character that does
+        # not exist in the encoding's target character set (e.g. "β" does not
+        # exist in "iso-8859-1")
+        raise ConversionError("Cannot convert input to binary data (the encoding used was '" + encoding + "')")
+
+
+def toStr(hashInput, encoding):
+    """Returns hashInput as string data.
+
+    If hashInput already is string data, it is returned unchanged. Otherwise it
+    is decoded using the given encoding.
+    """
+    if mkroesti.python2 or type(hashInput) is str:
+        return hashInput
+    try:
+        return hashInput.decode(encoding)
+    except UnicodeDecodeError:
+        # This happens, for instance, if we try to decode binary data, because
+        # no encoding can sensibly decode binary data
+        raise ConversionError("Cannot convert input to string data (the encoding used was '" + encoding + "')")
+
+
+def convertInput(hashInput, algorithm, encoding):
+    """Returns hashInput converted to the type that the given algorithm
+    requires (see AlgorithmInterface.needBytesInput()).
+    """
+    if algorithm.needBytesInput():
+        return toBytes(hashInput, encoding)
+    else:
+        return toStr(hashInput, encoding)
@@ -0,0 +1,160 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains the CsvColumnHasher class."""
+
+
+# PSL
+import csv
+import itertools
+
+# mkroesti
+from mkroesti.algorithm import getHashes
+from mkroesti.conversion import convertInput
+from mkroesti.errorhandling import MKRoestiError
+
+
+class CsvColumnHasher:
+    """Hashes selected columns of CSV data.
+
+    CsvColumnHasher reads CSV data row by row using the Python Standard Library
+    module csv, replaces the values of the selected columns with their hash (or
+    appends the hash as a new column), and writes the result. The first row of
+    the CSV data must be a header row that contains the column names.
+
+    Rows are processed in chunks of a configurable size: A chunk of rows is
+    read, all values of the chunk are hashed column by column and algorithm by
+    algorithm, then the chunk is written before the next chunk is read. Memory
+    usage is therefore bounded by the chunk size, regardless of how large the
+    CSV data is.
+
+    If the hashes replace the original values, exactly one algorithm object
+    must be specified. If the hashes are appended, one new column is appended
+    for each combination of selected column and algorithm, in that order. The
+    name of an appended column is the original column name, followed by a "-"
+    and the algorithm name.
+    """
+
+    defaultChunkSize = 1000
+
+    def __init__(self, algorithms, columnNames, append = False, encoding = None, chunkSize = None, delimiter = ",", cache = None):
+        """Initialize with a list of algorithm objects and a list of names of
+        the columns to hash.
+
+        encoding is used to convert column values if an algorithm requires
+        binary input. If cache is not None, it must be a
+        mkroesti.cache.HashCache object that is used to avoid hashing repeated
+        values more than once.
+        """
+        if len(algorithms) == 0:
+            raise MKRoestiError("Must provide at least 1 algorithm")
+        if len(columnNames) == 0:
+            raise MKRoestiError("Must provide at least 1 CSV column")
+        if not append and len(algorithms) > 1:
+            raise MKRoestiError("Exactly 1 algorithm is required to replace CSV column values, but " + str(len(algorithms)) + " were specified")
+        if chunkSize is None:
+            chunkSize = CsvColumnHasher.defaultChunkSize
+        if chunkSize < 1:
+            raise MKRoestiError("Chunk size must be greater than 0")
+        self.algorithms = algorithms[:]   # make a copy
+        self.columnNames = columnNames[:]   # make a copy
+        self.append = append
+        self.encoding = encoding
+        self.chunkSize = chunkSize
+        self.delimiter = delimiter
+        self.cache = cache
+
+    def process(self, inputFile, outputFile):
+        """Reads CSV data from inputFile and writes the result to outputFile.
+
+        Both arguments must be file objects in text mode. Returns the number of
+        data rows (i.e. excluding the header row) that were processed.
+        """
+        reader = csv.reader(inputFile, delimiter = self.delimiter)
+        writer = csv.writer(outputFile, delimiter = self.delimiter, lineterminator = "\n")
+        try:
+            header = next(reader)
+        except StopIteration:
+            # Empty input produces empty output
+            return 0
+        columnIndexes = list()
+        for columnName in self.columnNames:
+            if columnName not in header:
+                raise MKRoestiError("Unknown CSV column: " + columnName)
+            columnIndexes.append(header.index(columnName))
+        if self.append:
+            headerLength = len(header)
+            for columnName in self.columnNames:
+                for algorithm in self.algorithms:
+                    header.append(columnName + "-" + algorithm.getName())
+        writer.writerow(header)
+
+        rowCount = 0
+        while True:
+            chunk = list(itertools.islice(reader, self.chunkSize))
+            if len(chunk) == 0:
+                break
+            if self.append:
+                # Pad short rows so that the appended columns line up with
+                # the header
+                for row in chunk:
+                    if len(row) < headerLength:
+                        row.extend([""] * (headerLength - len(row)))
+            for columnIndex in columnIndexes:
+                values = [row[columnIndex] if columnIndex < len(row) else None for row in chunk]
+                for algorithm in self.algorithms:
+                    hashes = self.hashValues(algorithm, values)
+                    for (row, hash) in zip(chunk, hashes):
+                        if self.append:
+                            row.append(hash)
+                        elif hash is not None:
+                            row[columnIndex] = hash
+            writer.writerows(chunk)
+            rowCount += len(chunk)
+        return rowCount
+
+    def hashValues(self, algorithm, values):
+        """Returns a list with the hashes of the given column values.
+
+        Values that are None (i.e. the row is too short to have a value in the
+        column) produce an empty hash string in append mode, and None in
+        replace mode (which leaves the row unchanged).
+        """
+        if self.append:
+            missingHash = ""
+        else:
+            missingHash = None
+        # Hash all present values of the chunk in a single batch
+        inputs = [convertInput(value, algorithm, self.encoding) for value in values if value is not None]
+        if self.cache is None:
+            inputHashes = iter(getHashes(algorithm, inputs))
+        else:
+            inputHashes = iter(self.cache.getHashes(algorithm, inputs))
+        hashes = list()
+        for value in values:
+            if value is None:
+                hashes.append(missingHash)
+            else:
+                hash = next(inputHashes)
+                # Some algorithms (e.g. crypt-blowfish) return binary data
+                if type(hash) is bytes:
+                    hash = hash.decode("ascii")
+                hashes.append(hash)
+        return hashes
@@ -0,0 +1,245 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains the DigestIndex class and the buildIndex() function."""
+
+
+# PSL
+import binascii
+import heapq
+import mmap
+import struct
+import tempfile
+
+# mkroesti
+import mkroesti   # import stuff from __init__.py (e.g. mkroesti.python2)
+from mkroesti.errorhandling import MKRoestiError
+
+
+# An index file starts with a header: magic string, record width in bytes,
+# 4 reserved bytes, number of records. The header is followed by the records,
+# i.e. binary digests of the same width, sorted in ascending order and
+# without duplicates.
+indexMagic = b"MKRIDX1\0"
+headerFormat = ">8sIIQ"
+headerSize = struct.calcsize(headerFormat)
+
+defaultRunSize = 1000000
+
+
+class DigestIndex:
+    """Tests whether a binary digest is contained in an index file that was
+    created by buildIndex().
+
+    The index file is memory-mapped, so that opening the index is fast and
+    does not depend on the size of the index, and the index is never loaded
+    into Python objects. Lookups use interpolation search (digests are
+    uniformly distributed, so the first bytes of a digest predict its
+    position quite well), alternating with bisection steps to guarantee
+    logarithmic worst case behaviour.
+    """
+
+    def __init__(self, fileName):
+        """Initialize with the name of the index file."""
+        try:
+            self.file = open(fileName, "rb")
+        except IOError as exc:
+            raise MKRoestiError("Cannot open digest index: " + str(exc))
+        try:
+            header = self.file.read(headerSize)
+            if len(header) != headerSize:
+                raise MKRoestiError("Not a digest index: " + fileName)
+            (magic, self.width, reserved, self.count) = struct.unpack(headerFormat, header) #@UnusedVariable
+            if magic != indexMagic or self.width == 0:
+                raise MKRoestiError("Not a digest index: " + fileName)
+            self.file.seek(0, 2)
+            if self.file.tell() != headerSize + self.width * self.count:
+                raise MKRoestiError("Digest index is truncated or corrupt: " + fileName)
+            self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        except:
+            self.file.close()
+            raise
+
+    def getWidth(self):
+        """Returns the width in bytes of the digests in this index."""
+        return self.width
+
+    def getCount(self):
+        """Returns the number of digests in this index."""
+        return self.count
+
+    def contains(self, digest):
+        """Returns True if the binary digest is contained in this index."""
+        if len(digest) != self.width or self.count == 0:
+            return False
+        # The digest can only be located between the records low and high.
+        # lowValue and highValue are lower and upper bounds of the values of
+        # the records in that range; they are taken from the records that were
+        # compared most recently.
+        low = 0
+        high = self.count - 1
+        lowValue = 0
+        highValue = 1 << 64
+        getValue = DigestIndex.getValue
+        digestValue = getValue(digest)
+        # Local variables avoid attribute lookups in the loop
+        data = self.map
+        width = self.width
+        bisect = False
+        while low <= high:
+            if bisect or highValue <= lowValue:
+                middle = (low + high) // 2
+            else:
+                middle = low + (digestValue - lowValue) * (high - low) // (highValue - lowValue)
+                middle = max(low, min(high, middle))
+            start = headerSize + middle * width
+            record = data[start:start + width]
+            if record == digest:
+                return True
+            previousSize = high - low
+            if record < digest:
+                low = middle + 1
+                lowValue = getValue(record)
+            else:
+                high = middle - 1
+                highValue = getValue(record)
+            # Use bisection for the next step if interpolation did not at
+            # least halve the range (e.g. because digests are not uniformly
+            # distributed), to guarantee logarithmic worst case behaviour
+            bisect = (not bisect) and (high - low) * 2 > previousSize
+        return False
+
+    def containsHex(self, hexDigest):
+        """Returns True if the digest in hexadecimal notation is contained in
+        this index, False if it is not. Returns None if hexDigest is not a
+        hexadecimal digest of the same width as the digests in this index.
+        """
+        if len(hexDigest) != 2 * self.width:
+            return None
+        try:
+            digest = binascii.unhexlify(hexDigest)
+        except (binascii.Error, TypeError, ValueError):
+            return None
+        return self.contains(digest)
+
+    def getRecord(self, recordIndex):
+        """Returns the digest at the given position of the sorted records."""
+        start = headerSize + recordIndex * self.width
+        return self.map[start:start + self.width]
+
+    def close(self):
+        """Releases the memory map and closes the index file."""
+        self.map.close()
+        self.file.close()
+
+    @staticmethod
+    def getValue(digest):
+        """Returns the first (up to) 8 bytes of digest as an integer. The
+        value is used to interpolate positions.
+        """
+        prefix = digest[:8]
+        if mkroesti.python2:
+            value = int(binascii.hexlify(prefix), 16)
+        else:
+            value = int.from_bytes(prefix, "big")
+        return value << (8 * (8 - len(prefix)))
+
+
+def buildIndex(hexDigests, fileName, runSize = None):
+    """Creates an index file that can be used with DigestIndex.
+
+    hexDigests is an iterable of digests in hexadecimal notation. All digests
+    must have the same width. Duplicate digests are stored only once. Returns
+    the number of digests stored in the index.
+
+    The digests are sorted with an external merge sort: Runs of up to runSize
+    digests are sorted in memory and written to temporary files, then all runs
+    are merged into the index file. Memory usage is therefore bounded by the
+    run size, regardless of how many digests there are.
+    """
+    if runSize is None:
+        runSize = defaultRunSize
+    if runSize < 1:
+        raise MKRoestiError("Run size must be greater than 0")
+    width = None
+    run = list()
+    runFiles = list()
+    try:
+        for hexDigest in hexDigests:
+            try:
+                digest = binascii.unhexlify(hexDigest)
+            except (binascii.Error, TypeError, ValueError):
+                raise MKRoestiError("Invalid digest: " + str(hexDigest))
+            if width is None:
+                if len(digest) == 0:
+                    raise MKRoestiError("Invalid digest: " + str(hexDigest))
+                width = len(digest)
+            elif len(digest) != width:
+                raise MKRoestiError("Digest has " + str(len(digest)) + " bytes instead of " + str(width) + ": " + str(hexDigest))
+            run.append(digest)
+            if len(run) >= runSize:
+                runFiles.append(writeRun(run))
+                run = list()
+        if width is None:
+            raise MKRoestiError("No digests to index")
+        run.sort()
+        runs = [readRun(runFile, width) for runFile in runFiles]
+        runs.append(iter(run))
+        count = 0
+        indexFile = open(fileName, "wb")
+        try:
+            indexFile.write(struct.pack(headerFormat, indexMagic, width, 0, 0))
+            previousDigest = None
+            for digest in heapq.merge(*runs):
+                if digest != previousDigest:
+                    indexFile.write(digest)
+                    previousDigest = digest
+                    count += 1
+            # Now that the number of records is known, update the header
+            indexFile.seek(0)
+            indexFile.write(struct.pack(headerFormat, indexMagic, width, 0, count))
+        finally:
+            indexFile.close()
+        return count
+    finally:
+        for runFile in runFiles:
+            runFile.close()
+
+
+def writeRun(run):
+    """Sorts the list of digests run and writes it to a temporary file.
+    Returns the file object, positioned at the start of the file.
+    """
+    run.sort()
+    runFile = tempfile.TemporaryFile()
+    runFile.write(b"".join(run))
+    runFile.seek(0)
+    return runFile
+
+
+def readRun(runFile, width):
+    """Generator that yields the digests of width bytes stored in runFile."""
+    bufferSize = width * 4096
+    while True:
+        data = runFile.read(bufferSize)
+        if len(data) == 0:
+            break
+        for start in range(0, len(data), width):
+            yield data[start:start + width]
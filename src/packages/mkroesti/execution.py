@@ -0,0 +1,614 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains functions that execute algorithms concurrently, and the
+ProcessPoolBackend class.
+
+By default, algorithms are executed concurrently by a pool of threads. This
+only pays off for algorithms that release the GIL while they work (e.g.
+hashlib and zlib, for large inputs). Algorithms that hold the GIL (e.g. crypt)
+can instead be executed by a ProcessPoolBackend, i.e. by a pool of worker
+processes. Like the workers in mkroesti.passwd, each worker process sets up
+its own provider registry once, when the worker is started, and re-creates
+algorithm objects by name the first time they are needed.
+
+Which algorithms are worth a worker is decided by their estimated cost (see
+mkroesti.algorithm.AlgorithmMetadata): The most expensive algorithms are
+started first, so that they do not finish long after all others, while cheap
+algorithms are executed by the calling thread in the meantime.
+
+hashStream() hashes a single, possibly very large input while it is being
+read, with a separate thread for each algorithm.
+"""
+
+
+# PSL
+import itertools
+import multiprocessing
+import threading
+# Python 3 renamed the module Queue
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+# Python 2.6: concurrent.futures is not part of the standard library. Without
+# it, algorithms are always executed one after another.
+try:
+    import concurrent.futures
+    haveFutures = True
+except ImportError:
+    haveFutures = False
+# Python < 3.8: multiprocessing.shared_memory is not part of the standard
+# library. Without it, large inputs are pickled like small inputs.
+try:
+    from multiprocessing import resource_tracker, shared_memory
+    haveSharedMemory = True
+except ImportError:
+    haveSharedMemory = False
+
+# mkroesti
+from mkroesti import factory
+from mkroesti.algorithm import getHashes, getMetadata
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.registry import ProviderRegistry
+
+
+defaultChunkSize = 1000
+
+# Algorithm objects whose estimated cost (in milliseconds) is less than this
+# are executed by the calling thread, because starting them in a worker would
+# cost about as much time as it saves
+inlineCostThreshold = 1.0
+
+# Estimated time in milliseconds that an algorithm needs to process one
+# megabyte of input. Measured with hashlib (md5, sha-1, sha-256, sha-512),
+# which processes between 400 and 1000 megabytes per second.
+costPerMegabyte = 2.0
+
+# Used by hashStream()
+defaultStreamChunkSize = 1024 * 1024
+defaultQueueSize = 4
+
+
+def executeAlgorithms(algorithms, preparedInputs, jobs = 1, cache = None, backend = None):
+    """Hashes all inputs with all algorithm objects.
+
+    preparedInputs is a list of tuples (inputAsStr, inputAsBytes). Each
+    algorithm object receives the variant that it requires (see
+    AlgorithmInterface.needBytesInput()). If cache is not None, it must be a
+    mkroesti.cache.HashCache object.
+
+    Returns a list that contains one list of hashes for each algorithm object,
+    in the same order as algorithms. Each list of hashes contains one hash for
+    each input, in the same order as preparedInputs.
+
+    If jobs is greater than 1, algorithm objects are scheduled by their
+    estimated cost (see scheduleAlgorithms()): Expensive algorithm objects are
+    executed by a pool of up to jobs threads, the most expensive ones first.
+    Cheap algorithm objects are executed by the calling thread while the pool
+    is busy. This is worthwhile for large inputs, because hashlib and zlib
+    release the GIL while they process large buffers, and for algorithms such
+    as bcrypt. The result does not depend on the number of jobs.
+
+    If backend is not None, it must be a ProcessPoolBackend object. Expensive
+    algorithm objects that the backend can re-create (see getAlgorithmSpec())
+    are then executed by the backend's worker processes, the remaining ones in
+    this process. jobs is ignored in this case, the number of worker processes
+    is determined by the backend.
+
+    Use iterateAlgorithms() to process the hashes of an algorithm object as
+    soon as they are available.
+    """
+    hashesByAlgorithm = [None] * len(algorithms)
+    for (index, hashes) in iterateAlgorithms(algorithms, preparedInputs, jobs, cache, backend, False):
+        hashesByAlgorithm[index] = hashes
+    return hashesByAlgorithm
+
+
+def iterateAlgorithms(algorithms, preparedInputs, jobs = 1, cache = None, backend = None, ordered = True):
+    """Generator that hashes all inputs with all algorithm objects, and yields
+    a tuple (index, hashes) for each algorithm object as soon as possible.
+
+    index is the index of the algorithm object in algorithms, hashes is the
+    list of hashes that the algorithm object has generated. See
+    executeAlgorithms() for details about the parameters.
+
+    If ordered is True, tuples are yielded in the same order as algorithms:
+    If the hashes of an algorithm object become available early, they are
+    held in a ReorderBuffer until the hashes of all preceding algorithm
+    objects have been yielded. If ordered is False, tuples are yielded in the
+    order in which the algorithm objects finish.
+
+    If the generator is closed before it is exhausted, algorithm objects that
+    have not yet been started are not executed anymore.
+    """
+    if not haveFutures or (backend is None and (jobs <= 1 or len(algorithms) <= 1)):
+        expensiveIndexes = list()
+    else:
+        (expensiveIndexes, cheapIndexes) = scheduleAlgorithms(algorithms, preparedInputs)
+    if len(expensiveIndexes) == 0:
+        for (index, algorithm) in enumerate(algorithms):
+            yield (index, executeAlgorithm(algorithm, preparedInputs, cache))
+        return
+    if backend is not None:
+        # Threads only dispatch the work to the worker processes and wait for
+        # the results, so there is one thread for each algorithm object
+        jobs = len(expensiveIndexes)
+    reorderBuffer = ReorderBuffer(ordered)
+    # Receives a tuple (index, future) when an expensive algorithm object
+    # finishes
+    completed = queue.Queue()
+    futures = list()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers = min(jobs, len(expensiveIndexes)))
+    try:
+        for index in expensiveIndexes:
+            algorithm = algorithms[index]
+            if backend is not None:
+                algorithm = backend.wrapAlgorithm(algorithm)
+            future = executor.submit(executeAlgorithm, algorithm, preparedInputs, cache)
+            future.add_done_callback(lambda future, index = index: completed.put((index, future)))
+            futures.append(future)
+        pendingCount = len(futures)
+        for index in cheapIndexes:
+            for result in reorderBuffer.add(index, executeAlgorithm(algorithms[index], preparedInputs, cache)):
+                yield result
+            # Don't hold back expensive algorithm objects that have finished
+            # in the meantime
+            while True:
+                try:
+                    (index, future) = completed.get_nowait()
+                except queue.Empty:
+                    break
+                pendingCount -= 1
+                for result in reorderBuffer.add(index, future.result()):
+                    yield result
+        while pendingCount > 0:
+            (index, future) = completed.get()
+            pendingCount -= 1
+            for result in reorderBuffer.add(index, future.result()):
+                yield result
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait = True)
+
+
+class ReorderBuffer:
+    """Restores the order of results that become available out of order.
+
+    Each result has an index; indexes start at 0 and have no gaps. add() holds
+    back a result until all results with smaller indexes have been added.
+    The buffer therefore only holds results that have overtaken others.
+    """
+
+    def __init__(self, ordered = True):
+        """Initialize. If ordered is False, results are never held back."""
+        self.ordered = ordered
+        self.nextIndex = 0
+        self.results = dict()
+
+    def add(self, index, result):
+        """Adds the result with the given index. Returns a list of tuples
+        (index, result) that may now be released, in order.
+        """
+        if not self.ordered:
+            return [(index, result)]
+        self.results[index] = result
+        releasedResults = list()
+        while self.nextIndex in self.results:
+            releasedResults.append((self.nextIndex, self.results.pop(self.nextIndex)))
+            self.nextIndex += 1
+        return releasedResults
+
+
+def executeAlgorithm(algorithm, preparedInputs, cache = None):
+    """Returns a list with the hashes of all inputs, generated by the given
+    algorithm object. See executeAlgorithms() for details about the parameters.
+    """
+    if algorithm.needBytesInput():
+        inputs = [inputAsBytes for (inputAsStr, inputAsBytes) in preparedInputs]
+    else:
+        inputs = [inputAsStr for (inputAsStr, inputAsBytes) in preparedInputs]
+    if cache is None:
+        return getHashes(algorithm, inputs)
+    else:
+        return cache.getHashes(algorithm, inputs)
+
+
+def isStreamable(algorithm):
+    """Returns True if the given algorithm object can be used with
+    hashStream().
+    """
+    if not getMetadata(algorithm).isStreamable:
+        return False
+    createHashObject = getattr(algorithm, "createHashObject", None)
+    return createHashObject is not None and createHashObject() is not None
+
+
+def hashStream(algorithms, inputFile, chunkSize = None, queueSize = None):
+    """Hashes the content of inputFile with all algorithm objects, reading
+    inputFile only once.
+
+    inputFile must be a file object in binary mode. All algorithm objects
+    must be streamable (see isStreamable()). Returns a list with one hash for
+    each algorithm object, in the same order as algorithms.
+
+    This function reads chunks of up to chunkSize bytes and hands each chunk
+    to one consumer thread per algorithm object. Each consumer thread has a
+    queue that holds up to queueSize chunks; if a consumer falls behind,
+    reading pauses until the consumer has caught up. Chunks are immutable and
+    are shared by all consumers, a chunk is released as soon as the last
+    consumer has processed it. Memory usage is therefore bounded by chunkSize,
+    queueSize and the number of algorithm objects, regardless of how large the
+    input is. Because hashlib and zlib release the GIL while they process a
+    large chunk, the algorithms run on as many CPU cores as are available.
+    """
+    if chunkSize is None:
+        chunkSize = defaultStreamChunkSize
+    if queueSize is None:
+        queueSize = defaultQueueSize
+    if chunkSize < 1:
+        raise MKRoestiError("Chunk size must be greater than 0")
+    if queueSize < 1:
+        raise MKRoestiError("Queue size must be greater than 0")
+    consumers = [StreamConsumer(hashObject, queueSize) for hashObject in createHashObjects(algorithms)]
+    for consumer in consumers:
+        consumer.start()
+    try:
+        while True:
+            chunk = inputFile.read(chunkSize)
+            if not chunk:
+                break
+            for consumer in consumers:
+                consumer.chunks.put(chunk)
+            # Drop our reference, the consumers hold the only remaining ones
+            chunk = None
+    finally:
+        # Stop the consumers even if reading fails
+        for consumer in consumers:
+            consumer.chunks.put(None)
+        for consumer in consumers:
+            consumer.join()
+    hashes = list()
+    for consumer in consumers:
+        if consumer.error is not None:
+            raise consumer.error
+        hashes.append(consumer.hashObject.hexdigest())
+    return hashes
+
+
+def createHashObjects(algorithms):
+    """Returns a list with a new hash object for each algorithm object, in the
+    same order as algorithms. Raises MKRoestiError if an algorithm object
+    cannot create a hash object.
+    """
+    hashObjects = list()
+    for algorithm in algorithms:
+        createHashObject = getattr(algorithm, "createHashObject", None)
+        hashObject = None
+        if createHashObject is not None:
+            hashObject = createHashObject()
+        if hashObject is None:
+            raise MKRoestiError("Algorithm cannot hash a stream: " + algorithm.getName())
+        hashObjects.append(hashObject)
+    return hashObjects
+
+
+class StreamConsumer(threading.Thread):
+    """Thread that feeds the chunks from a queue into a hash object, until it
+    receives None. Used by hashStream().
+    """
+
+    def __init__(self, hashObject, queueSize):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.hashObject = hashObject
+        self.chunks = queue.Queue(queueSize)
+        self.error = None
+
+    def run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            # After an error, keep draining the queue so that the reader does
+            # not block
+            if self.error is None:
+                try:
+                    self.hashObject.update(chunk)
+                except Exception as exc:
+                    self.error = exc
+
+
+def scheduleAlgorithms(algorithms, preparedInputs):
+    """Divides algorithm objects into expensive and cheap ones, according to
+    the estimated cost of hashing preparedInputs (see estimateCost()).
+
+    Returns a tuple (expensiveIndexes, cheapIndexes) of two lists with indexes
+    into algorithms. expensiveIndexes is sorted by decreasing cost,
+    cheapIndexes is sorted in the same order as algorithms. An algorithm object
+    is cheap if its estimated cost is less than inlineCostThreshold, i.e. if
+    executing it in a worker is not worth the overhead.
+    """
+    inputCount = len(preparedInputs)
+    inputSize = getInputSize(preparedInputs)
+    costs = [estimateCost(algorithm, inputCount, inputSize) for algorithm in algorithms]
+    expensiveIndexes = [index for index in range(len(algorithms)) if costs[index] >= inlineCostThreshold]
+    # sort() is stable, algorithm objects with the same cost keep their order
+    expensiveIndexes.sort(key = lambda index: costs[index], reverse = True)
+    cheapIndexes = [index for index in range(len(algorithms)) if costs[index] < inlineCostThreshold]
+    return (expensiveIndexes, cheapIndexes)
+
+
+def estimateCost(algorithm, inputCount, inputSize = 0):
+    """Returns the estimated time in milliseconds that the given algorithm
+    object needs to hash inputCount inputs with a total size of inputSize
+    bytes.
+
+    The estimate consists of the cost per input from the algorithm object's
+    metadata, and costPerMegabyte for each megabyte of input.
+    """
+    metadata = getMetadata(algorithm)
+    return metadata.costEstimate * inputCount + costPerMegabyte * inputSize / (1024 * 1024)
+
+
+def getInputSize(preparedInputs):
+    """Returns the total size of preparedInputs (see executeAlgorithms()). The
+    size of an input is the size of its binary variant, if it has one.
+    """
+    inputSize = 0
+    for (inputAsStr, inputAsBytes) in preparedInputs:
+        if inputAsBytes is not None:
+            inputSize += len(inputAsBytes)
+        else:
+            inputSize += len(inputAsStr)
+    return inputSize
+
+
+def getAlgorithmSpec(algorithm):
+    """Returns a tuple (algorithmName, source) that can be used to re-create
+    the given algorithm object in another process, or None if the algorithm
+    object cannot be re-created.
+
+    Only algorithm objects that have been created by a registered provider can
+    be re-created, but not e.g. objects that wrap another algorithm object
+    (such as HmacAlgorithm or PrefixAlgorithm).
+    """
+    getProvider = getattr(algorithm, "getProvider", None)
+    if getProvider is None or getProvider() is None:
+        return None
+    algorithmName = algorithm.getName()
+    if not ProviderRegistry.getInstance().isAlgorithmKnown(algorithmName):
+        return None
+    provider = getProvider()
+    if type(provider.createAlgorithm(algorithmName)) is not type(algorithm):
+        return None
+    return (algorithmName, provider.getAlgorithmSource(algorithmName))
+
+
+class SharedInput:
+    """Refers to an input that has been placed in a block of shared memory.
+
+    SharedInput objects are sent to worker processes instead of the input
+    itself.
+    """
+
+    def __init__(self, name, size, isStr):
+        """Initialize with the name of the shared memory block, the size of
+        the input in bytes, and whether the input must be decoded to str.
+        """
+        self.name = name
+        self.size = size
+        self.isStr = isStr
+
+
+class RemoteAlgorithm:
+    """Algorithm object that lets a ProcessPoolBackend generate the hashes of
+    another algorithm object.
+
+    The name, provider, input requirements and metadata are the same as those
+    of the wrapped algorithm object, so a mkroesti.cache.HashCache treats both
+    objects alike.
+    """
+
+    def __init__(self, algorithm, backend, algorithmSpec):
+        self.algorithm = algorithm
+        self.backend = backend
+        self.algorithmSpec = algorithmSpec
+
+    def getName(self):
+        return self.algorithm.getName()
+
+    def getProvider(self):
+        return self.algorithm.getProvider()
+
+    def needBytesInput(self):
+        return self.algorithm.needBytesInput()
+
+    def getMetadata(self):
+        return getMetadata(self.algorithm)
+
+    def isDeterministic(self):
+        return self.getMetadata().isDeterministic
+
+    def getHash(self, input):
+        return self.getHashes([input])[0]
+
+    def getHashes(self, inputs):
+        return self.backend.getHashes(self.algorithmSpec, inputs)
+
+
+class ProcessPoolBackend:
+    """Executes algorithms in a pool of worker processes.
+
+    Inputs are sent to the worker processes in chunks of a configurable
+    number of inputs, to amortize the cost of inter-process communication.
+    Inputs of at least sharedMemoryThreshold bytes are not pickled, but
+    placed in a block of shared memory, once for all algorithms that hash
+    them. The shared memory blocks are released by close().
+
+    A ProcessPoolBackend object may be used by several threads at the same
+    time.
+    """
+
+    sharedMemoryThreshold = 1024 * 1024
+
+    def __init__(self, jobs, providerModuleNames = None, chunkSize = None):
+        """Initialize with the number of worker processes.
+
+        Each worker process registers the providers from the modules named in
+        providerModuleNames (see mkroesti.main.registerProviders()). Providers
+        that are registered in this process are not available to worker
+        processes. chunkSize is the maximum number of inputs that are sent to
+        a worker process at once.
+        """
+        if jobs < 1:
+            raise MKRoestiError("Number of jobs must be greater than 0")
+        if chunkSize is None:
+            chunkSize = defaultChunkSize
+        if chunkSize < 1:
+            raise MKRoestiError("Chunk size must be greater than 0")
+        if providerModuleNames is None:
+            providerModuleNames = ["mkroesti.provider"]
+        self.chunkSize = chunkSize
+        # Key = id() of an input, value = tuple (input, SharedMemory object,
+        # SharedInput object). Keeping a reference to the input guarantees
+        # that its id() is not re-used while the entry exists.
+        self.sharedInputs = dict()
+        self.lock = threading.Lock()
+        if haveSharedMemory:
+            # Worker processes must share our resource tracker. If each of
+            # them started its own tracker, the trackers would complain
+            # about shared memory blocks that we have already released.
+            resource_tracker.ensure_running()
+        self.pool = multiprocessing.Pool(jobs, initializeWorker, (providerModuleNames[:],))
+
+    def close(self):
+        """Stops the worker processes and releases the shared memory blocks."""
+        self.pool.terminate()
+        self.pool.join()
+        with self.lock:
+            for (input, sharedMemory, sharedInput) in self.sharedInputs.values(): #@UnusedVariable
+                sharedMemory.close()
+                sharedMemory.unlink()
+            self.sharedInputs.clear()
+
+    def wrapAlgorithm(self, algorithm):
+        """Returns a RemoteAlgorithm object that wraps the given algorithm
+        object, or the algorithm object itself if it cannot be re-created in a
+        worker process.
+        """
+        algorithmSpec = getAlgorithmSpec(algorithm)
+        if algorithmSpec is None:
+            return algorithm
+        return RemoteAlgorithm(algorithm, self, algorithmSpec)
+
+    def getHashes(self, algorithmSpec, inputs):
+        """Returns a list with the hashes of inputs, generated by worker
+        processes with the algorithm identified by algorithmSpec (see
+        getAlgorithmSpec()).
+        """
+        inputs = [self.getTransferableInput(input) for input in inputs]
+        results = list()
+        for start in range(0, len(inputs), self.chunkSize):
+            chunk = inputs[start:start + self.chunkSize]
+            results.append(self.pool.apply_async(hashChunk, (algorithmSpec, chunk)))
+        return list(itertools.chain.from_iterable(result.get() for result in results))
+
+    def getTransferableInput(self, input):
+        """Returns the object that is sent to a worker process for the given
+        input: Either the input itself, or a SharedInput object.
+        """
+        if not haveSharedMemory or len(input) < ProcessPoolBackend.sharedMemoryThreshold:
+            return input
+        with self.lock:
+            entry = self.sharedInputs.get(id(input))
+            if entry is None:
+                isStr = not isinstance(input, bytes)
+                if isStr:
+                    data = input.encode("utf-8")
+                else:
+                    data = input
+                sharedMemory = shared_memory.SharedMemory(create = True, size = max(1, len(data)))
+                sharedMemory.buf[:len(data)] = data
+                entry = (input, sharedMemory, SharedInput(sharedMemory.name, len(data), isStr))
+                self.sharedInputs[id(input)] = entry
+            return entry[2]
+
+# Algorithm objects used by hashChunk(). This is a module global because in a
+# worker process the algorithm objects must survive from one hashChunk() call
+# to the next.
+workerAlgorithms = dict()
+
+
+def initializeWorker(providerModuleNames):
+    """Prepares the current process for hashChunk() calls.
+
+    If providerModuleNames is not None, a new provider registry is set up with
+    the providers from the named modules. This is necessary in worker processes
+    that are not forked, and therefore do not inherit the registry from their
+    parent process.
+    """
+    if providerModuleNames is not None:
+        # Avoid circular import; mkroesti.main imports this module
+        from mkroesti.main import registerProviders
+        ProviderRegistry.deleteInstance()
+        registerProviders(providerModuleNames)
+        # The worker never registers more providers
+        ProviderRegistry.getInstance().freeze()
+    workerAlgorithms.clear()
+
+
+def getWorkerAlgorithm(algorithmSpec):
+    """Returns the algorithm object for the given tuple (algorithmName,
+    source), creating the object on first use.
+    """
+    if algorithmSpec not in workerAlgorithms:
+        (algorithmName, source) = algorithmSpec
+        for algorithm in factory.AlgorithmFactory.createAlgorithms(algorithmName, True):
+            if getAlgorithmSpec(algorithm) == algorithmSpec:
+                workerAlgorithms[algorithmSpec] = algorithm
+                break
+        else:
+            raise MKRoestiError("Algorithm " + algorithmName + " (" + source + ") is not available in worker process")
+    return workerAlgorithms[algorithmSpec]
+
+
+def readSharedInput(sharedInput):
+    """Returns a copy of the input that the given SharedInput object refers
+    to.
+    """
+    sharedMemory = shared_memory.SharedMemory(name = sharedInput.name)
+    try:
+        data = bytes(sharedMemory.buf[:sharedInput.size])
+    finally:
+        sharedMemory.close()
+    if sharedInput.isStr:
+        return data.decode("utf-8")
+    return data
+
+
+def hashChunk(algorithmSpec, inputs):
+    """Returns a list with the hashes of inputs, generated with the algorithm
+    identified by algorithmSpec. inputs may contain SharedInput objects.
+    """
+    algorithm = getWorkerAlgorithm(algorithmSpec)
+    inputs = [readSharedInput(input) if isinstance(input, SharedInput) else input for input in inputs]
+    return getHashes(algorithm, inputs)
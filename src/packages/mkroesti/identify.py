@@ -0,0 +1,232 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains the AlgorithmIdentifier class."""
+
+
+# mkroesti
+from mkroesti.algorithm import compareHashes, getMetadata
+from mkroesti.conversion import convertInput, toBytes
+from mkroesti.errorhandling import ConversionError
+from mkroesti.names import * #@UnusedWildImport
+from mkroesti.passwd import CRYPT_SIGNATURES
+
+
+HEX_ALPHABET = "0123456789abcdef"
+UPPER_HEX_ALPHABET = "0123456789ABCDEF"
+BASE32_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567="
+BASE64_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+CRYPT_ALPHABET = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+# Number of hexadecimal characters in the hashes of digest algorithms,
+# regardless of which provider implements them
+hexDigestLengths = {
+    ALGORITHM_MD2 : 32,
+    ALGORITHM_MD4 : 32,
+    ALGORITHM_MD5 : 32,
+    ALGORITHM_SHA_0 : 40,
+    ALGORITHM_SHA_1 : 40,
+    ALGORITHM_SHA_224 : 56,
+    ALGORITHM_SHA_256 : 64,
+    ALGORITHM_SHA_384 : 96,
+    ALGORITHM_SHA_512 : 128,
+    ALGORITHM_RIPEMD_128 : 32,
+    ALGORITHM_RIPEMD_160 : 40,
+    ALGORITHM_RIPEMD_256 : 64,
+    ALGORITHM_RIPEMD_320 : 80,
+    ALGORITHM_HAVAL_128_3 : 32,
+    ALGORITHM_HAVAL_128_4 : 32,
+    ALGORITHM_HAVAL_128_5 : 32,
+    ALGORITHM_HAVAL_160_3 : 40,
+    ALGORITHM_HAVAL_160_4 : 40,
+    ALGORITHM_HAVAL_160_5 : 40,
+    ALGORITHM_HAVAL_192_3 : 48,
+    ALGORITHM_HAVAL_192_4 : 48,
+    ALGORITHM_HAVAL_192_5 : 48,
+    ALGORITHM_HAVAL_224_3 : 56,
+    ALGORITHM_HAVAL_224_4 : 56,
+    ALGORITHM_HAVAL_224_5 : 56,
+    ALGORITHM_HAVAL_256_3 : 64,
+    ALGORITHM_HAVAL_256_4 : 64,
+    ALGORITHM_HAVAL_256_5 : 64,
+    ALGORITHM_WHIRLPOOL : 128,
+    ALGORITHM_TIGER_128_3 : 32,
+    ALGORITHM_TIGER_128_4 : 32,
+    ALGORITHM_TIGER_160_3 : 40,
+    ALGORITHM_TIGER_160_4 : 40,
+    ALGORITHM_TIGER_192_3 : 48,
+    ALGORITHM_TIGER_192_4 : 48,
+    ALGORITHM_SNEFRU_128 : 32,
+    ALGORITHM_SNEFRU_256 : 64,
+    ALGORITHM_GOST : 64,
+    ALGORITHM_WINDOWS_LM : 32,
+    ALGORITHM_WINDOWS_NT : 32,
+    }
+
+
+class OutputShape:
+    """Describes what the hashes generated by an algorithm look like: the
+    characters they consist of, their length, and the prefix they start with.
+    """
+
+    def __init__(self, alphabet = None, minimumLength = None, maximumLength = None, prefixes = None, ignoreCase = False):
+        """Initialize with the properties of the hashes. Properties that are
+        None are not checked. maximumLength defaults to minimumLength.
+
+        If ignoreCase is True, hashes are compared case-insensitively (e.g.
+        hexadecimal digests), and alphabet must be in lower case.
+        """
+        if maximumLength is None:
+            maximumLength = minimumLength
+        if alphabet is not None:
+            alphabet = frozenset(alphabet)
+        self.alphabet = alphabet
+        self.minimumLength = minimumLength
+        self.maximumLength = maximumLength
+        self.prefixes = prefixes
+        self.ignoreCase = ignoreCase
+
+    def matches(self, hash):
+        """Returns True if hash has this shape."""
+        if self.ignoreCase:
+            hash = hash.lower()
+        if self.minimumLength is not None and not (self.minimumLength <= len(hash) <= self.maximumLength):
+            return False
+        if self.prefixes is not None:
+            for prefix in self.prefixes:
+                if hash.startswith(prefix):
+                    break
+            else:
+                return False
+        if self.alphabet is not None and not self.alphabet.issuperset(hash):
+            return False
+        return True
+
+
+def getOutputShape(algorithmName, inputLength):
+    """Returns the OutputShape of the hashes generated by the named algorithm
+    for an input of inputLength bytes, or None if the shape is not known.
+    """
+    if algorithmName in hexDigestLengths:
+        return OutputShape(HEX_ALPHABET, hexDigestLengths[algorithmName], ignoreCase = True)
+    elif algorithmName in (ALGORITHM_ADLER32, ALGORITHM_CRC32, ALGORITHM_CRC32B):
+        # Checksums are not padded with leading zeroes
+        return OutputShape(HEX_ALPHABET, 1, 8, ignoreCase = True)
+    elif ALGORITHM_BASE16 == algorithmName:
+        return OutputShape(UPPER_HEX_ALPHABET, 2 * inputLength)
+    elif ALGORITHM_BASE32 == algorithmName:
+        return OutputShape(BASE32_ALPHABET, 8 * ((inputLength + 4) // 5))
+    elif ALGORITHM_BASE64 == algorithmName:
+        return OutputShape(BASE64_ALPHABET, 4 * ((inputLength + 2) // 3))
+    elif ALGORITHM_CRYPT_DES == algorithmName:
+        return OutputShape(CRYPT_ALPHABET, 13)
+    else:
+        prefixes = tuple([signature for (signature, name) in CRYPT_SIGNATURES if name == algorithmName])
+        if len(prefixes) > 0:
+            return OutputShape(prefixes = prefixes)
+    return None
+
+
+class AlgorithmIdentifier:
+    """Finds out which algorithms generate a given hash for a given input.
+
+    Instead of computing the hashes of all algorithms, AlgorithmIdentifier
+    first narrows down the candidates by comparing the shape of the given hash
+    (length, alphabet, prefix signature such as "$1$") with the shape of the
+    hashes that each algorithm generates. The shapes are determined once, when
+    the AlgorithmIdentifier object is created; only the shapes of the base16,
+    base32 and base64 encodings depend on the length of the input. Algorithms
+    whose shape is not known (e.g. algorithms from third party providers) are
+    always candidates.
+
+    Only the candidates are then computed. Salted algorithms (i.e. algorithms
+    that are not deterministic) cannot simply be computed, instead their
+    verify() method is used.
+    """
+
+    def __init__(self, algorithms, encoding = None):
+        """Initialize with a list of algorithm objects.
+
+        encoding is used to convert the input if an algorithm requires a
+        different type of input (see mkroesti.conversion).
+        """
+        self.algorithms = algorithms[:]   # make a copy
+        self.encoding = encoding
+        # List of tuples (algorithm object, shape); shape is None if it
+        # depends on the input length
+        self.shapes = list()
+        for algorithm in self.algorithms:
+            algorithmName = algorithm.getName()
+            if algorithmName in (ALGORITHM_BASE16, ALGORITHM_BASE32, ALGORITHM_BASE64):
+                shape = None
+            else:
+                shape = getOutputShape(algorithmName, 0)
+                if shape is None:
+                    # Unknown shape: Matches anything
+                    shape = OutputShape()
+            self.shapes.append((algorithm, shape))
+
+    def getCandidates(self, input, hash):
+        """Returns a list with those algorithm objects whose hashes have the
+        same shape as hash.
+        """
+        inputLength = None
+        candidates = list()
+        for (algorithm, shape) in self.shapes:
+            if shape is None:
+                if inputLength is None:
+                    try:
+                        inputLength = len(toBytes(input, self.encoding))
+                    except ConversionError:
+                        continue
+                shape = getOutputShape(algorithm.getName(), inputLength)
+            if shape.matches(hash):
+                candidates.append(algorithm)
+        return candidates
+
+    def identify(self, input, hash):
+        """Returns a list with those algorithm objects that generate hash for
+        input. input may be a string or binary data.
+        """
+        matches = list()
+        for algorithm in self.getCandidates(input, hash):
+            try:
+                algorithmInput = convertInput(input, algorithm, self.encoding)
+            except ConversionError:
+                # The algorithm cannot hash this input, so it cannot have
+                # generated the hash
+                continue
+            # Algorithm objects that do not implement verify() are treated as
+            # deterministic
+            verify = getattr(algorithm, "verify", None)
+            if verify is None or getMetadata(algorithm).isDeterministic:
+                generatedHash = algorithm.getHash(algorithmInput)
+                if type(generatedHash) is bytes:
+                    generatedHash = generatedHash.decode("ascii")
+                shape = getOutputShape(algorithm.getName(), 0)
+                if shape is not None and shape.ignoreCase:
+                    isMatch = compareHashes(generatedHash.lower(), hash.lower())
+                else:
+                    isMatch = compareHashes(generatedHash, hash)
+            else:
+                isMatch = verify(algorithmInput, hash)
+            if isMatch:
+                matches.append(algorithm)
+        return matches
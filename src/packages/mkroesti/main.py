@@ -27,12 +27,23 @@ import os
 from optparse import OptionParser
 import getpass
 import codecs
+import io
 
 # mkroesti
 import mkroesti   # import stuff from __init__.py (e.g. mkroesti.version)
 from mkroesti import factory
 from mkroesti import registry
+from mkroesti.algorithm import HmacAlgorithm, PrefixAlgorithm
+from mkroesti.cache import HashCache
+from mkroesti.conversion import toBytes, toStr
+from mkroesti.csvhash import CsvColumnHasher
+from mkroesti.digestindex import DigestIndex, buildIndex
 from mkroesti.errorhandling import MKRoestiError, ConversionError
+from mkroesti.execution import ProcessPoolBackend, hashStream, isStreamable, iterateAlgorithms
+from mkroesti.identify import AlgorithmIdentifier
+from mkroesti.passwd import PasswordFileGenerator
+from mkroesti.sqlitestore import SqliteResultStore
+from mkroesti.stdioserver import StdioServer
 
 
 def main(args = None):
@@ -111,9 +122,145 @@ def main(args = None):
             except LookupError:
                 raise MKRoestiError("Unknown encoding: " + encoding)
 
-    # Check for different modes (batch, file, list, stdin)
+    if options.jobs < 1:
+        parser.error("number of jobs must be greater than 0")
+    if options.chunkSize < 1:
+        parser.error("chunk size must be greater than 0")
+    if options.cacheSize < 0:
+        parser.error("cache size must not be negative")
+    hashCache = None
+    if options.cacheSize > 0:
+        hashCache = HashCache(options.cacheSize)
+    if options.sqliteFile is not None:
+        if not options.batch and options.file is None:
+            parser.error("SQLite output requires batch mode or reading input from file")
+        elif options.csvColumns is not None or options.passwdFormat is not None or options.serveStdio:
+            parser.error("SQLite output can only be used in batch mode or when reading input from file")
+    hmacKey = None
+    if options.hmacKeyFile is not None or options.hmacKeyFd is not None:
+        if options.hmacKeyFile is not None and options.hmacKeyFd is not None:
+            parser.error("HMAC key cannot be read from both a file and a file descriptor")
+        elif options.list or options.passwdFormat is not None or options.serveStdio:
+            parser.error("HMAC key cannot be used in list, password file or co-process mode")
+        hmacKey = readHmacKey(options.hmacKeyFile, options.hmacKeyFd)
+    prefix = None
+    if options.prefixFile is not None:
+        if hmacKey is not None:
+            parser.error("prefix cannot be combined with an HMAC key")
+        elif options.list or options.passwdFormat is not None or options.serveStdio:
+            parser.error("prefix cannot be used in list, password file or co-process mode")
+        prefix = readPrefix(options.prefixFile)
+    if options.checkIndex is not None:
+        if (options.list or options.passwdFormat is not None or options.serveStdio or options.csvColumns is not None
+            or options.buildIndex is not None or options.sqliteFile is not None):
+            parser.error("digest index can only be checked in batch mode, when reading input from file, or when prompting for input")
+    if options.identify is not None:
+        if (options.list or options.passwdFormat is not None or options.serveStdio or options.csvColumns is not None
+            or options.buildIndex is not None or options.sqliteFile is not None or options.checkIndex is not None):
+            parser.error("algorithms can only be identified in batch mode, when reading input from file, or when prompting for input")
+        elif options.batch and len(args) != 1:
+            parser.error("exactly one input is required to identify algorithms")
+    if options.unordered:
+        if (options.list or options.passwdFormat is not None or options.serveStdio or options.csvColumns is not None
+            or options.buildIndex is not None or options.identify is not None or options.sqliteFile is not None):
+            parser.error("unordered output can only be used when hashes are printed in batch mode, when reading input from file, or when prompting for input")
+    if options.processes:
+        if (options.list or options.passwdFormat is not None or options.serveStdio or options.csvColumns is not None
+            or options.buildIndex is not None or options.identify is not None):
+            parser.error("worker processes can only be used in batch mode, when reading input from file, or when prompting for input")
+
+    # Check for different modes (serve, passwd, csv, batch, file, list, stdin)
     # Note: The order in which arguments are checked is important!
-    if options.batch:
+    if options.serveStdio:
+        if options.batch:
+            parser.error("co-process mode cannot be combined with batch mode")
+        elif options.echo:
+            parser.error("co-process mode cannot be combined with echo mode")
+        elif options.file:
+            parser.error("co-process mode cannot be combined with reading input from file")
+        elif options.list:
+            parser.error("co-process mode cannot be combined with list mode")
+        elif options.csvColumns is not None:
+            parser.error("co-process mode cannot be combined with CSV mode")
+        elif options.passwdFormat is not None:
+            parser.error("co-process mode cannot be combined with password file mode")
+        elif options.buildIndex is not None:
+            parser.error("co-process mode cannot be combined with index build mode")
+        elif len(args) > 0:
+            parser.error("co-process mode does not accept input arguments")
+        # Requests and responses are binary data (see mkroesti.stdioserver
+        # for details about the protocol). Python 2.6 does not have the buffer
+        # attribute, but sys.stdin and sys.stdout are not interpreted anyway.
+        if mkroesti.python2:
+            (inputFile, outputFile) = (sys.stdin, sys.stdout)
+        else:
+            (inputFile, outputFile) = (sys.stdin.buffer, sys.stdout.buffer)
+        server = StdioServer(options.duplicateHashes, encoding, hashCache)
+        server.serve(inputFile, outputFile)
+        printCacheStatistics(hashCache)
+        return
+    elif options.passwdFormat is not None:
+        if options.batch:
+            parser.error("password file mode cannot be combined with batch mode")
+        elif options.echo:
+            parser.error("password file mode cannot be combined with echo mode")
+        elif options.list:
+            parser.error("password file mode cannot be combined with list mode")
+        elif options.csvColumns is not None:
+            parser.error("password file mode cannot be combined with CSV mode")
+        elif options.buildIndex is not None:
+            parser.error("password file mode cannot be combined with index build mode")
+        elif len(args) > 0:
+            parser.error("password file mode does not accept input arguments")
+        elif mkroesti.python2:
+            raise MKRoestiError("Password file mode is not supported by Python 2.6")
+        generator = PasswordFileGenerator(options.algorithms, options.passwdFormat, options.jobs,
+                                          providerModuleNames, encoding, options.chunkSize)
+        inputFile = openTextInput(options.file, encoding)
+        try:
+            generator.process(inputFile, sys.stdout)
+        except UnicodeDecodeError:
+            raise ConversionError("Cannot read user:password records (the encoding used was '" + encoding + "')")
+        finally:
+            if options.file is not None:
+                inputFile.close()
+        return
+    elif options.buildIndex is not None:
+        if options.batch:
+            parser.error("index build mode cannot be combined with batch mode")
+        elif options.echo:
+            parser.error("index build mode cannot be combined with echo mode")
+        elif options.list:
+            parser.error("index build mode cannot be combined with list mode")
+        elif options.csvColumns is not None:
+            parser.error("index build mode cannot be combined with CSV mode")
+        elif len(args) > 0:
+            parser.error("index build mode does not accept input arguments")
+        elif mkroesti.python2:
+            raise MKRoestiError("Index build mode is not supported by Python 2.6")
+        inputFile = openTextInput(options.file, encoding)
+        try:
+            buildIndex(readDigests(inputFile), options.buildIndex)
+        except UnicodeDecodeError:
+            raise ConversionError("Cannot read digests (the encoding used was '" + encoding + "')")
+        finally:
+            if options.file is not None:
+                inputFile.close()
+        return
+    elif options.csvColumns is not None:
+        # The CSV data is read later on, after algorithm objects have been
+        # created, because it is processed chunk by chunk
+        if options.batch:
+            parser.error("CSV mode cannot be combined with batch mode")
+        elif options.echo:
+            parser.error("CSV mode cannot be combined with echo mode")
+        elif options.list:
+            parser.error("CSV mode cannot be combined with list mode")
+        elif len(args) > 0:
+            parser.error("CSV mode does not accept input arguments")
+        elif mkroesti.python2:
+            raise MKRoestiError("CSV mode is not supported by Python 2.6")
+    elif options.batch:
         if options.echo:
             parser.error("batch mode cannot be combined with echo mode")
         elif options.file:
@@ -122,33 +269,19 @@ def main(args = None):
             parser.error("batch mode cannot be combined with list mode")
         elif len(args) == 0:
             parser.error("missing input for batch processing")
-        elif len(args) > 1:
-            parser.error("too many input arguments for batch processing")
-        # In Python 3, hashInput is of type str (not bytes). It has already
-        # been interpreted using the default encoding.
-        hashInput = args[0]
+        # In Python 3, the inputs are of type str (not bytes). They have
+        # already been interpreted using the default encoding. All inputs are
+        # processed further down.
     elif options.file is not None:
         if options.echo:
             parser.error("echo mode cannot be combined with reading from file")
         elif options.list:
             parser.error("list mode cannot be combined with reading from file")
-        try:
-            # Explicitly use "binary" mode. If omitted, Python 3 would open the
-            # file in text mode and interpret the file's content using the
-            # current default encoding - which might, or might not, produce the
-            # correct results. In Python 2.6, read() returns data as type str,
-            # but in its raw, uninterpreted form.
-            file = open(options.file, "rb")
-            try:
-                hashInput = file.read()
-            finally:
-                file.close()
-        except IOError as exc:
-            # TODO: We previously accessed exc.arg (singular), but changed this
-            # to exc.args (plural). Check if this (the plural) works with
-            # Python 2.6. Probably not...
-            errno, strerror = exc.args #@UnusedVariable
-            raise MKRoestiError(strerror)   # pass on detailed error description (e.g. "no such file")
+        # With --jobs, the file may be hashed while it is being read (see
+        # hashStream()). Whether this is possible is known only after the
+        # algorithm objects have been created, so reading is deferred.
+        if options.jobs <= 1 or options.processes or options.identify is not None:
+            hashInput = readInputFile(options.file)
     elif options.list:
         # --list implies --duplicate-hashes
         if not options.duplicateHashes:
@@ -200,9 +333,146 @@ def main(args = None):
         # problem...
         algorithms.extend(factory.AlgorithmFactory.createAlgorithms(name, options.duplicateHashes))
 
+    if hmacKey is not None:
+        algorithms = createHmacAlgorithms(algorithms, hmacKey)
+    if prefix is not None:
+        algorithms = createPrefixAlgorithms(algorithms, prefix)
+
+    if options.csvColumns is not None:
+        hashCsv(options, algorithms, encoding, hashCache)
+        printCacheStatistics(hashCache)
+        return
+
+    # Batch mode is the only mode that may specify more than one input. All
+    # inputs are hashed with the same algorithm objects.
+    if options.batch:
+        hashInputs = args
+    else:
+        hashInputs = [hashInput]
+
+    if options.identify is not None:
+        identifyAlgorithms(options, algorithms, hashInputs[0], encoding)
+        return
+
+    # Create hashes. If the input is read from a file, and all algorithms
+    # can process it piece by piece, the file is hashed while it is being read,
+    # with one thread per algorithm.
+    results = None
+    if options.file is not None and hashInput is None:
+        if len(algorithms) > 1 and all([isStreamable(algorithm) for algorithm in algorithms]):
+            results = enumerate([[hash] for hash in streamInputFile(options.file, algorithms)])
+            if options.codec:
+                print("Warning: Ignoring --codec because no conversion was required", file = sys.stderr)
+        else:
+            hashInputs = [readInputFile(options.file)]
+
+    # Otherwise each algorithm hashes all inputs in a single batch. With
+    # --jobs, several algorithms run concurrently. With --processes, the
+    # algorithms run in worker processes. Hashes are generated lazily, while
+    # they are being printed or stored.
+    backend = None
+    try:
+        if results is None:
+            preparedInputs = prepareInputs(options, algorithms, hashInputs, encoding)
+            if options.processes:
+                backend = ProcessPoolBackend(options.jobs, providerModuleNames, options.chunkSize)
+            results = iterateAlgorithms(algorithms, preparedInputs, options.jobs, hashCache, backend,
+                                        not options.unordered)
+
+        if options.sqliteFile is not None:
+            # The input read from a file is identified by the file name
+            if options.batch:
+                inputIds = hashInputs
+            else:
+                inputIds = [options.file]
+            hashesByAlgorithm = [None] * len(algorithms)
+            for (algorithmIndex, hashes) in results:
+                hashesByAlgorithm[algorithmIndex] = hashes
+            storeHashes(options.sqliteFile, inputIds, algorithms, hashesByAlgorithm)
+        else:
+            printHashes(options, algorithms, hashInputs, results)
+    finally:
+        if backend is not None:
+            backend.close()
+    printCacheStatistics(hashCache)
+
+
+def printHashes(options, algorithms, hashInputs, results):
+    """Prints the hashes generated for hashInputs by the algorithm objects.
+
+    results is an iterable of tuples (algorithmIndex, hashes), see
+    mkroesti.execution.iterateAlgorithms(). If there is only one input, or if
+    --unordered is specified, the hashes of an algorithm are printed as soon
+    as the tuple for the algorithm is available. Otherwise the output is
+    ordered by input, so all tuples must be available before the first line is
+    printed.
+
+    If there is more than one input, each line of output is labelled with the
+    input that was hashed. If a digest index is checked, each line is suffixed
+    with the result of the check, and hashes that cannot be checked (because
+    they have a different width, or are not hexadecimal) are not printed.
+    """
+    digestIndex = None
+    if options.checkIndex is not None:
+        digestIndex = DigestIndex(options.checkIndex)
+    try:
+        if len(hashInputs) > 1 and not options.unordered:
+            hashesByAlgorithm = [None] * len(algorithms)
+            for (algorithmIndex, hashes) in results:
+                hashesByAlgorithm[algorithmIndex] = hashes
+            for inputIndex in range(len(hashInputs)):
+                for algorithmIndex in range(len(algorithms)):
+                    printHash(options, algorithms, algorithmIndex, hashInputs, inputIndex,
+                              hashesByAlgorithm[algorithmIndex][inputIndex], digestIndex)
+        else:
+            for (algorithmIndex, hashes) in results:
+                for inputIndex in range(len(hashInputs)):
+                    printHash(options, algorithms, algorithmIndex, hashInputs, inputIndex,
+                              hashes[inputIndex], digestIndex)
+                # Make the hashes visible right away, even if stdout is a pipe
+                sys.stdout.flush()
+    finally:
+        if digestIndex is not None:
+            digestIndex.close()
+
+
+def printHash(options, algorithms, algorithmIndex, hashInputs, inputIndex, hash, digestIndex):
+    """Prints a single line of output for printHashes()."""
+    hash = str(hash)
+    if digestIndex is not None:
+        isKnown = digestIndex.containsHex(hash)
+        if isKnown is None:
+            return
+        elif isKnown:
+            hash += ": found"
+        else:
+            hash += ": not found"
+    if len(hashInputs) > 1:
+        label = hashInputs[inputIndex] + ": "
+    else:
+        label = ""
+    algorithm = algorithms[algorithmIndex]
+    algorithmName = algorithm.getName()
+    if len(algorithms) == 1:
+        print(label + hash)
+    elif not options.duplicateHashes:
+        print(label + algorithmName + ": " + hash)
+    else:
+        print(label + algorithmName + " (" + algorithm.getProvider().getAlgorithmSource(algorithmName) + "): " + hash)
+
+
+def prepareInputs(options, algorithms, hashInputs, encoding):
+    """Returns a list with a tuple (hashInputAsStr, hashInputAsBytes) for each
+    of hashInputs. Each tuple contains the variants of the input that are
+    required by at least one of the algorithm objects.
+
+    Raises a ConversionError if an input cannot be converted.
+    """
+    preparedInputs = list()
     if mkroesti.python2:
         # Hash input type handling is not required for Python 2.6
-        pass
+        for hashInput in hashInputs:
+            preparedInputs.append((hashInput, hashInput))
     else:
         # In Python 3 only: The input might be present as either type str or bytes.
         # We might need to convert from one to the other, depending on the
@@ -213,15 +483,6 @@ def main(args = None):
         # *binary* files into str. Should the user request an algorithm that
         # requires conversion to str, the result will be an error. If we were to
         # perform conversion up front, we would therefore *always* have an error.
-        hashInputType = type(hashInput)
-        if hashInputType is type(str()):
-            hashInputAsStr = hashInput
-            hashInputAsBytes = None
-        elif hashInputType == type(bytes()):
-            hashInputAsStr = None
-            hashInputAsBytes = hashInput
-        else:
-            raise MKRoestiError("Hash input object has unsupported type: " + str(hashInputType))
 
         # Find out what kind of input data we need to make all algorithms happy
         needBytesInput = False
@@ -232,53 +493,258 @@ def main(args = None):
             else:
                 needStrInput = True
 
-        # Perform the actual conversion
+        # Perform the actual conversion. All inputs are converted before the
+        # first hash is generated, so that a conversion error does not leave
+        # us with incomplete output.
         conversionRequired = False
-        if needBytesInput:
-            if hashInputAsBytes is None:
-                conversionRequired = True
-                try:
-                    hashInputAsBytes = hashInputAsStr.encode(encoding)
-                except UnicodeEncodeError:
-                    # This happens, for instance, if we try to encode a
-                    # character that does not exist in the encoding's target
-                    # character set (e.g. "β" does not exist in "iso-8859-1")
-                    raise ConversionError("Cannot convert input to binary data (the encoding used was '" + encoding + "')")
-        if needStrInput:
-            if hashInputAsStr is None:
-                conversionRequired = True
-                try:
-                    hashInputAsStr = hashInputAsBytes.decode(encoding)
-                except UnicodeDecodeError:
-                    # This happens, for instance, if we try to decode binary
-                    # data, because no encoding can sensibly decode binary data
-                    raise ConversionError("Cannot convert input to string data (the encoding used was '" + encoding + "')")
+        reinterpretationRequired = False
+        for hashInput in hashInputs:
+            hashInputType = type(hashInput)
+            if hashInputType is type(str()):
+                hashInputAsStr = hashInput
+                hashInputAsBytes = None
+            elif hashInputType == type(bytes()):
+                hashInputAsStr = None
+                hashInputAsBytes = hashInput
+            else:
+                raise MKRoestiError("Hash input object has unsupported type: " + str(hashInputType))
+            if needBytesInput:
+                if hashInputAsBytes is None:
+                    conversionRequired = True
+                    hashInputAsBytes = toBytes(hashInputAsStr, encoding)
+            if needStrInput:
+                if hashInputAsStr is None:
+                    conversionRequired = True
+                    hashInputAsStr = toStr(hashInputAsBytes, encoding)
+            if hashInputType is type(str()) and needBytesInput:
+                reinterpretationRequired = True
+            preparedInputs.append((hashInputAsStr, hashInputAsBytes))
 
         # Issue final warnings before we start generating hashes
         # Note: Only warn if the user explicitly specified --codec.
         if not conversionRequired and options.codec:
             print("Warning: Ignoring --codec because no conversion was required", file = sys.stderr)
-        if hashInputType is type(str()) and needBytesInput and options.codec:
+        if reinterpretationRequired and options.codec:
             print("Warning: Re-interpreting input data using encoding '" + encoding + "' (Python has already interpreted your input using a locale-based encoding)", file = sys.stderr)
 
-    # Create hashes
-    algorithmCount = len(algorithms)
-    for algorithm in algorithms:
+    return preparedInputs
+
+
+def readInputFile(fileName):
+    """Returns the entire content of the named file as binary data."""
+    try:
+        # Explicitly use "binary" mode. If omitted, Python 3 would open the
+        # file in text mode and interpret the file's content using the
+        # current default encoding - which might, or might not, produce the
+        # correct results. In Python 2.6, read() returns data as type str,
+        # but in its raw, uninterpreted form.
+        file = open(fileName, "rb")
+        try:
+            return file.read()
+        finally:
+            file.close()
+    except IOError as exc:
+        # TODO: We previously accessed exc.arg (singular), but changed this
+        # to exc.args (plural). Check if this (the plural) works with
+        # Python 2.6. Probably not...
+        errno, strerror = exc.args #@UnusedVariable
+        raise MKRoestiError(strerror)   # pass on detailed error description (e.g. "no such file")
+
+
+def streamInputFile(fileName, algorithms):
+    """Returns a list with the hashes of the content of the named file, one
+    for each algorithm object. The file is read only once, while it is being
+    hashed (see mkroesti.execution.hashStream()).
+    """
+    try:
+        file = open(fileName, "rb")
+    except IOError as exc:
+        errno, strerror = exc.args #@UnusedVariable
+        raise MKRoestiError(strerror)
+    try:
+        return hashStream(algorithms, file)
+    finally:
+        file.close()
+
+
+def identifyAlgorithms(options, algorithms, hashInput, encoding):
+    """Prints the names of those algorithms that generate the hash specified
+    by --identify for hashInput, one per line.
+    """
+    identifier = AlgorithmIdentifier(algorithms, encoding)
+    matches = identifier.identify(hashInput, options.identify)
+    if len(matches) == 0:
+        print("No algorithm generates this hash for this input", file = sys.stderr)
+    for algorithm in matches:
         algorithmName = algorithm.getName()
-        if mkroesti.python2:
-            hash = algorithm.getHash(hashInput)
+        if not options.duplicateHashes:
+            print(algorithmName)
         else:
-            if algorithm.needBytesInput():
-                hash = algorithm.getHash(hashInputAsBytes)
-            else:
-                hash = algorithm.getHash(hashInputAsStr)
-        if algorithmCount == 1:
-            print(hash)
+            print(algorithmName + " (" + algorithm.getProvider().getAlgorithmSource(algorithmName) + ")")
+
+
+def printCacheStatistics(hashCache):
+    """Prints the hit and miss counts of hashCache to sys.stderr. Does
+    nothing if hashCache is None.
+    """
+    if hashCache is None:
+        return
+    (hits, misses) = hashCache.getStatistics()
+    print("Cache statistics: " + str(hits) + " hits, " + str(misses) + " misses", file = sys.stderr)
+
+
+def readHmacKey(fileName, fileDescriptor):
+    """Returns the HMAC key (binary data) read from the named file, or from
+    the file descriptor if fileName is None.
+
+    The entire content is used as the key, including any trailing newline.
+    The key is deliberately never taken from the command line, where it would
+    be visible to other users in the system's list of processes.
+    """
+    try:
+        if fileName is not None:
+            file = open(fileName, "rb")
+            try:
+                key = file.read()
+            finally:
+                file.close()
         else:
-            if not options.duplicateHashes:
-                print(algorithmName + ": " + str(hash))
-            else:
-                print(algorithmName + " (" + algorithm.getProvider().getAlgorithmSource(algorithmName) + "): " + str(hash))
+            # Read until EOF without closing the file descriptor, which is
+            # owned by whoever started the process
+            chunks = list()
+            while True:
+                chunk = os.read(fileDescriptor, 65536)
+                if len(chunk) == 0:
+                    break
+                chunks.append(chunk)
+            key = b"".join(chunks)
+    except (IOError, OSError) as exc:
+        raise MKRoestiError("Cannot read HMAC key: " + str(exc))
+    if len(key) == 0:
+        raise MKRoestiError("HMAC key is empty")
+    return key
+
+
+def createHmacAlgorithms(algorithms, key):
+    """Returns a list of HmacAlgorithm objects that wrap those of the given
+    algorithm objects that can be used with a key. The others are skipped
+    (e.g. checksums and salted algorithms that are part of an alias).
+
+    Raises an MKRoestiError if none of the algorithm objects can be used with
+    a key.
+    """
+    hmacAlgorithms = [HmacAlgorithm(algorithm, key) for algorithm in algorithms if HmacAlgorithm.isSupported(algorithm)]
+    if len(hmacAlgorithms) == 0:
+        raise MKRoestiError("None of the specified algorithms can be used with an HMAC key")
+    return hmacAlgorithms
+
+
+def readPrefix(fileName):
+    """Returns the prefix (binary data) read from the named file.
+
+    The entire content is used as the prefix, including any trailing newline.
+    """
+    try:
+        file = open(fileName, "rb")
+        try:
+            return file.read()
+        finally:
+            file.close()
+    except IOError as exc:
+        raise MKRoestiError("Cannot read prefix: " + str(exc))
+
+
+def createPrefixAlgorithms(algorithms, prefix):
+    """Returns a list of PrefixAlgorithm objects that wrap those of the given
+    algorithm objects that can be used with a prefix. The others are skipped
+    (e.g. salted algorithms that are part of an alias).
+
+    Raises an MKRoestiError if none of the algorithm objects can be used with
+    a prefix.
+    """
+    prefixAlgorithms = [PrefixAlgorithm(algorithm, prefix) for algorithm in algorithms if PrefixAlgorithm.isSupported(algorithm)]
+    if len(prefixAlgorithms) == 0:
+        raise MKRoestiError("None of the specified algorithms can be used with a prefix")
+    return prefixAlgorithms
+
+
+def storeHashes(fileName, inputIds, algorithms, hashesByAlgorithm):
+    """Stores hashes in the SQLite database fileName instead of printing them.
+
+    hashesByAlgorithm contains one list of hashes for each algorithm object in
+    algorithms. Each list contains one hash for each input in inputIds.
+    """
+    store = SqliteResultStore(fileName)
+    try:
+        for (algorithm, hashes) in zip(algorithms, hashesByAlgorithm):
+            algorithmName = algorithm.getName()
+            source = algorithm.getProvider().getAlgorithmSource(algorithmName)
+            rows = list()
+            for (inputId, hash) in zip(inputIds, hashes):
+                # Some algorithms (e.g. crypt-blowfish) return binary data
+                if type(hash) is bytes:
+                    hash = hash.decode("ascii")
+                rows.append((inputId, algorithmName, source, hash))
+            store.addResults(rows)
+    finally:
+        store.close()
+
+
+def hashCsv(options, algorithms, encoding, hashCache = None):
+    """Hashes the CSV columns named by --csv.
+
+    The CSV data is read from the file specified by --file, or from sys.stdin
+    if --file was not specified. The result is written to sys.stdout.
+    """
+    columnNames = options.csvColumns.split(",")
+    delimiter = options.csvDelimiter
+    if delimiter == "tab":
+        delimiter = "\t"
+    hasher = CsvColumnHasher(algorithms, columnNames, options.csvAppend, encoding,
+                             options.chunkSize, delimiter, hashCache)
+    inputFile = openTextInput(options.file, encoding)
+    try:
+        hasher.process(inputFile, sys.stdout)
+    except UnicodeDecodeError:
+        raise ConversionError("Cannot read CSV data (the encoding used was '" + encoding + "')")
+    finally:
+        if options.file is not None:
+            inputFile.close()
+
+
+def readDigests(inputFile):
+    """Generator that yields the hexadecimal digests read from inputFile,
+    one per line.
+
+    Only the first whitespace separated field of each line is used, so that
+    the output of tools such as sha256sum can be read directly. Empty lines
+    are ignored.
+    """
+    for line in inputFile:
+        fields = line.split()
+        if len(fields) == 0:
+            continue
+        # sha256sum and friends prefix the line with a backslash if the file
+        # name contains special characters
+        yield fields[0].lstrip("\\")
+
+
+def openTextInput(fileName, encoding):
+    """Returns a text mode file object that reads from the named file, or
+    from sys.stdin if fileName is None.
+
+    The file object does not translate newlines. This is required by the csv
+    module, otherwise newlines embedded in quoted fields are not handled
+    correctly.
+    """
+    if fileName is not None:
+        try:
+            return io.open(fileName, "r", encoding = encoding, newline = "")
+        except IOError as exc:
+            errno, strerror = exc.args #@UnusedVariable
+            raise MKRoestiError(strerror)   # pass on detailed error description (e.g. "no such file")
+    else:
+        return io.TextIOWrapper(sys.stdin.buffer, encoding = encoding, newline = "")
 
 
 def registerProviders(providerModuleNames):
@@ -357,12 +823,18 @@ def listAlgorithms():
 
 def setupOptionParser():
     usage = """
-    %prog [-a LIST] [-d] [-x] [-p LIST] [-c CODEC] [-e]
-    %prog [-a LIST] [-d] [-x] [-p LIST] [-c CODEC] -b input
-    %prog [-a LIST] [-d] [-x] [-p LIST] [-c CODEC] -f file
+    %prog [-a LIST] [-d] [-x] [-p LIST] [-c CODEC] [KEY] [-j N [--processes] [--unordered]] [--check-index INDEX] [-e]
+    %prog [-a LIST] [-d] [-x] [-p LIST] [-c CODEC] [KEY] [-j N [--processes] [--chunk-size N] [--unordered]] [--cache SIZE] [--sqlite FILE | --check-index INDEX] -b input [input ...]
+    %prog [-a LIST] [-d] [-x] [-p LIST] [-c CODEC] [KEY] [-j N [--processes] [--unordered]] [--sqlite FILE | --check-index INDEX] -f file
+    %prog [-a LIST] [-d] [-x] [-p LIST] [-c CODEC] --identify HASH [-e | -b input | -f file]
+    %prog [-a LIST] [-d] [-x] [-p LIST] [-c CODEC] [KEY] [--cache SIZE] --csv COLUMNS [--csv-append] [--csv-delimiter CHAR] [--chunk-size N] [-f file]
+    %prog -a ALGORITHM [-x] [-p LIST] [-c CODEC] [-j N] [--chunk-size N] --passwd FORMAT [-f file]
+    %prog [-d] [-x] [-p LIST] [-c CODEC] [--cache SIZE] --serve-stdio
+    %prog [-c CODEC] --build-index INDEX [-f file]
     %prog -l [-x] [-p LIST]
     %prog -V
-    %prog -h"""
+    %prog -h
+    (KEY is one of --hmac-key-file FILE, --hmac-key-fd FD or --prefix-file FILE)"""
 
     parser = OptionParser(usage = usage)
     # "dest" is the name that can be used to refer to the option's value when
@@ -375,7 +847,7 @@ def setupOptionParser():
                       help="comma separated list of algorithms for which to generate hashes; see man page for details")
     parser.add_option("-b", "--batch",
                       action="store_true", dest="batch", default=False,
-                      help="use batch mode; i.e., get the input from the command line rather than prompting for it; this option should be used with extreme care, since if the input is a password, it will be visible to any program or user looking at the system's list of processes at the time when mkroesti is run")
+                      help="use batch mode; i.e., get one or more inputs from the command line rather than prompting for it; this option should be used with extreme care, since if the input is a password, it will be visible to any program or user looking at the system's list of processes at the time when mkroesti is run")
     parser.add_option("-c", "--codec",
                       action="store", dest="codec", metavar="CODEC", default=None,
                       help="interpret the input using the character encoding named CODEC; see man page for details")
@@ -388,12 +860,63 @@ def setupOptionParser():
     parser.add_option("-f", "--file",
                       action="store", dest="file", metavar="FILE",
                       help="read the input from FILE")
+    parser.add_option("-j", "--jobs",
+                      action="store", type="int", dest="jobs", metavar="N", default=1,
+                      help="use up to N parallel workers; see man page for details [default: %default]")
     parser.add_option("-l", "--list",
                       action="store_true", dest="list", default=False,
                       help="list supported algorithms, which ones are available, and which implementation sources exist for them")
     parser.add_option("-p", "--providers",
                       action="store", dest="providers", metavar="PROVIDERS", default=None,
                       help="comma separated list of third party Python modules that provide hash algorithms; see man page for details")
+    parser.add_option("--build-index",
+                      action="store", dest="buildIndex", metavar="INDEX", default=None,
+                      help="use index build mode; i.e. read hexadecimal digests, one per line, from FILE or stdin, and write a sorted digest index to the file INDEX; see man page for details")
+    parser.add_option("--check-index",
+                      action="store", dest="checkIndex", metavar="INDEX", default=None,
+                      help="check whether the generated hashes are contained in the digest index INDEX, created by --build-index; see man page for details")
+    parser.add_option("--csv",
+                      action="store", dest="csvColumns", metavar="COLUMNS", default=None,
+                      help="use CSV mode; i.e. read CSV data from FILE or stdin, and replace the values of the comma separated list of COLUMNS with their hash; see man page for details")
+    parser.add_option("--csv-append",
+                      action="store_true", dest="csvAppend", default=False,
+                      help="in CSV mode, append hashes as new columns instead of replacing the original values")
+    parser.add_option("--csv-delimiter",
+                      action="store", dest="csvDelimiter", metavar="CHAR", default=",",
+                      help="in CSV mode, use CHAR to delimit fields (specify \"tab\" for tab separated data) [default: %default]")
+    parser.add_option("--cache",
+                      action="store", type="int", dest="cacheSize", metavar="SIZE", default=0,
+                      help="remember the hashes of up to SIZE recently seen inputs, and print cache statistics to stderr; salted algorithms are never cached [default: %default, i.e. no cache]")
+    parser.add_option("--chunk-size",
+                      action="store", type="int", dest="chunkSize", metavar="N", default=CsvColumnHasher.defaultChunkSize,
+                      help="in CSV or password file mode, process N rows or records at a time; with --processes, send N inputs at a time to a worker process [default: %default]")
+    parser.add_option("--hmac-key-file",
+                      action="store", dest="hmacKeyFile", metavar="FILE", default=None,
+                      help="generate keyed hashes (HMAC) with the key read from FILE; algorithms that cannot be used with a key are skipped; see man page for details")
+    parser.add_option("--hmac-key-fd",
+                      action="store", type="int", dest="hmacKeyFd", metavar="FD", default=None,
+                      help="same as --hmac-key-file, but read the key from the already open file descriptor FD")
+    parser.add_option("--prefix-file",
+                      action="store", dest="prefixFile", metavar="FILE", default=None,
+                      help="hash the content of FILE followed by the input, instead of only the input; algorithms that cannot be used with a prefix are skipped; see man page for details")
+    parser.add_option("--processes",
+                      action="store_true", dest="processes", default=False,
+                      help="run the algorithms in --jobs worker processes instead of threads; see man page for details")
+    parser.add_option("--unordered",
+                      action="store_true", dest="unordered", default=False,
+                      help="with --jobs, print the hashes of each algorithm as soon as the algorithm has finished, instead of in the usual order; see man page for details")
+    parser.add_option("--identify",
+                      action="store", dest="identify", metavar="HASH", default=None,
+                      help="instead of printing hashes, print the names of the algorithms that generate HASH for the input; see man page for details")
+    parser.add_option("--passwd",
+                      action="store", dest="passwdFormat", metavar="FORMAT", type="choice", choices=["htpasswd", "shadow"], default=None,
+                      help="use password file mode; i.e. read user:password records from FILE or stdin, and write password file lines in FORMAT (htpasswd or shadow); see man page for details")
+    parser.add_option("--serve-stdio",
+                      action="store_true", dest="serveStdio", default=False,
+                      help="use co-process mode; i.e. read length-prefixed hash requests from stdin and write responses to stdout until stdin is closed; see man page for details")
+    parser.add_option("--sqlite",
+                      action="store", dest="sqliteFile", metavar="FILE", default=None,
+                      help="in batch mode or when reading input from file, store the hashes in the SQLite database FILE instead of printing them; see man page for details")
     parser.add_option("-x", "--exclude-builtins",
                       action="store_true", dest="excludeBuiltins", default=False,
                       help="exclude built-in algorithms from the operation of mkroesti")
@@ -0,0 +1,304 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains the PasswordFileGenerator class, which generates password files
+in htpasswd or shadow format from "user:password" records, and the function
+verifyPasswords(), which verifies many passwords against stored crypt hashes.
+
+Generating or verifying a salted crypt hash is CPU intensive by design. Both
+can therefore spread the work across a pool of worker processes. Each worker
+process sets up its own provider registry once, when the worker is started,
+creates algorithm objects the first time they are needed, and then processes
+as many passwords as it is given.
+"""
+
+
+# PSL
+import functools
+import itertools
+import multiprocessing
+import time
+
+# mkroesti
+from mkroesti import factory
+from mkroesti.conversion import convertInput
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.names import * #@UnusedWildImport
+from mkroesti.registry import ProviderRegistry
+
+
+FORMAT_HTPASSWD = "htpasswd"
+FORMAT_SHADOW = "shadow"
+
+# The algorithms that can be used to generate a password file
+CRYPT_ALGORITHM_NAMES = (ALGORITHM_CRYPT_DES, ALGORITHM_CRYPT_MD5,
+                         ALGORITHM_CRYPT_SHA_256, ALGORITHM_CRYPT_SHA_512,
+                         ALGORITHM_CRYPT_APR1, ALGORITHM_CRYPT_BLOWFISH)
+
+# Maps the signature at the start of a crypt hash to the algorithm that
+# generated the hash. crypt-des hashes have no signature.
+CRYPT_SIGNATURES = (("$1$", ALGORITHM_CRYPT_MD5),
+                    ("$5$", ALGORITHM_CRYPT_SHA_256),
+                    ("$6$", ALGORITHM_CRYPT_SHA_512),
+                    ("$apr1$", ALGORITHM_CRYPT_APR1),
+                    ("$2$", ALGORITHM_CRYPT_BLOWFISH),
+                    ("$2a$", ALGORITHM_CRYPT_BLOWFISH),
+                    ("$2b$", ALGORITHM_CRYPT_BLOWFISH),
+                    ("$2y$", ALGORITHM_CRYPT_BLOWFISH))
+
+defaultChunkSize = 1000
+
+
+class PasswordFileGenerator:
+    """Generates password file lines from "user:password" records.
+
+    Records are processed in chunks of a configurable size. If more than one
+    job is requested, the passwords of a chunk are hashed by a pool of worker
+    processes. Regardless of the number of jobs, lines are always generated in
+    the same order as the records they were generated from.
+    """
+
+    def __init__(self, algorithmName, fileFormat = FORMAT_HTPASSWD, jobs = 1,
+                 providerModuleNames = None, encoding = None, chunkSize = None):
+        """Initialize with the name of a crypt algorithm.
+
+        If jobs is greater than 1, each worker process registers the providers
+        from the modules named in providerModuleNames (see
+        mkroesti.main.registerProviders()). Providers that are registered in
+        this process are not available to worker processes.
+
+        encoding is used to convert passwords if the algorithm requires binary
+        input.
+        """
+        if algorithmName not in CRYPT_ALGORITHM_NAMES:
+            raise MKRoestiError("Cannot generate password file with algorithm " + algorithmName + " (supported algorithms: " + ", ".join(CRYPT_ALGORITHM_NAMES) + ")")
+        if fileFormat not in (FORMAT_HTPASSWD, FORMAT_SHADOW):
+            raise MKRoestiError("Unknown password file format: " + str(fileFormat))
+        if jobs < 1:
+            raise MKRoestiError("Number of jobs must be greater than 0")
+        if chunkSize is None:
+            chunkSize = defaultChunkSize
+        if chunkSize < 1:
+            raise MKRoestiError("Chunk size must be greater than 0")
+        if providerModuleNames is None:
+            providerModuleNames = ["mkroesti.provider"]
+        # Fail early if the algorithm is not available. Raises the same errors
+        # as AlgorithmFactory.createAlgorithms().
+        factory.AlgorithmFactory.createAlgorithms(algorithmName)
+        self.algorithmName = algorithmName
+        self.fileFormat = fileFormat
+        self.jobs = jobs
+        self.providerModuleNames = providerModuleNames[:]   # make a copy
+        self.encoding = encoding
+        self.chunkSize = chunkSize
+        # The shadow file stores the date of the last password change as the
+        # number of days since Jan 1, 1970
+        self.lastChange = int(time.time() // 86400)
+
+    def process(self, inputFile, outputFile):
+        """Reads "user:password" records from inputFile and writes password
+        file lines to outputFile.
+
+        Both arguments must be file objects in text mode. Empty lines in
+        inputFile are ignored. Returns the number of lines that were written.
+        """
+        lineCount = 0
+        for line in self.generate(self.readRecords(inputFile)):
+            outputFile.write(line + "\n")
+            lineCount += 1
+        return lineCount
+
+    def generate(self, records):
+        """Returns an iterator over password file lines, one line for each
+        (user, password) tuple in records.
+        """
+        # Keep the records so that the user names can be reunited with the
+        # hashes. Both sequences are consumed in lockstep, so at most one
+        # chunk of records is buffered.
+        (records, passwordRecords) = itertools.tee(records)
+        passwords = (password for (user, password) in passwordRecords) #@UnusedVariable
+        function = functools.partial(hashPassword, self.algorithmName)
+        hashes = mapInChunks(function, passwords, self.jobs, self.providerModuleNames,
+                             self.encoding, self.chunkSize)
+        for ((user, password), hash) in zip(records, hashes): #@UnusedVariable
+            yield self.formatLine(user, hash)
+
+    def formatLine(self, user, hash):
+        """Returns a password file line for the given user and hash."""
+        if FORMAT_HTPASSWD == self.fileFormat:
+            return user + ":" + hash
+        else:
+            # name:password:lastchg:min:max:warn:inactive:expire:reserved
+            return user + ":" + hash + ":" + str(self.lastChange) + ":0:99999:7:::"
+
+    @staticmethod
+    def readRecords(inputFile):
+        """Returns an iterator over (user, password) tuples read from the
+        "user:password" lines of inputFile.
+
+        The password is everything after the first colon, and may therefore
+        contain colons itself.
+        """
+        lineNumber = 0
+        for line in inputFile:
+            lineNumber += 1
+            line = line.rstrip("\r\n")
+            if len(line) == 0:
+                continue
+            if ":" not in line:
+                raise MKRoestiError("Line " + str(lineNumber) + " is not a user:password record")
+            (user, password) = line.split(":", 1)
+            yield (user, password)
+
+
+def identifyCryptAlgorithm(storedHash):
+    """Returns the name of the crypt algorithm that generated storedHash, or
+    None if storedHash does not look like a crypt hash.
+    """
+    for (signature, algorithmName) in CRYPT_SIGNATURES:
+        if storedHash.startswith(signature):
+            return algorithmName
+    # Traditional DES-based crypt: 2 characters salt plus 11 characters hash,
+    # all of them from the alphabet [./0-9A-Za-z]
+    if len(storedHash) == 13 and not storedHash.startswith("$"):
+        return ALGORITHM_CRYPT_DES
+    return None
+
+
+def verifyPasswords(records, jobs = 1, providerModuleNames = None, encoding = None, chunkSize = None):
+    """Verifies passwords against stored crypt hashes.
+
+    records is an iterable of (password, storedHash) tuples, where storedHash
+    is a string. Returns an
+    iterator over booleans, one for each record, in the same order as the
+    records. A boolean is True if the password matches the stored hash.
+
+    The algorithm of each record is identified from the signature of the stored
+    hash (e.g. "$6$" for crypt-sha-512), the algorithm's verify() method then
+    extracts the salt and all other parameters. Records whose stored hash cannot
+    be identified are not verified; the result for them is always False.
+
+    The remaining arguments have the same meaning as for PasswordFileGenerator.
+    """
+    if jobs < 1:
+        raise MKRoestiError("Number of jobs must be greater than 0")
+    if chunkSize is None:
+        chunkSize = defaultChunkSize
+    if chunkSize < 1:
+        raise MKRoestiError("Chunk size must be greater than 0")
+    if providerModuleNames is None:
+        providerModuleNames = ["mkroesti.provider"]
+    return mapInChunks(verifyPassword, records, jobs, providerModuleNames, encoding, chunkSize)
+
+
+def mapInChunks(function, items, jobs, providerModuleNames, encoding, chunkSize):
+    """Returns an iterator over the results of applying function to each of
+    items, in the same order as items.
+
+    items are processed in chunks of chunkSize. If jobs is greater than 1, each
+    chunk is distributed across a pool of worker processes that have been set
+    up with initializeWorker(). Otherwise function is applied in the current
+    process.
+    """
+    items = iter(items)
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs, initializeWorker, (providerModuleNames, encoding))
+    else:
+        initializeWorker(None, encoding)
+    try:
+        while True:
+            chunk = list(itertools.islice(items, chunkSize))
+            if len(chunk) == 0:
+                break
+            if pool is None:
+                results = [function(item) for item in chunk]
+            else:
+                # Pool.map() preserves order. Split the chunk so that each
+                # worker gets roughly the same number of items.
+                results = pool.map(function, chunk, max(1, len(chunk) // (jobs * 4)))
+            for result in results:
+                yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+# Algorithm objects and encoding used by hashPassword() and verifyPassword().
+# These are module globals because in a worker process they must survive from
+# initializeWorker() to the many subsequent hashPassword() and verifyPassword()
+# calls.
+workerAlgorithms = dict()
+workerEncoding = None
+
+
+def initializeWorker(providerModuleNames, encoding):
+    """Prepares the current process for hashPassword() and verifyPassword()
+    calls.
+
+    If providerModuleNames is not None, a new provider registry is set up with
+    the providers from the named modules. This is necessary in worker processes
+    that are not forked, and therefore do not inherit the registry from their
+    parent process.
+    """
+    global workerEncoding
+    if providerModuleNames is not None:
+        # Avoid circular import; mkroesti.main imports this module
+        from mkroesti.main import registerProviders
+        ProviderRegistry.deleteInstance()
+        registerProviders(providerModuleNames)
+        # The worker never registers more providers
+        ProviderRegistry.getInstance().freeze()
+    workerAlgorithms.clear()
+    workerEncoding = encoding
+
+
+def getWorkerAlgorithm(algorithmName):
+    """Returns the algorithm object for the given algorithm name, creating the
+    object on first use.
+    """
+    if algorithmName not in workerAlgorithms:
+        workerAlgorithms[algorithmName] = factory.AlgorithmFactory.createAlgorithms(algorithmName)[0]
+    return workerAlgorithms[algorithmName]
+
+
+def hashPassword(algorithmName, password):
+    """Returns the hash of password as a string, generated with the named
+    algorithm.
+    """
+    algorithm = getWorkerAlgorithm(algorithmName)
+    hash = algorithm.getHash(convertInput(password, algorithm, workerEncoding))
+    # Some algorithms (e.g. crypt-blowfish) return binary data
+    if type(hash) is bytes:
+        hash = hash.decode("ascii")
+    return hash
+
+
+def verifyPassword(record):
+    """Returns True if the password in record, a (password, storedHash) tuple,
+    matches the stored hash.
+    """
+    (password, storedHash) = record
+    algorithmName = identifyCryptAlgorithm(storedHash)
+    if algorithmName is None:
+        return False
+    algorithm = getWorkerAlgorithm(algorithmName)
+    return algorithm.verify(convertInput(password, algorithm, workerEncoding), storedHash)
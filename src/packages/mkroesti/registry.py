@@ -18,9 +18,12 @@
 # along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
 
 
-"""Contains the ProviderRegistry class."""
+"""Contains the ProviderRegistry and FrozenProviderRegistry classes."""
 
 
+# PSL
+import threading
+
 # mkroesti
 from mkroesti.errorhandling import MKRoestiError
 from mkroesti.errorhandling import (DuplicateProviderError,
@@ -60,34 +63,73 @@ class ProviderRegistry:
 
     ProviderRegistry is a singleton. The singleton accessor (and creator)
     is ProviderRegistry.getInstance().
+
+    ProviderRegistry may be used by several threads at the same time.
+    Providers are registered under a lock, but queries do not take the lock:
+    addProvider() never modifies the tuple of registered providers, instead it
+    replaces the tuple with a new one, so a query always sees a consistent set
+    of providers. Once all providers are registered, freeze() may be called to
+    replace the singleton with a FrozenProviderRegistry, which answers queries
+    from precomputed results.
     """
 
     _instance = None
+    # Protects _instance
+    _instanceLock = threading.Lock()
 
     @staticmethod
     def getInstance():
         """Access the singleton."""
-        if None == ProviderRegistry._instance:
-            ProviderRegistry._instance = ProviderRegistry()
-        return ProviderRegistry._instance
+        instance = ProviderRegistry._instance
+        if None == instance:
+            with ProviderRegistry._instanceLock:
+                # Another thread may have created the singleton while we
+                # were waiting for the lock
+                if None == ProviderRegistry._instance:
+                    ProviderRegistry._instance = ProviderRegistry()
+                instance = ProviderRegistry._instance
+        return instance
 
     @staticmethod
     def deleteInstance():
         """Remove the reference to the singleton instance."""
-        if None != ProviderRegistry._instance:
+        with ProviderRegistry._instanceLock:
             ProviderRegistry._instance = None
 
     def __init__(self):
         """Create the singleton."""
         if None != ProviderRegistry._instance:
             raise MKRoestiError("Only one instance of ProviderRegistry is allowed!")
-        self.providers = list()
+        self.providers = tuple()
+        self.lock = threading.Lock()
+        self.frozen = False
 
     def addProvider(self, provider):
-        """Adds a provider object to this registry."""
-        if provider in self.providers:
-            raise DuplicateProviderError("Providers can be registered only once!")
-        self.providers.append(provider)
+        """Adds a provider object to this registry.
+
+        Raises MKRoestiError if this registry has been frozen.
+        """
+        with self.lock:
+            if self.frozen:
+                raise MKRoestiError("Providers cannot be registered after the registry has been frozen")
+            if provider in self.providers:
+                raise DuplicateProviderError("Providers can be registered only once!")
+            self.providers = self.providers + (provider,)
+
+    def freeze(self):
+        """Returns a FrozenProviderRegistry with the providers that are
+        currently registered. Afterwards no more providers can be registered.
+
+        If this registry is the singleton, the FrozenProviderRegistry becomes
+        the singleton, i.e. it is returned by all future getInstance() calls.
+        """
+        with self.lock:
+            self.frozen = True
+        frozenRegistry = FrozenProviderRegistry(self)
+        with ProviderRegistry._instanceLock:
+            if ProviderRegistry._instance is self:
+                ProviderRegistry._instance = frozenRegistry
+        return frozenRegistry
 
     def getProviders(self, algorithmName):
         """Returns a list of providers that the given algorithm is known to.
@@ -206,3 +248,100 @@ class ProviderRegistry:
         # says we must return a list object. Use list() to explicitly return
         # a list object.
         return list(unifyingDict.keys())
+
+
+class FrozenProviderRegistry:
+    """Immutable snapshot of a ProviderRegistry, created by
+    ProviderRegistry.freeze().
+
+    FrozenProviderRegistry has the same queries as ProviderRegistry. The
+    results of all queries are computed once, when the snapshot is created;
+    queries then only look up the precomputed results, and do not need a lock
+    when they are made by several threads at the same time. Queries return
+    copies of the precomputed lists, so clients may modify the lists without
+    affecting the snapshot.
+    """
+
+    def __init__(self, registry):
+        """Initialize with the providers registered in the ProviderRegistry
+        object registry, which must not change anymore.
+        """
+        self.providers = registry.providers
+        self.algorithmNames = tuple(registry.getAlgorithmNames())
+        self.availableAlgorithmNames = tuple(registry.getAvailableAlgorithmNames())
+        self.aliasNames = tuple(registry.getAliasNames())
+        self.availableAliasNames = tuple(registry.getAvailableAliasNames())
+        self.knownAlgorithmNames = frozenset(self.algorithmNames)
+        self.knownAvailableAlgorithmNames = frozenset(self.availableAlgorithmNames)
+        self.knownAliasNames = frozenset(self.aliasNames)
+        self.knownAvailableAliasNames = frozenset(self.availableAliasNames)
+        self.providersByAlgorithm = dict()
+        for algorithmName in self.algorithmNames:
+            self.providersByAlgorithm[algorithmName] = tuple(registry.getProviders(algorithmName))
+        # Values are a tuple of algorithm names, or the error raised by
+        # resolveAlias()
+        self.resolvedAliases = dict()
+        for aliasName in self.aliasNames:
+            try:
+                self.resolvedAliases[aliasName] = tuple(registry.resolveAlias(aliasName))
+            except MKRoestiError as error:
+                self.resolvedAliases[aliasName] = error
+
+    def addProvider(self, provider):
+        """Raises MKRoestiError, a frozen registry cannot be modified."""
+        raise MKRoestiError("Providers cannot be registered after the registry has been frozen")
+
+    def freeze(self):
+        """Returns this object, which is already frozen."""
+        return self
+
+    def getProviders(self, algorithmName):
+        """See ProviderRegistry.getProviders()."""
+        if algorithmName not in self.providersByAlgorithm:
+            raise UnknownAlgorithmError(algorithmName)
+        return list(self.providersByAlgorithm[algorithmName])
+
+    def getAlgorithmNames(self):
+        """See ProviderRegistry.getAlgorithmNames()."""
+        return list(self.algorithmNames)
+
+    def getAvailableAlgorithmNames(self):
+        """See ProviderRegistry.getAvailableAlgorithmNames()."""
+        return list(self.availableAlgorithmNames)
+
+    def isAlgorithmKnown(self, algorithmName):
+        """See ProviderRegistry.isAlgorithmKnown()."""
+        return (algorithmName in self.knownAlgorithmNames)
+
+    def isAlgorithmAvailable(self, algorithmName):
+        """See ProviderRegistry.isAlgorithmAvailable()."""
+        if algorithmName not in self.knownAlgorithmNames:
+            raise UnknownAlgorithmError(algorithmName)
+        return (algorithmName in self.knownAvailableAlgorithmNames)
+
+    def getAliasNames(self):
+        """See ProviderRegistry.getAliasNames()."""
+        return list(self.aliasNames)
+
+    def getAvailableAliasNames(self):
+        """See ProviderRegistry.getAvailableAliasNames()."""
+        return list(self.availableAliasNames)
+
+    def isAliasKnown(self, aliasName):
+        """See ProviderRegistry.isAliasKnown()."""
+        return (aliasName in self.knownAliasNames)
+
+    def isAliasAvailable(self, aliasName):
+        """See ProviderRegistry.isAliasAvailable()."""
+        if aliasName not in self.knownAliasNames:
+            raise UnknownAliasError(aliasName)
+        return (aliasName in self.knownAvailableAliasNames)
+
+    def resolveAlias(self, aliasName):
+        """See ProviderRegistry.resolveAlias()."""
+        if aliasName not in self.resolvedAliases:
+            raise UnknownAliasError(aliasName)
+        algorithmNames = self.resolvedAliases[aliasName]
+        if isinstance(algorithmNames, MKRoestiError):
+            raise algorithmNames
+        return list(algorithmNames)
@@ -0,0 +1,129 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains the SqliteResultStore class."""
+
+
+# PSL
+import sqlite3
+
+# mkroesti
+from mkroesti.errorhandling import MKRoestiError
+
+
+class SqliteResultStore:
+    """Stores hashes in an SQLite database so that they can be queried later.
+
+    Each hash is stored as a row (input, algorithm, source, hash) in the table
+    "hashes". input identifies what was hashed (e.g. the input string, or the
+    name of the file that was read), source is the algorithm source reported
+    by the provider.
+
+    SqliteResultStore is designed to load large numbers of hashes quickly:
+    Rows are buffered and inserted with executemany() in batches of batchSize
+    rows, and a transaction is committed only every transactionSize rows. The
+    database uses write-ahead logging. Indexes are dropped when the store is
+    opened and built again by close(), after all rows have been loaded,
+    because maintaining indexes during a bulk load is much slower than
+    building them once.
+
+    Clients must call close() when they are done, otherwise the rows added
+    since the last commit are lost.
+    """
+
+    defaultBatchSize = 10000
+    defaultTransactionSize = 500000
+
+    # Tuples (index name, column name)
+    indexes = [("hashes_input", "input"), ("hashes_hash", "hash")]
+
+    def __init__(self, fileName, batchSize = None, transactionSize = None):
+        """Initialize with the name of the database file. The file is created
+        if it does not exist. Rows from previous runs are kept.
+        """
+        if batchSize is None:
+            batchSize = SqliteResultStore.defaultBatchSize
+        if transactionSize is None:
+            transactionSize = SqliteResultStore.defaultTransactionSize
+        if batchSize < 1:
+            raise MKRoestiError("Batch size must be greater than 0")
+        if transactionSize < batchSize:
+            raise MKRoestiError("Transaction size must not be less than batch size")
+        self.batchSize = batchSize
+        self.transactionSize = transactionSize
+        self.pendingRows = list()
+        self.uncommittedRowCount = 0
+        self.rowCount = 0
+        try:
+            self.connection = sqlite3.connect(fileName)
+            cursor = self.connection.cursor()
+            cursor.execute("PRAGMA journal_mode = WAL")
+            # With WAL, NORMAL is still safe against corruption, only the most
+            # recent transactions may be lost if the system crashes
+            cursor.execute("PRAGMA synchronous = NORMAL")
+            cursor.execute("CREATE TABLE IF NOT EXISTS hashes (input TEXT, algorithm TEXT, source TEXT, hash TEXT)")
+            for (indexName, columnName) in SqliteResultStore.indexes:
+                cursor.execute("DROP INDEX IF EXISTS " + indexName)
+            self.connection.commit()
+        except sqlite3.Error as exc:
+            raise MKRoestiError("Cannot open SQLite database " + fileName + ": " + str(exc))
+
+    def addResult(self, input, algorithmName, source, hash):
+        """Adds a single hash to the store."""
+        self.pendingRows.append((input, algorithmName, source, hash))
+        if len(self.pendingRows) >= self.batchSize:
+            self.flush()
+
+    def addResults(self, rows):
+        """Adds many hashes to the store. rows is an iterable of tuples
+        (input, algorithm name, source, hash).
+        """
+        for row in rows:
+            self.pendingRows.append(row)
+            if len(self.pendingRows) >= self.batchSize:
+                self.flush()
+
+    def flush(self):
+        """Inserts all buffered rows. Commits the current transaction if it
+        has grown to transactionSize rows.
+        """
+        if len(self.pendingRows) == 0:
+            return
+        self.connection.executemany("INSERT INTO hashes VALUES (?, ?, ?, ?)", self.pendingRows)
+        self.uncommittedRowCount += len(self.pendingRows)
+        self.rowCount += len(self.pendingRows)
+        self.pendingRows = list()
+        if self.uncommittedRowCount >= self.transactionSize:
+            self.connection.commit()
+            self.uncommittedRowCount = 0
+
+    def close(self):
+        """Inserts and commits all remaining rows, builds the indexes and
+        closes the database. Returns the number of rows added.
+        """
+        try:
+            self.flush()
+            self.connection.commit()
+            for (indexName, columnName) in SqliteResultStore.indexes:
+                self.connection.execute("CREATE INDEX IF NOT EXISTS " + indexName + " ON hashes (" + columnName + ")")
+            self.connection.commit()
+        finally:
+            self.connection.close()
+        return self.rowCount
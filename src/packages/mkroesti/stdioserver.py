@@ -0,0 +1,181 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Contains the StdioServer class, which implements the co-process protocol
+used by "mkroesti --serve-stdio".
+
+The protocol is based on frames. A frame consists of a 4 byte length prefix
+(an unsigned integer in network byte order, i.e. big-endian), followed by as
+many bytes of data as the length prefix specifies.
+
+A request consists of two frames:
+1. The algorithm specification: A comma separated list of algorithm and/or
+   alias names, encoded as UTF-8. This is the same as the argument of the
+   --algorithms command line option.
+2. The payload: The raw binary data that should be hashed.
+
+A response also consists of two frames:
+1. The status: Either "ok" or "error", encoded as UTF-8.
+2. If the status is "ok": One line of text for each hash that was generated,
+   encoded as UTF-8. Each line has three fields that are separated by a tab
+   character: The algorithm name, the implementation source and the hash. If
+   the status is "error": A description of the error, encoded as UTF-8.
+
+Requests are processed strictly in order, and each request produces exactly
+one response. The server terminates when it reaches the end of its input on a
+frame boundary.
+"""
+
+
+# PSL
+import struct
+
+# mkroesti
+from mkroesti import factory
+from mkroesti.conversion import convertInput
+from mkroesti.errorhandling import * #@UnusedWildImport
+
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+class StdioServer:
+    """Serves hash requests that arrive as frames on an input stream, and
+    writes responses as frames to an output stream.
+
+    Algorithm objects are created only once for each distinct algorithm
+    specification, and are then reused for all subsequent requests that use
+    the same specification.
+    """
+
+    lengthPrefixFormat = ">I"
+    lengthPrefixSize = struct.calcsize(lengthPrefixFormat)
+
+    def __init__(self, duplicateHashes = False, encoding = None, cache = None):
+        """Initialize with the --duplicate-hashes flag and the encoding that
+        should be used to convert the payload for algorithms that require
+        string input.
+
+        If cache is not None, it must be a mkroesti.cache.HashCache object that
+        is used to avoid hashing repeated payloads more than once.
+        """
+        self.duplicateHashes = duplicateHashes
+        self.encoding = encoding
+        self.cache = cache
+        self.algorithmCache = dict()
+
+    def serve(self, inputFile, outputFile):
+        """Processes requests until the end of inputFile is reached.
+
+        Both arguments must be file objects in binary mode. Returns the number
+        of requests that were processed.
+
+        Raises MKRoestiError if inputFile ends in the middle of a request. Errors
+        that occur while processing a single request are reported to the client
+        in an error response.
+        """
+        requestCount = 0
+        while True:
+            specification = self.readFrame(inputFile)
+            if specification is None:
+                return requestCount
+            payload = self.readFrame(inputFile)
+            if payload is None:
+                raise MKRoestiError("Unexpected end of input: request has no payload")
+            try:
+                result = self.processRequest(specification.decode("utf-8"), payload)
+                status = STATUS_OK
+            except (MKRoestiError, UnknownAlgorithmError, UnavailableAlgorithmError,
+                    UnknownAliasError, UnavailableAliasError, ConversionError,
+                    UnicodeDecodeError) as errorInstance:
+                result = str(errorInstance)
+                status = STATUS_ERROR
+            self.writeFrame(outputFile, status.encode("utf-8"))
+            self.writeFrame(outputFile, result.encode("utf-8"))
+            outputFile.flush()
+            requestCount += 1
+
+    def processRequest(self, specification, payload):
+        """Returns the response text for a single request."""
+        lines = list()
+        for algorithm in self.getAlgorithms(specification):
+            algorithmName = algorithm.getName()
+            input = convertInput(payload, algorithm, self.encoding)
+            if self.cache is None:
+                hash = algorithm.getHash(input)
+            else:
+                hash = self.cache.getHash(algorithm, input)
+            # Some algorithms (e.g. crypt-blowfish) return binary data
+            if type(hash) is bytes:
+                hash = hash.decode("ascii")
+            source = algorithm.getProvider().getAlgorithmSource(algorithmName)
+            lines.append(algorithmName + "\t" + source + "\t" + hash + "\n")
+        return "".join(lines)
+
+    def getAlgorithms(self, specification):
+        """Returns the list of algorithm objects for the given algorithm
+        specification, creating the objects on first use.
+        """
+        if specification not in self.algorithmCache:
+            algorithms = list()
+            for name in specification.split(","):
+                algorithms.extend(factory.AlgorithmFactory.createAlgorithms(name, self.duplicateHashes))
+            self.algorithmCache[specification] = algorithms
+        return self.algorithmCache[specification]
+
+    @staticmethod
+    def readFrame(inputFile):
+        """Reads a frame from inputFile and returns its data.
+
+        Returns None if inputFile is at its end before the frame starts. Raises
+        MKRoestiError if inputFile ends in the middle of the frame.
+        """
+        lengthPrefix = StdioServer.readExactly(inputFile, StdioServer.lengthPrefixSize)
+        if len(lengthPrefix) == 0:
+            return None
+        if len(lengthPrefix) < StdioServer.lengthPrefixSize:
+            raise MKRoestiError("Unexpected end of input: incomplete frame length")
+        (length,) = struct.unpack(StdioServer.lengthPrefixFormat, lengthPrefix)
+        data = StdioServer.readExactly(inputFile, length)
+        if len(data) < length:
+            raise MKRoestiError("Unexpected end of input: incomplete frame data")
+        return data
+
+    @staticmethod
+    def writeFrame(outputFile, data):
+        """Writes data as a frame to outputFile."""
+        outputFile.write(struct.pack(StdioServer.lengthPrefixFormat, len(data)))
+        outputFile.write(data)
+
+    @staticmethod
+    def readExactly(inputFile, size):
+        """Reads size bytes from inputFile. Returns fewer bytes only if the end
+        of inputFile is reached.
+        """
+        chunks = list()
+        remaining = size
+        while remaining > 0:
+            chunk = inputFile.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
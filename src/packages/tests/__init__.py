@@ -19,6 +19,7 @@
 
 
 # PSL
+import sys
 import unittest
 
 # mkroesti
@@ -27,6 +28,19 @@ from tests import test_provider
 from tests import test_registry
 from tests import test_factory
 from tests import test_main
+from tests import test_csvhash
+from tests import test_stdioserver
+from tests import test_passwd
+from tests import test_cache
+from tests import test_sqlitestore
+from tests import test_digestindex
+from tests import test_identify
+from tests import test_execution
+# mkroesti.aio requires Python 3.5
+if sys.version_info >= (3, 5):
+    from tests import test_aio
+else:
+    test_aio = None
 
 
 def allTests():
@@ -42,4 +56,14 @@ def allTests():
     suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_registry))
     suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_factory))
     suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_main))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_csvhash))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_stdioserver))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_passwd))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_cache))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_sqlitestore))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_digestindex))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_identify))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_execution))
+    if test_aio is not None:
+        suite.addTests(unittest.defaultTestLoader.loadTestsFromModule(test_aio))
     return suite
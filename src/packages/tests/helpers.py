@@ -77,13 +77,13 @@ class TestProvider(AliasAbstractProvider):
 
     def getAlgorithmSource(self, algorithmName):
         if ALGORITHM_NAME_1 == algorithmName:
-            ALGORITHM_SOURCE_1
+            return ALGORITHM_SOURCE_1
         elif ALGORITHM_NAME_2 == algorithmName:
-            ALGORITHM_SOURCE_2
+            return ALGORITHM_SOURCE_2
         elif ALGORITHM_NAME_3 == algorithmName:
-            ALGORITHM_SOURCE_3
+            return ALGORITHM_SOURCE_3
         elif ALGORITHM_NAME_UNAVAILABLE == algorithmName:
-            ALGORITHM_SOURCE_UNAVAILABLE
+            return ALGORITHM_SOURCE_UNAVAILABLE
         else:
             raise ValueError("Unsupported algorithm name " + algorithmName)
 
@@ -0,0 +1,145 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.aio.py"""
+
+# PSL
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+import unittest
+
+# mkroesti
+from mkroesti import aio
+from mkroesti.algorithm import Base64Algorithms, CryptAlgorithm, HashlibAlgorithms, ZlibAlgorithms
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.names import ALGORITHM_BASE64, ALGORITHM_CRC32B, ALGORITHM_CRYPT_MD5, ALGORITHM_MD5, ALGORITHM_SHA_1
+from tests.test_execution import SleepingAlgorithm
+
+
+class ThreadRecordingAlgorithm(SleepingAlgorithm):
+    """Remembers the thread in which it generated the last hash."""
+
+    def getHash(self, input):
+        self.thread = threading.current_thread()
+        return SleepingAlgorithm.getHash(self, input)
+
+
+async def generateChunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class AioTest(unittest.TestCase):
+    """Exercise the coroutines in mkroesti.aio"""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = 2)
+
+    def tearDown(self):
+        self.executor.shutdown(wait = True)
+        if hasattr(self.loop, "shutdown_default_executor"):
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        self.loop.close()
+
+    def runCoroutine(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def testGetHash(self):
+        algorithm = HashlibAlgorithms(ALGORITHM_MD5, None)
+        self.assertEqual(self.runCoroutine(aio.getHash(algorithm, b"foo")), algorithm.getHash(b"foo"))
+        self.assertEqual(self.runCoroutine(aio.getHash(algorithm, b"foo", self.executor)), algorithm.getHash(b"foo"))
+        algorithm = Base64Algorithms(ALGORITHM_BASE64, None)
+        self.assertEqual(self.runCoroutine(aio.getHash(algorithm, b"foo")), algorithm.getHash(b"foo"))
+
+    def testExecutor(self):
+        # Cheap algorithms run in the event loop's thread, expensive ones are
+        # handed to the executor
+        cheapAlgorithm = ThreadRecordingAlgorithm("cheap", 0)
+        self.runCoroutine(aio.getHash(cheapAlgorithm, b"foo", self.executor))
+        self.assertTrue(cheapAlgorithm.thread is threading.current_thread())
+        expensiveAlgorithm = ThreadRecordingAlgorithm("expensive", 0.01)
+        self.runCoroutine(aio.getHash(expensiveAlgorithm, b"foo", self.executor))
+        self.assertFalse(expensiveAlgorithm.thread is threading.current_thread())
+
+    def testEventLoopNotBlocked(self):
+        ticks = list()
+        async def tick():
+            for index in range(5):
+                ticks.append(index)
+                await asyncio.sleep(0.01)
+        async def hashAndTick():
+            return await asyncio.gather(aio.getHash(SleepingAlgorithm("sleep", 0.2), b"foo", self.executor), tick())
+        (hash, ignored) = self.runCoroutine(hashAndTick())
+        self.assertEqual(hash, "sleep")
+        self.assertEqual(ticks, list(range(5)))
+
+    def testVerify(self):
+        algorithm = CryptAlgorithm(ALGORITHM_CRYPT_MD5, None)
+        storedHash = algorithm.getHash("foo")
+        self.assertTrue(self.runCoroutine(aio.verify(algorithm, "foo", storedHash, self.executor)))
+        self.assertFalse(self.runCoroutine(aio.verify(algorithm, "bar", storedHash, self.executor)))
+        algorithm = HashlibAlgorithms(ALGORITHM_MD5, None)
+        storedHash = algorithm.getHash(b"foo")
+        self.assertTrue(self.runCoroutine(aio.verify(algorithm, b"foo", storedHash)))
+        self.assertFalse(self.runCoroutine(aio.verify(algorithm, b"bar", storedHash)))
+
+    def testHashStream(self):
+        algorithms = [HashlibAlgorithms(ALGORITHM_MD5, None), ZlibAlgorithms(ALGORITHM_CRC32B, None),
+                      HashlibAlgorithms(ALGORITHM_SHA_1, None)]
+        # Small chunks are hashed in the event loop's thread, large chunks by
+        # the executor
+        for chunks in [[b"foo", b"bar", b"baz"], [b"x" * (1024 * 1024)] * 3, [b"x" * (1024 * 1024), b"y"], []]:
+            content = b"".join(chunks)
+            expectedHashes = [algorithm.getHash(content) for algorithm in algorithms]
+            hashes = self.runCoroutine(aio.hashStream(algorithms, generateChunks(chunks), self.executor))
+            self.assertEqual(hashes, expectedHashes)
+        self.assertEqual(hashes[0], hashlib.md5(b"").hexdigest())
+
+    def testHashStreamErrors(self):
+        algorithms = [Base64Algorithms(ALGORITHM_BASE64, None)]
+        self.assertRaises(MKRoestiError, self.runCoroutine, aio.hashStream(algorithms, generateChunks([b"foo"])))
+
+    def testCancellation(self):
+        receivedChunks = list()
+        async def generateEndlessly(chunk):
+            while True:
+                receivedChunks.append(chunk)
+                yield chunk
+        async def cancelHashStream(chunk):
+            algorithms = [HashlibAlgorithms(ALGORITHM_MD5, None)]
+            task = asyncio.ensure_future(aio.hashStream(algorithms, generateEndlessly(chunk), self.executor))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+        for chunk in [b"foo", b"x" * (1024 * 1024)]:
+            del receivedChunks[:]
+            self.assertTrue(self.runCoroutine(cancelHashStream(chunk)))
+            chunkCount = len(receivedChunks)
+            self.assertTrue(chunkCount > 0)
+            # No more chunks are requested after the cancellation
+            self.runCoroutine(asyncio.sleep(0.05))
+            self.assertEqual(len(receivedChunks), chunkCount)
@@ -21,10 +21,17 @@
 """Unit tests for mkroesti.algorithm.py"""
 
 # PSL
+import hmac
 import unittest
 
 # mkroesti
-from mkroesti.algorithm import AbstractAlgorithm
+from mkroesti.algorithm import AbstractAlgorithm, Base64Algorithms, CryptAlgorithm, HashlibAlgorithms, HmacAlgorithm
+from mkroesti.algorithm import PrefixAlgorithm, ZlibAlgorithms
+from mkroesti.algorithm import AlgorithmMetadata, compareHashes, getHashes, getMetadata
+from mkroesti.algorithm import availableModules
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.names import * #@UnusedWildImport
+from tests.helpers import TestAlgorithm, ALGORITHM_NAME_1, ALGORITHM_RESULT_1
 
 
 class AbstractAlgorithmTest(unittest.TestCase):
@@ -53,6 +60,282 @@ class AbstractAlgorithmTest(unittest.TestCase):
         self.assertRaises(NotImplementedError, algorithm.getHash, input)
         pass
 
+    def testGetHashes(self):
+        algorithm = AbstractAlgorithm()
+        self.assertEqual(algorithm.getHashes([]), [])
+        self.assertRaises(NotImplementedError, algorithm.getHashes, ["dummy-input"])
+        pass
+
+    def testIsDeterministic(self):
+        algorithm = AbstractAlgorithm()
+        self.assertEqual(algorithm.isDeterministic(), False)
+        pass
+
+    def testGetMetadata(self):
+        metadata = AbstractAlgorithm().getMetadata()
+        self.assertEqual(metadata.costEstimate, AlgorithmMetadata.defaultCostEstimate)
+        self.assertEqual(metadata.isDeterministic, False)
+        self.assertEqual(metadata.isStreamable, False)
+        self.assertEqual(metadata.releasesGil, False)
+        pass
+
+    def testGetMetadataFunction(self):
+        algorithm = HashlibAlgorithms(ALGORITHM_MD5, None)
+        self.assertEqual(getMetadata(algorithm).isDeterministic, True)
+        # Algorithm objects without getMetadata() are duck-typed
+        algorithm = TestAlgorithm(ALGORITHM_NAME_1)
+        self.assertEqual(getMetadata(algorithm).isDeterministic, False)
+        self.assertEqual(getMetadata(algorithm).costEstimate, AlgorithmMetadata.defaultCostEstimate)
+        algorithm.isDeterministic = lambda: True
+        self.assertEqual(getMetadata(algorithm).isDeterministic, True)
+        pass
+
+    def testMetadataOfConcreteClasses(self):
+        # (algorithm object, deterministic, streamable, releases GIL)
+        expectedTraits = [(HashlibAlgorithms(ALGORITHM_SHA_256, None), True, True, True),
+                          (ZlibAlgorithms(ALGORITHM_CRC32B, None), True, True, True),
+                          (Base64Algorithms(ALGORITHM_BASE64, None), True, False, False),
+                          (CryptAlgorithm(ALGORITHM_CRYPT_MD5, None), False, False, False)]
+        for (algorithm, isDeterministic, isStreamable, releasesGil) in expectedTraits:
+            metadata = algorithm.getMetadata()
+            self.assertEqual(metadata.isDeterministic, isDeterministic, algorithm.getName())
+            self.assertEqual(metadata.isStreamable, isStreamable, algorithm.getName())
+            self.assertEqual(metadata.releasesGil, releasesGil, algorithm.getName())
+            self.assertEqual(algorithm.isDeterministic(), isDeterministic, algorithm.getName())
+        # Salted crypt algorithms are orders of magnitude more expensive
+        self.assertTrue(CryptAlgorithm(ALGORITHM_CRYPT_SHA_512, None).getMetadata().costEstimate >
+                        100 * HashlibAlgorithms(ALGORITHM_SHA_512, None).getMetadata().costEstimate)
+        pass
+
+    def testVerify(self):
+        input = "dummy-input"
+        algorithm = AbstractAlgorithm()
+        self.assertRaises(NotImplementedError, algorithm.verify, input, "dummy-hash")
+        # The default implementation works for all deterministic algorithms
+        algorithm = HashlibAlgorithms(ALGORITHM_MD5, None)
+        self.assertTrue(algorithm.verify(b"foo", "acbd18db4cc2f85cedef654fccc4a4d8"))
+        self.assertTrue(algorithm.verify(b"foo", b"acbd18db4cc2f85cedef654fccc4a4d8"))
+        self.assertFalse(algorithm.verify(b"bar", "acbd18db4cc2f85cedef654fccc4a4d8"))
+        pass
+
+    def testGetHashesFunction(self):
+        inputs = [b"foo", b"bar"]
+        expectedHashes = ["acbd18db4cc2f85cedef654fccc4a4d8", "37b51d194a7513e45b56f6524f2d51f2"]
+        algorithm = HashlibAlgorithms(ALGORITHM_MD5, None)
+        self.assertEqual(getHashes(algorithm, inputs), expectedHashes)
+        self.assertEqual(getHashes(algorithm, iter(inputs)), expectedHashes)
+        # Algorithm objects without getHashes() are duck-typed
+        algorithm = TestAlgorithm(ALGORITHM_NAME_1)
+        self.assertEqual(getHashes(algorithm, ["foo", "bar"]), [ALGORITHM_RESULT_1, ALGORITHM_RESULT_1])
+        pass
+
+    def testCompareHashes(self):
+        self.assertTrue(compareHashes("foo", "foo"))
+        self.assertTrue(compareHashes("foo", b"foo"))
+        self.assertFalse(compareHashes("foo", "bar"))
+        self.assertFalse(compareHashes("foo", None))
+        self.assertFalse(compareHashes("foo", "fooαβγ"))
+        pass
+
+
+class CryptAlgorithmTest(unittest.TestCase):
+    """Exercise mkroesti.algorithm.CryptAlgorithm"""
+
+    def testVerify(self):
+        for algorithmName in (ALGORITHM_CRYPT_DES, ALGORITHM_CRYPT_MD5,
+                              ALGORITHM_CRYPT_SHA_256, ALGORITHM_CRYPT_SHA_512):
+            if not CryptAlgorithm.isAvailable(algorithmName):
+                continue
+            algorithm = CryptAlgorithm(algorithmName, None)
+            storedHash = algorithm.getHash("secret")
+            self.assertTrue(algorithm.verify("secret", storedHash), algorithmName)
+            self.assertFalse(algorithm.verify("wrong", storedHash), algorithmName)
+        pass
+
+    def testVerifyInvalidHash(self):
+        algorithm = CryptAlgorithm(ALGORITHM_CRYPT_MD5, None)
+        self.assertFalse(algorithm.verify("secret", ""))
+        self.assertFalse(algorithm.verify("secret", "$1$"))
+        pass
+
+
+class HashlibAlgorithmsTest(unittest.TestCase):
+    """Exercise mkroesti.algorithm.HashlibAlgorithms"""
+
+    def testGetHashes(self):
+        inputs = [b"", b"foo", b"x" * 1000]
+        for algorithmName in (ALGORITHM_MD5, ALGORITHM_SHA_1, ALGORITHM_SHA_256, ALGORITHM_SHA_512):
+            algorithm = HashlibAlgorithms(algorithmName, None)
+            expectedHashes = [algorithm.getHash(input) for input in inputs]
+            self.assertEqual(algorithm.getHashes(inputs), expectedHashes, algorithmName)
+            self.assertEqual(algorithm.getHashes(iter(inputs)), expectedHashes, algorithmName)
+        pass
+
+    def testCreateHashObject(self):
+        algorithm = HashlibAlgorithms(ALGORITHM_MD5, None)
+        hashObject = algorithm.createHashObject()
+        hashObject.update(b"foo")
+        self.assertEqual(hashObject.hexdigest(), "acbd18db4cc2f85cedef654fccc4a4d8")
+        self.assertEqual(HashlibAlgorithms("dummy-name", None).createHashObject(), None)
+        pass
+
+
+class Base64AlgorithmsTest(unittest.TestCase):
+    """Exercise mkroesti.algorithm.Base64Algorithms"""
+
+    def testEncodeMany(self):
+        inputs = [b"", b"f", b"fo", b"foo", b"foob", b"fooba", b"foobar", b"\xff" * 23]
+        for algorithmName in (ALGORITHM_BASE16, ALGORITHM_BASE32, ALGORITHM_BASE64):
+            algorithm = Base64Algorithms(algorithmName, None)
+            expectedHashes = [algorithm.getHash(input) for input in inputs]
+            self.assertEqual(algorithm.encodeMany(inputs), expectedHashes, algorithmName)
+            self.assertEqual(algorithm.encodeMany([]), [], algorithmName)
+            self.assertEqual(algorithm.getHashes(iter(inputs)), expectedHashes, algorithmName)
+        pass
+
+    def testEncodeManyBase32(self):
+        if "numpy" not in availableModules:
+            return
+        # Test vectors from RFC 4648
+        inputs = [b"", b"f", b"fo", b"foo", b"foob", b"fooba", b"foobar"]
+        expectedHashes = ["", "MY======", "MZXQ====", "MZXW6===", "MZXW6YQ=", "MZXW6YTB", "MZXW6YTBOI======"]
+        self.assertEqual(Base64Algorithms.encodeManyBase32(inputs), expectedHashes)
+        pass
+
+
+class ZlibAlgorithmsTest(unittest.TestCase):
+    """Exercise mkroesti.algorithm.ZlibAlgorithms"""
+
+    def testCreateHashObject(self):
+        for algorithmName in (ALGORITHM_CRC32B, ALGORITHM_ADLER32):
+            algorithm = ZlibAlgorithms(algorithmName, None)
+            hashObject = algorithm.createHashObject()
+            hashObject.update(b"foo")
+            copy = hashObject.copy()
+            hashObject.update(b"bar")
+            self.assertEqual(hashObject.hexdigest(), algorithm.getHash(b"foobar"), algorithmName)
+            self.assertEqual(copy.hexdigest(), algorithm.getHash(b"foo"), algorithmName)
+            self.assertEqual(len(copy.digest()), 4)
+        self.assertEqual(ZlibAlgorithms(ALGORITHM_CRC32, None).createHashObject(), None)
+        pass
+
+    def testPackInputs(self):
+        (buffer, offsets) = ZlibAlgorithms.packInputs([b"foo", b"", b"ba"])
+        self.assertEqual(buffer, b"fooba")
+        self.assertEqual(offsets, [0, 3, 3, 5])
+        (buffer, offsets) = ZlibAlgorithms.packInputs([])
+        self.assertEqual(buffer, b"")
+        self.assertEqual(offsets, [0])
+        pass
+
+    def testGetChecksums(self):
+        inputs = [b"foo", b"", b"bar", b"\x00" * 100, b"x" * 10000]
+        (buffer, offsets) = ZlibAlgorithms.packInputs(inputs)
+        for algorithmName in (ALGORITHM_ADLER32, ALGORITHM_CRC32B):
+            algorithm = ZlibAlgorithms(algorithmName, None)
+            expectedHashes = [algorithm.getHash(input) for input in inputs]
+            checksums = algorithm.getChecksums(buffer, offsets)
+            self.assertEqual(len(checksums), len(inputs))
+            self.assertEqual(ZlibAlgorithms.formatChecksums(checksums), expectedHashes)
+            self.assertEqual(algorithm.getHashes(inputs), expectedHashes)
+            # Empty batch
+            checksums = algorithm.getChecksums(b"", [0])
+            self.assertEqual(ZlibAlgorithms.formatChecksums(checksums), [])
+        pass
+
+    def testGetChecksumsNumpy(self):
+        if "numpy" not in availableModules:
+            return
+        import numpy
+        inputs = [b"foo", b"bar"]
+        (buffer, offsets) = ZlibAlgorithms.packInputs(inputs)
+        algorithm = ZlibAlgorithms(ALGORITHM_CRC32B, None)
+        checksums = algorithm.getChecksums(memoryview(buffer), numpy.array(offsets))
+        self.assertEqual(checksums.dtype, numpy.uint32)
+        self.assertEqual(ZlibAlgorithms.formatChecksums(checksums),
+                         [algorithm.getHash(input) for input in inputs])
+        pass
+
+
+class HmacAlgorithmTest(unittest.TestCase):
+    """Exercise mkroesti.algorithm.HmacAlgorithm"""
+
+    def testGetHash(self):
+        # Keys shorter than, equal to, and longer than the block size
+        keys = [b"key", b"k" * 64, b"k" * 200]
+        for algorithmName in (ALGORITHM_MD5, ALGORITHM_SHA_1, ALGORITHM_SHA_256, ALGORITHM_SHA_512):
+            algorithm = HashlibAlgorithms(algorithmName, None)
+            digestName = algorithm.createHashObject().name
+            for key in keys:
+                hmacAlgorithm = HmacAlgorithm(algorithm, key)
+                for message in (b"", b"msg", b"m" * 1000):
+                    self.assertEqual(hmacAlgorithm.getHash(message), hmac.new(key, message, digestName).hexdigest())
+        pass
+
+    def testCreateHashObject(self):
+        algorithm = HmacAlgorithm(HashlibAlgorithms(ALGORITHM_SHA_256, None), b"key")
+        hashObject = algorithm.createHashObject()
+        hashObject.update(b"foo")
+        copy = hashObject.copy()
+        hashObject.update(b"bar")
+        self.assertEqual(hashObject.hexdigest(), algorithm.getHash(b"foobar"))
+        self.assertEqual(copy.hexdigest(), algorithm.getHash(b"foo"))
+        # The states of the algorithm object are not modified
+        self.assertEqual(algorithm.createHashObject().hexdigest(), algorithm.getHash(b""))
+        pass
+
+    def testGetMetadata(self):
+        wrappedAlgorithm = HashlibAlgorithms(ALGORITHM_SHA_256, None)
+        metadata = HmacAlgorithm(wrappedAlgorithm, b"key").getMetadata()
+        self.assertEqual(metadata.costEstimate, 2 * wrappedAlgorithm.getMetadata().costEstimate)
+        self.assertEqual(metadata.isDeterministic, True)
+        self.assertEqual(metadata.releasesGil, True)
+        pass
+
+    def testGetHashes(self):
+        algorithm = HmacAlgorithm(HashlibAlgorithms(ALGORITHM_SHA_256, None), b"key")
+        inputs = [b"foo", b"bar", b"foo"]
+        self.assertEqual(algorithm.getHashes(iter(inputs)), [algorithm.getHash(input) for input in inputs])
+        pass
+
+    def testName(self):
+        algorithm = HmacAlgorithm(HashlibAlgorithms(ALGORITHM_SHA_256, "dummy-provider"), b"key")
+        self.assertEqual(algorithm.getName(), "hmac-" + ALGORITHM_SHA_256)
+        self.assertEqual(algorithm.getProvider(), "dummy-provider")
+        self.assertEqual(algorithm.isDeterministic(), True)
+        pass
+
+    def testUnsupportedAlgorithm(self):
+        for algorithm in (ZlibAlgorithms(ALGORITHM_CRC32B, None), CryptAlgorithm(ALGORITHM_CRYPT_MD5, None),
+                          HashlibAlgorithms("dummy-name", None), TestAlgorithm(ALGORITHM_NAME_1)):
+            self.assertFalse(HmacAlgorithm.isSupported(algorithm))
+            self.assertRaises(MKRoestiError, HmacAlgorithm, algorithm, b"key")
+        pass
+
+
+class PrefixAlgorithmTest(unittest.TestCase):
+    """Exercise mkroesti.algorithm.PrefixAlgorithm"""
+
+    def testGetHash(self):
+        prefix = b"p" * 1000
+        inputs = [b"", b"foo", b"bar"]
+        # Algorithms with and without createHashObject()
+        for algorithm in (HashlibAlgorithms(ALGORITHM_SHA_256, None), ZlibAlgorithms(ALGORITHM_CRC32B, None),
+                          Base64Algorithms(ALGORITHM_BASE64, None)):
+            prefixAlgorithm = PrefixAlgorithm(algorithm, prefix)
+            expectedHashes = [algorithm.getHash(prefix + input) for input in inputs]
+            self.assertEqual([prefixAlgorithm.getHash(input) for input in inputs], expectedHashes)
+            self.assertEqual(prefixAlgorithm.getHashes(iter(inputs)), expectedHashes)
+            self.assertEqual(prefixAlgorithm.getName(), algorithm.getName())
+            self.assertEqual(prefixAlgorithm.isDeterministic(), True)
+        pass
+
+    def testUnsupportedAlgorithm(self):
+        algorithm = CryptAlgorithm(ALGORITHM_CRYPT_MD5, None)
+        self.assertFalse(PrefixAlgorithm.isSupported(algorithm))
+        self.assertRaises(MKRoestiError, PrefixAlgorithm, algorithm, b"prefix")
+        pass
+
 
 #class FooAlgorithmTest(unittest.TestCase):
 #    """Exercise bla bla"""
@@ -0,0 +1,120 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.cache.py"""
+
+# PSL
+import unittest
+
+# mkroesti
+from mkroesti.algorithm import HashlibAlgorithms, CryptAlgorithm
+from mkroesti.cache import HashCache
+from mkroesti.names import ALGORITHM_MD5, ALGORITHM_SHA_1, ALGORITHM_CRYPT_MD5
+from tests.helpers import TestAlgorithm, ALGORITHM_NAME_1, ALGORITHM_RESULT_1
+
+
+class CountingAlgorithm(HashlibAlgorithms):
+    """Counts how many times getHash() is invoked."""
+
+    def __init__(self, algorithmName, provider = None):
+        HashlibAlgorithms.__init__(self, algorithmName, provider)
+        self.numberOfCalls = 0
+
+    def getHash(self, input):
+        self.numberOfCalls += 1
+        return HashlibAlgorithms.getHash(self, input)
+
+    def getHashes(self, inputs):
+        self.numberOfCalls += len(inputs)
+        return HashlibAlgorithms.getHashes(self, inputs)
+
+
+class HashCacheTest(unittest.TestCase):
+    """Exercise mkroesti.cache.HashCache"""
+
+    def testHitsAndMisses(self):
+        cache = HashCache(10)
+        algorithm = CountingAlgorithm(ALGORITHM_MD5)
+        for input in [b"foo", b"", b"foo", b"foo", b""]:
+            self.assertEqual(cache.getHash(algorithm, input), HashlibAlgorithms(ALGORITHM_MD5, None).getHash(input))
+        self.assertEqual(algorithm.numberOfCalls, 2)
+        self.assertEqual(cache.getStatistics(), (3, 2))
+
+    def testKeyIncludesAlgorithm(self):
+        cache = HashCache(10)
+        md5 = CountingAlgorithm(ALGORITHM_MD5)
+        sha1 = CountingAlgorithm(ALGORITHM_SHA_1)
+        self.assertNotEqual(cache.getHash(md5, b"foo"), cache.getHash(sha1, b"foo"))
+        # Same algorithm name, but different provider
+        otherMd5 = CountingAlgorithm(ALGORITHM_MD5, "other-provider")
+        cache.getHash(otherMd5, b"foo")
+        self.assertEqual(cache.getStatistics(), (0, 3))
+
+    def testLongInput(self):
+        cache = HashCache(10)
+        algorithm = CountingAlgorithm(ALGORITHM_MD5)
+        longInput = b"x" * (HashCache.shortInputLength + 1)
+        otherLongInput = b"y" * (HashCache.shortInputLength + 1)
+        cache.getHash(algorithm, longInput)
+        cache.getHash(algorithm, longInput)
+        cache.getHash(algorithm, otherLongInput)
+        self.assertEqual(cache.getStatistics(), (1, 2))
+
+    def testLeastRecentlyUsed(self):
+        cache = HashCache(2)
+        algorithm = CountingAlgorithm(ALGORITHM_MD5)
+        cache.getHash(algorithm, b"a")
+        cache.getHash(algorithm, b"b")
+        cache.getHash(algorithm, b"a")   # "b" is now least recently used
+        cache.getHash(algorithm, b"c")   # discards "b"
+        cache.getHash(algorithm, b"a")
+        self.assertEqual(cache.getStatistics(), (2, 3))
+        cache.getHash(algorithm, b"b")
+        self.assertEqual(cache.getStatistics(), (2, 4))
+
+    def testSaltedAlgorithmsAreNotCached(self):
+        cache = HashCache(10)
+        algorithm = CryptAlgorithm(ALGORITHM_CRYPT_MD5, None)
+        # Salted hashes must differ even for the same input
+        self.assertNotEqual(cache.getHash(algorithm, "foo"), cache.getHash(algorithm, "foo"))
+        # Algorithms that do not implement isDeterministic() are not cached
+        cache.getHash(TestAlgorithm(ALGORITHM_NAME_1), "foo")
+        cache.getHash(TestAlgorithm(ALGORITHM_NAME_1), "foo")
+        self.assertEqual(cache.getStatistics(), (0, 0))
+
+    def testGetHashes(self):
+        cache = HashCache(10)
+        algorithm = CountingAlgorithm(ALGORITHM_MD5)
+        cache.getHash(algorithm, b"foo")
+        inputs = [b"foo", b"bar", b"", b"bar"]
+        expectedHashes = [HashlibAlgorithms(ALGORITHM_MD5, None).getHash(input) for input in inputs]
+        self.assertEqual(cache.getHashes(algorithm, inputs), expectedHashes)
+        # The second b"bar" is a hit and is not hashed again
+        self.assertEqual(cache.getStatistics(), (2, 3))
+        self.assertEqual(algorithm.numberOfCalls, 3)
+        self.assertEqual(cache.getHashes(algorithm, iter(inputs)), expectedHashes)
+        self.assertEqual(cache.getStatistics(), (6, 3))
+        # Algorithms that are not cacheable are hashed without the cache
+        self.assertEqual(cache.getHashes(TestAlgorithm(ALGORITHM_NAME_1), ["foo"]), [ALGORITHM_RESULT_1])
+        self.assertEqual(cache.getStatistics(), (6, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
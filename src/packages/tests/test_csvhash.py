@@ -0,0 +1,93 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.csvhash.py"""
+
+# PSL
+import unittest
+import io
+
+# mkroesti
+from mkroesti.algorithm import HashlibAlgorithms
+from mkroesti.csvhash import CsvColumnHasher
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.names import ALGORITHM_MD5, ALGORITHM_SHA_1
+
+
+class CsvColumnHasherTest(unittest.TestCase):
+    """Exercise mkroesti.csvhash.CsvColumnHasher"""
+
+    def setUp(self):
+        self.md5 = HashlibAlgorithms(ALGORITHM_MD5, None)
+        self.sha1 = HashlibAlgorithms(ALGORITHM_SHA_1, None)
+        self.csvInput = "id,name,mail\n1,foo,foo@example.com\n2,bar,bar@example.com\n3,foo\n"
+        self.md5Foo = "acbd18db4cc2f85cedef654fccc4a4d8"
+        self.md5Bar = "37b51d194a7513e45b56f6524f2d51f2"
+        self.sha1Foo = "0beec7b5ea3f0fdbc95d0dd47f3c5bc275da8a33"
+        self.sha1Bar = "62cdb7020ff920e5aa642c3d4066950dd1f01f4d"
+
+    def process(self, hasher, csvInput):
+        outputFile = io.StringIO()
+        rowCount = hasher.process(io.StringIO(csvInput), outputFile)
+        return (rowCount, outputFile.getvalue().splitlines())
+
+    def testReplace(self):
+        # Use a chunk size that does not evenly divide the number of rows
+        hasher = CsvColumnHasher([self.md5], ["name"], encoding = "utf-8", chunkSize = 2)
+        (rowCount, lines) = self.process(hasher, self.csvInput)
+        self.assertEqual(rowCount, 3)
+        self.assertEqual(lines, ["id,name,mail",
+                                 "1," + self.md5Foo + ",foo@example.com",
+                                 "2," + self.md5Bar + ",bar@example.com",
+                                 "3," + self.md5Foo])
+
+    def testAppend(self):
+        hasher = CsvColumnHasher([self.md5, self.sha1], ["name"], append = True, encoding = "utf-8")
+        (rowCount, lines) = self.process(hasher, self.csvInput)
+        self.assertEqual(rowCount, 3)
+        self.assertEqual(lines, ["id,name,mail,name-md5,name-sha-1",
+                                 "1,foo,foo@example.com," + self.md5Foo + "," + self.sha1Foo,
+                                 "2,bar,bar@example.com," + self.md5Bar + "," + self.sha1Bar,
+                                 "3,foo,," + self.md5Foo + "," + self.sha1Foo])
+
+    def testDelimiter(self):
+        hasher = CsvColumnHasher([self.md5], ["name"], encoding = "utf-8", delimiter = "\t")
+        (rowCount, lines) = self.process(hasher, "id\tname\n1\tfoo\n")
+        self.assertEqual(rowCount, 1)
+        self.assertEqual(lines, ["id\tname", "1\t" + self.md5Foo])
+
+    def testEmptyInput(self):
+        hasher = CsvColumnHasher([self.md5], ["name"], encoding = "utf-8")
+        self.assertEqual(self.process(hasher, ""), (0, []))
+
+    def testUnknownColumn(self):
+        hasher = CsvColumnHasher([self.md5], ["unknown"], encoding = "utf-8")
+        self.assertRaises(MKRoestiError, self.process, hasher, self.csvInput)
+
+    def testInvalidArguments(self):
+        # Replacing values requires exactly 1 algorithm
+        self.assertRaises(MKRoestiError, CsvColumnHasher, [self.md5, self.sha1], ["name"])
+        self.assertRaises(MKRoestiError, CsvColumnHasher, [], ["name"])
+        self.assertRaises(MKRoestiError, CsvColumnHasher, [self.md5], [])
+        self.assertRaises(MKRoestiError, CsvColumnHasher, [self.md5], ["name"], chunkSize = 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.digestindex.py"""
+
+# PSL
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+# mkroesti
+from mkroesti.digestindex import DigestIndex, buildIndex, headerSize
+from mkroesti.errorhandling import MKRoestiError
+
+
+class DigestIndexTest(unittest.TestCase):
+    """Exercise mkroesti.digestindex.DigestIndex and buildIndex()"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "digests.idx")
+        self.digests = [hashlib.sha256(str(i).encode("ascii")).hexdigest() for i in range(1000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testBuildAndLookup(self):
+        # Use a run size that does not evenly divide the number of digests,
+        # and add duplicates
+        count = buildIndex(self.digests + self.digests[:10], self.fileName, runSize = 300)
+        self.assertEqual(count, len(self.digests))
+        self.assertEqual(os.path.getsize(self.fileName), headerSize + 32 * len(self.digests))
+        index = DigestIndex(self.fileName)
+        try:
+            self.assertEqual(index.getWidth(), 32)
+            self.assertEqual(index.getCount(), len(self.digests))
+            for digest in self.digests:
+                self.assertTrue(index.containsHex(digest), digest)
+                self.assertTrue(index.containsHex(digest.upper()), digest)
+            for i in range(1000):
+                self.assertFalse(index.containsHex(hashlib.sha256(("x" + str(i)).encode("ascii")).hexdigest()))
+            # Records are sorted
+            records = [index.getRecord(i) for i in range(index.getCount())]
+            self.assertEqual(records, sorted(records))
+            # Hashes that cannot be checked
+            self.assertEqual(index.containsHex("acbd18db4cc2f85cedef654fccc4a4d8"), None)
+            self.assertEqual(index.containsHex("z" * 64), None)
+        finally:
+            index.close()
+
+    def testNonUniformDigests(self):
+        # Interpolation search must also work if digests are not uniformly
+        # distributed
+        digests = ["%016x" % (i ** 4) for i in range(2000)]
+        buildIndex(digests, self.fileName)
+        index = DigestIndex(self.fileName)
+        try:
+            for digest in digests:
+                self.assertTrue(index.containsHex(digest), digest)
+            self.assertFalse(index.containsHex("%016x" % 2))
+            self.assertFalse(index.containsHex("f" * 16))
+        finally:
+            index.close()
+
+    def testInvalidDigests(self):
+        self.assertRaises(MKRoestiError, buildIndex, [], self.fileName)
+        self.assertRaises(MKRoestiError, buildIndex, ["xyz"], self.fileName)
+        self.assertRaises(MKRoestiError, buildIndex, [self.digests[0], "acbd18db4cc2f85cedef654fccc4a4d8"], self.fileName)
+
+    def testInvalidIndex(self):
+        file = open(self.fileName, "wb")
+        file.write(b"not an index, but long enough for a header")
+        file.close()
+        self.assertRaises(MKRoestiError, DigestIndex, self.fileName)
+        self.assertRaises(MKRoestiError, DigestIndex, os.path.join(self.directory, "no-such-file"))
+
+
+if __name__ == "__main__":
+    unittest.main()
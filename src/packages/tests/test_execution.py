@@ -0,0 +1,302 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.execution.py"""
+
+# PSL
+import io
+import time
+import unittest
+
+# mkroesti
+from mkroesti import execution
+from mkroesti import factory
+from mkroesti.algorithm import AbstractAlgorithm, AlgorithmMetadata, Base64Algorithms, CryptAlgorithm
+from mkroesti.algorithm import HashlibAlgorithms, HmacAlgorithm, PrefixAlgorithm, ZlibAlgorithms
+from mkroesti.cache import HashCache
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.execution import ProcessPoolBackend, executeAlgorithms, getAlgorithmSpec, hashStream, isStreamable
+from mkroesti.execution import ReorderBuffer, iterateAlgorithms, scheduleAlgorithms
+from mkroesti.main import registerProviders
+from mkroesti.names import ALGORITHM_MD5, ALGORITHM_SHA_1, ALGORITHM_SHA_256, ALGORITHM_SHA_512
+from mkroesti.names import ALGORITHM_ADLER32, ALGORITHM_BASE64, ALGORITHM_CRC32B
+from mkroesti.names import ALGORITHM_CRYPT_MD5, ALGORITHM_CRYPT_SHA_256, ALGORITHM_CRYPT_SHA_512
+from mkroesti.registry import ProviderRegistry
+from tests.helpers import TestAlgorithm, ALGORITHM_NAME_1, ALGORITHM_RESULT_1
+
+
+class SleepingAlgorithm(AbstractAlgorithm):
+    """Pretends to be an expensive algorithm that releases the GIL."""
+
+    def __init__(self, algorithmName, seconds):
+        AbstractAlgorithm.__init__(self, algorithmName, None)
+        self.seconds = seconds
+
+    def needBytesInput(self):
+        return True
+
+    def getMetadata(self):
+        return AlgorithmMetadata(self.seconds * 1000, True, releasesGil = True)
+
+    def getHash(self, input):
+        time.sleep(self.seconds)
+        return self.getName()
+
+
+class ExecuteAlgorithmsTest(unittest.TestCase):
+    """Exercise mkroesti.execution.executeAlgorithms()"""
+
+    def setUp(self):
+        self.algorithms = [HashlibAlgorithms(ALGORITHM_MD5, None), TestAlgorithm(ALGORITHM_NAME_1),
+                           HashlibAlgorithms(ALGORITHM_SHA_1, None), ZlibAlgorithms(ALGORITHM_CRC32B, None),
+                           HashlibAlgorithms(ALGORITHM_SHA_256, None)]
+        self.preparedInputs = [("foo", b"foo"), ("", b""), ("x" * 100000, b"x" * 100000), ("foo", b"foo")]
+
+    def expectedHashes(self):
+        hashesByAlgorithm = list()
+        for algorithm in self.algorithms:
+            if algorithm.needBytesInput():
+                hashesByAlgorithm.append([algorithm.getHash(inputAsBytes) for (inputAsStr, inputAsBytes) in self.preparedInputs])
+            else:
+                hashesByAlgorithm.append([algorithm.getHash(inputAsStr) for (inputAsStr, inputAsBytes) in self.preparedInputs])
+        return hashesByAlgorithm
+
+    def testSequential(self):
+        self.assertEqual(executeAlgorithms(self.algorithms, self.preparedInputs), self.expectedHashes())
+
+    def testJobsKeepOrder(self):
+        expected = self.expectedHashes()
+        for jobs in [2, 4, 16]:
+            self.assertEqual(executeAlgorithms(self.algorithms, self.preparedInputs, jobs), expected)
+
+    def testInputVariant(self):
+        hashesByAlgorithm = executeAlgorithms(self.algorithms, self.preparedInputs, 4)
+        self.assertEqual(hashesByAlgorithm[1], [ALGORITHM_RESULT_1] * len(self.preparedInputs))
+
+    def testNoAlgorithms(self):
+        self.assertEqual(executeAlgorithms([], self.preparedInputs, 4), [])
+
+    def testExpensiveAlgorithmsRunConcurrently(self):
+        algorithms = [HashlibAlgorithms(ALGORITHM_MD5, None), SleepingAlgorithm("sleep-1", 0.2),
+                      HashlibAlgorithms(ALGORITHM_SHA_1, None), SleepingAlgorithm("sleep-2", 0.2),
+                      SleepingAlgorithm("sleep-3", 0.2)]
+        preparedInputs = [("foo", b"foo")]
+        startTime = time.time()
+        hashesByAlgorithm = executeAlgorithms(algorithms, preparedInputs, 3)
+        # Sequential execution would take 0.6 seconds
+        self.assertTrue(time.time() - startTime < 0.45)
+        self.assertEqual(hashesByAlgorithm, [[algorithm.getHash(b"foo")] for algorithm in algorithms])
+
+    def testSharedCache(self):
+        cache = HashCache(100)
+        expected = self.expectedHashes()
+        self.assertEqual(executeAlgorithms(self.algorithms, self.preparedInputs, 4, cache), expected)
+        # TestAlgorithm is not cacheable, the 4 other algorithms are; "foo"
+        # occurs twice in each batch
+        self.assertEqual(cache.getStatistics(), (4, 12))
+        self.assertEqual(executeAlgorithms(self.algorithms, self.preparedInputs, 4, cache), expected)
+        self.assertEqual(cache.getStatistics(), (20, 12))
+
+
+class IterateAlgorithmsTest(unittest.TestCase):
+    """Exercise mkroesti.execution.iterateAlgorithms()"""
+
+    def setUp(self):
+        self.algorithms = [SleepingAlgorithm("sleep-long", 0.3), HashlibAlgorithms(ALGORITHM_MD5, None),
+                           SleepingAlgorithm("sleep-short", 0.05)]
+        self.preparedInputs = [("foo", b"foo")]
+
+    def testOrdered(self):
+        results = list(iterateAlgorithms(self.algorithms, self.preparedInputs, 2))
+        self.assertEqual(results, [(index, [algorithm.getHash(b"foo")]) for (index, algorithm) in enumerate(self.algorithms)])
+
+    def testUnordered(self):
+        startTime = time.time()
+        results = iterateAlgorithms(self.algorithms, self.preparedInputs, 2, ordered = False)
+        # The cheap algorithm runs in the calling thread while the expensive
+        # algorithms are running, and is not held back by them
+        (index, hashes) = next(results)
+        self.assertEqual(index, 1)
+        self.assertTrue(time.time() - startTime < 0.2)
+        self.assertEqual([index for (index, hashes) in results], [2, 0])
+
+    def testSequentialIsOrdered(self):
+        results = list(iterateAlgorithms(self.algorithms, self.preparedInputs, 1, ordered = False))
+        self.assertEqual([index for (index, hashes) in results], [0, 1, 2])
+
+    def testClose(self):
+        algorithms = [SleepingAlgorithm("sleep-%d" % index, 0.1) for index in range(6)]
+        startTime = time.time()
+        results = iterateAlgorithms(algorithms, self.preparedInputs, 2)
+        next(results)
+        # Algorithms that have not been started yet are cancelled
+        results.close()
+        self.assertTrue(time.time() - startTime < 0.45)
+
+
+class ReorderBufferTest(unittest.TestCase):
+    """Exercise mkroesti.execution.ReorderBuffer"""
+
+    def testOrdered(self):
+        reorderBuffer = ReorderBuffer()
+        self.assertEqual(reorderBuffer.add(2, "c"), [])
+        self.assertEqual(reorderBuffer.add(1, "b"), [])
+        self.assertEqual(reorderBuffer.add(0, "a"), [(0, "a"), (1, "b"), (2, "c")])
+        self.assertEqual(reorderBuffer.add(3, "d"), [(3, "d")])
+
+    def testUnordered(self):
+        reorderBuffer = ReorderBuffer(False)
+        self.assertEqual(reorderBuffer.add(2, "c"), [(2, "c")])
+        self.assertEqual(reorderBuffer.add(0, "a"), [(0, "a")])
+
+
+class FailingHashObject:
+    """Hash object that fails on the second update()."""
+
+    def __init__(self):
+        self.updateCount = 0
+
+    def update(self, data):
+        self.updateCount += 1
+        if self.updateCount > 1:
+            raise ValueError("update failed")
+
+
+class HashStreamTest(unittest.TestCase):
+    """Exercise mkroesti.execution.hashStream()"""
+
+    def setUp(self):
+        sha256 = HashlibAlgorithms(ALGORITHM_SHA_256, None)
+        self.algorithms = [HashlibAlgorithms(ALGORITHM_MD5, None), HashlibAlgorithms(ALGORITHM_SHA_512, None),
+                           ZlibAlgorithms(ALGORITHM_CRC32B, None), ZlibAlgorithms(ALGORITHM_ADLER32, None),
+                           HmacAlgorithm(sha256, b"key"), PrefixAlgorithm(sha256, b"prefix")]
+        self.content = b"".join([str(i).encode("ascii") for i in range(10000)])
+
+    def testSameHashes(self):
+        expectedHashes = [algorithm.getHash(self.content) for algorithm in self.algorithms]
+        # Small chunks and queues force the reader to wait for the consumers
+        for (chunkSize, queueSize) in [(None, None), (7, 1), (1000, 2), (len(self.content) + 1, 1)]:
+            hashes = hashStream(self.algorithms, io.BytesIO(self.content), chunkSize, queueSize)
+            self.assertEqual(hashes, expectedHashes)
+
+    def testEmptyInput(self):
+        hashes = hashStream(self.algorithms, io.BytesIO(b""))
+        self.assertEqual(hashes, [algorithm.getHash(b"") for algorithm in self.algorithms])
+
+    def testIsStreamable(self):
+        for algorithm in self.algorithms:
+            self.assertTrue(isStreamable(algorithm), algorithm.getName())
+        self.assertFalse(isStreamable(Base64Algorithms(ALGORITHM_BASE64, None)))
+        self.assertFalse(isStreamable(CryptAlgorithm(ALGORITHM_CRYPT_MD5, None)))
+        self.assertFalse(isStreamable(TestAlgorithm(ALGORITHM_NAME_1)))
+
+    def testErrors(self):
+        self.assertRaises(MKRoestiError, hashStream, [Base64Algorithms(ALGORITHM_BASE64, None)], io.BytesIO(b"foo"))
+        self.assertRaises(MKRoestiError, hashStream, self.algorithms, io.BytesIO(b"foo"), 0)
+        # An error in a consumer thread is raised after the entire input has
+        # been read, without blocking the reader
+        algorithm = HashlibAlgorithms(ALGORITHM_MD5, None)
+        algorithm.createHashObject = FailingHashObject
+        self.assertRaises(ValueError, hashStream, [algorithm], io.BytesIO(self.content), 10, 1)
+
+
+class ScheduleAlgorithmsTest(unittest.TestCase):
+    """Exercise mkroesti.execution.scheduleAlgorithms()"""
+
+    def testExpensiveFirst(self):
+        algorithms = [HashlibAlgorithms(ALGORITHM_MD5, None), CryptAlgorithm(ALGORITHM_CRYPT_SHA_512, None),
+                      CryptAlgorithm(ALGORITHM_CRYPT_MD5, None), CryptAlgorithm(ALGORITHM_CRYPT_SHA_256, None)]
+        (expensiveIndexes, cheapIndexes) = scheduleAlgorithms(algorithms, [("foo", b"foo")])
+        self.assertEqual(expensiveIndexes, [3, 1])
+        self.assertEqual(cheapIndexes, [0, 2])
+        # Many inputs make crypt-md5 expensive, too
+        (expensiveIndexes, cheapIndexes) = scheduleAlgorithms(algorithms, [("foo", b"foo")] * 100)
+        self.assertEqual(expensiveIndexes, [3, 1, 2])
+        self.assertEqual(cheapIndexes, [0])
+
+    def testLargeInput(self):
+        # Cheap algorithms become expensive if the input is large
+        algorithms = [ZlibAlgorithms(ALGORITHM_CRC32B, None), HashlibAlgorithms(ALGORITHM_MD5, None)]
+        largeInput = b"x" * (1024 * 1024)
+        (expensiveIndexes, cheapIndexes) = scheduleAlgorithms(algorithms, [(None, largeInput)])
+        self.assertEqual(expensiveIndexes, [1, 0])
+        self.assertEqual(cheapIndexes, [])
+
+
+class ProcessPoolBackendTest(unittest.TestCase):
+    """Exercise mkroesti.execution.ProcessPoolBackend"""
+
+    def setUp(self):
+        registerProviders(["mkroesti.provider"])
+        self.algorithms = list()
+        for algorithmName in [ALGORITHM_MD5, ALGORITHM_CRC32B, ALGORITHM_CRYPT_MD5]:
+            self.algorithms.extend(factory.AlgorithmFactory.createAlgorithms(algorithmName))
+        self.algorithms.append(PrefixAlgorithm(HashlibAlgorithms(ALGORITHM_SHA_1, self.algorithms[0].getProvider()), b"prefix"))
+        self.preparedInputs = [("foo", b"foo"), ("", b""), ("bar", b"bar"), ("foo", b"foo")]
+        self.backend = ProcessPoolBackend(2, chunkSize = 3)
+        # Send all algorithms to the worker processes, even if they are cheap
+        self.inlineCostThreshold = execution.inlineCostThreshold
+        execution.inlineCostThreshold = 0.0
+
+    def tearDown(self):
+        execution.inlineCostThreshold = self.inlineCostThreshold
+        self.backend.close()
+        ProviderRegistry.deleteInstance()
+
+    def testGetAlgorithmSpec(self):
+        self.assertEqual(getAlgorithmSpec(self.algorithms[0]), (ALGORITHM_MD5, "hashlib"))
+        # Wrapped algorithms and algorithms without provider cannot be
+        # re-created in a worker process
+        self.assertEqual(getAlgorithmSpec(self.algorithms[3]), None)
+        self.assertEqual(getAlgorithmSpec(TestAlgorithm(ALGORITHM_NAME_1)), None)
+
+    def testSameHashes(self):
+        hashesByAlgorithm = executeAlgorithms(self.algorithms, self.preparedInputs, backend = self.backend)
+        expected = executeAlgorithms(self.algorithms, self.preparedInputs)
+        self.assertEqual(hashesByAlgorithm[0], expected[0])
+        self.assertEqual(hashesByAlgorithm[1], expected[1])
+        self.assertEqual(hashesByAlgorithm[3], expected[3])
+        # crypt-md5 is salted, so the hashes can only be verified
+        for ((inputAsStr, inputAsBytes), hash) in zip(self.preparedInputs, hashesByAlgorithm[2]):
+            self.assertTrue(self.algorithms[2].verify(inputAsStr, hash))
+
+    def testSharedInput(self):
+        largeInput = b"x" * (ProcessPoolBackend.sharedMemoryThreshold + 1)
+        preparedInputs = [("foo", b"foo"), (largeInput.decode("ascii"), largeInput)]
+        # Only the first two algorithms, crypt-md5 would be too slow
+        algorithms = self.algorithms[:2]
+        hashesByAlgorithm = executeAlgorithms(algorithms, preparedInputs, backend = self.backend)
+        self.assertEqual(hashesByAlgorithm, executeAlgorithms(algorithms, preparedInputs))
+        # Both algorithms use the same shared memory block
+        self.assertEqual(len(self.backend.sharedInputs), 1)
+
+    def testCache(self):
+        cache = HashCache(100)
+        executeAlgorithms(self.algorithms[:2], self.preparedInputs, cache = cache, backend = self.backend)
+        executeAlgorithms(self.algorithms[:2], self.preparedInputs, cache = cache, backend = self.backend)
+        self.assertEqual(cache.getStatistics(), (10, 6))
+
+    def testInvalidArguments(self):
+        self.assertRaises(MKRoestiError, ProcessPoolBackend, 0)
+        self.assertRaises(MKRoestiError, ProcessPoolBackend, 1, chunkSize = 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
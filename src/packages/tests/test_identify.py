@@ -0,0 +1,103 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.identify.py"""
+
+# PSL
+import unittest
+
+# mkroesti
+from mkroesti.algorithm import Base64Algorithms, CryptAlgorithm, HashlibAlgorithms, ZlibAlgorithms
+from mkroesti.identify import AlgorithmIdentifier, OutputShape, getOutputShape
+from mkroesti.names import * #@UnusedWildImport
+from tests.helpers import TestAlgorithm, ALGORITHM_NAME_1, ALGORITHM_RESULT_1
+
+
+class CountingAlgorithm(HashlibAlgorithms):
+    """Counts how many times getHash() is invoked."""
+
+    def __init__(self, algorithmName, provider = None):
+        HashlibAlgorithms.__init__(self, algorithmName, provider)
+        self.numberOfCalls = 0
+
+    def getHash(self, input):
+        self.numberOfCalls += 1
+        return HashlibAlgorithms.getHash(self, input)
+
+
+class OutputShapeTest(unittest.TestCase):
+    """Exercise mkroesti.identify.OutputShape"""
+
+    def testMatches(self):
+        shape = getOutputShape(ALGORITHM_MD5, 0)
+        self.assertTrue(shape.matches("acbd18db4cc2f85cedef654fccc4a4d8"))
+        self.assertTrue(shape.matches("ACBD18DB4CC2F85CEDEF654FCCC4A4D8"))
+        self.assertFalse(shape.matches("acbd18db4cc2f85cedef654fccc4a4d"))
+        self.assertFalse(shape.matches("xcbd18db4cc2f85cedef654fccc4a4d8"))
+        shape = getOutputShape(ALGORITHM_BASE64, 3)
+        self.assertTrue(shape.matches("Zm9v"))
+        self.assertFalse(shape.matches("Zm9vYg=="))
+        shape = getOutputShape(ALGORITHM_CRYPT_BLOWFISH, 0)
+        self.assertTrue(shape.matches("$2b$12$abc"))
+        self.assertFalse(shape.matches("$1$abc"))
+        self.assertEqual(getOutputShape("dummy-name", 0), None)
+        self.assertTrue(OutputShape().matches("anything"))
+
+
+class AlgorithmIdentifierTest(unittest.TestCase):
+    """Exercise mkroesti.identify.AlgorithmIdentifier"""
+
+    def setUp(self):
+        self.md5 = CountingAlgorithm(ALGORITHM_MD5)
+        self.sha1 = CountingAlgorithm(ALGORITHM_SHA_1)
+        self.sha256 = CountingAlgorithm(ALGORITHM_SHA_256)
+        self.crc32b = ZlibAlgorithms(ALGORITHM_CRC32B, None)
+        self.adler32 = ZlibAlgorithms(ALGORITHM_ADLER32, None)
+        self.base64 = Base64Algorithms(ALGORITHM_BASE64, None)
+        self.cryptMd5 = CryptAlgorithm(ALGORITHM_CRYPT_MD5, None)
+        self.unknown = TestAlgorithm(ALGORITHM_NAME_1)
+        self.identifier = AlgorithmIdentifier([self.md5, self.sha1, self.sha256, self.crc32b, self.adler32,
+                                               self.base64, self.cryptMd5, self.unknown], "utf-8")
+
+    def testCandidates(self):
+        # Algorithms with an unknown shape are always candidates
+        self.assertEqual(self.identifier.getCandidates("foo", "acbd18db4cc2f85cedef654fccc4a4d8"), [self.md5, self.unknown])
+        self.assertEqual(self.identifier.getCandidates("foo", "8c736521"), [self.crc32b, self.adler32, self.unknown])
+        self.assertEqual(self.identifier.getCandidates("foo", "Zm9v"), [self.base64, self.unknown])
+        self.assertEqual(self.identifier.getCandidates("foo", "$1$salt$hash"), [self.cryptMd5, self.unknown])
+
+    def testIdentify(self):
+        self.assertEqual(self.identifier.identify("foo", "acbd18db4cc2f85cedef654fccc4a4d8"), [self.md5])
+        self.assertEqual(self.identifier.identify(b"foo", "ACBD18DB4CC2F85CEDEF654FCCC4A4D8"), [self.md5])
+        # Only the candidate was computed
+        self.assertEqual((self.md5.numberOfCalls, self.sha1.numberOfCalls, self.sha256.numberOfCalls), (2, 0, 0))
+        self.assertEqual(self.identifier.identify("foo", "8c736521"), [self.crc32b])
+        self.assertEqual(self.identifier.identify("foo", "Zm9v"), [self.base64])
+        self.assertEqual(self.identifier.identify("foo", ALGORITHM_RESULT_1), [self.unknown])
+        self.assertEqual(self.identifier.identify("bar", "acbd18db4cc2f85cedef654fccc4a4d8"), [])
+
+    def testIdentifySalted(self):
+        storedHash = self.cryptMd5.getHash("foo")
+        self.assertEqual(self.identifier.identify("foo", storedHash), [self.cryptMd5])
+        self.assertEqual(self.identifier.identify("bar", storedHash), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -25,10 +25,12 @@ import unittest
 import sys
 import tempfile
 import os
+import shutil
+import sqlite3
 
 # mkroesti
 from mkroesti.algorithm import AbstractAlgorithm
-from mkroesti.errorhandling import ConversionError
+from mkroesti.errorhandling import ConversionError, MKRoestiError
 from mkroesti.main import main
 from mkroesti.provider import AbstractProvider
 from mkroesti.registry import ProviderRegistry
@@ -52,6 +54,8 @@ class StandardOutputReplacement():
             self.stdoutBuffer = messageString
         else:
             self.stdoutBuffer = self.stdoutBuffer + messageString
+    def flush(self):
+        pass
     def getStdoutBuffer(self):
         """Return current content of string buffer, or None if nothing has been output yet to sys.stdout."""
         return self.stdoutBuffer
@@ -123,6 +127,64 @@ class MainTest(unittest.TestCase):
         actualHash = self.stdoutReplacement.getStdoutBuffer().strip()
         self.assertEqual(actualHash, self.hashExpectedOutput[encoding])
 
+    def testBatchModeMultipleInputs(self):
+        """Exercise the --batch option with more than one input"""
+
+        encoding = "utf-8"
+        otherInput = "bar"
+        args = ["-a", self.hashAlgorithmName, "-b", self.hashInput, otherInput, "-c", encoding]
+        returnValue = main(args)
+        self.assertEqual(returnValue, None)
+        outputLines = self.stdoutReplacement.getStdoutBuffer().splitlines()
+        self.assertEqual(outputLines, [self.hashInput + ": " + self.hashExpectedOutput[encoding],
+                                       otherInput + ": 37b51d194a7513e45b56f6524f2d51f2"])
+
+    def testCache(self):
+        """Exercise the --cache option"""
+
+        encoding = "utf-8"
+        args = ["-a", self.hashAlgorithmName, "-b", self.hashInput, "bar", self.hashInput, "-c", encoding, "--cache", "10"]
+        returnValue = main(args)
+        self.assertEqual(returnValue, None)
+        outputLines = self.stdoutReplacement.getStdoutBuffer().splitlines()
+        self.assertEqual(outputLines[0], outputLines[2])
+        self.assertTrue("1 hits, 2 misses" in self.stderrReplacement.getStdoutBuffer())
+
+    def testJobs(self):
+        """Exercise the --jobs option in batch mode"""
+
+        args = ["-a", "md5,sha-1,sha-256,crc32b", "-b", self.hashInput, "bar"]
+        main(args)
+        expectedOutput = self.stdoutReplacement.getStdoutBuffer()
+        returnValue = main(args + ["-j", "4"])
+        self.assertEqual(returnValue, None)
+        # The second run appends the same lines to the buffer
+        self.assertEqual(self.stdoutReplacement.getStdoutBuffer(), expectedOutput * 2)
+
+    def testProcesses(self):
+        """Exercise the --processes option in batch mode"""
+
+        args = ["-a", "md5,sha-1,crc32b", "-b", self.hashInput, "bar"]
+        main(args)
+        expectedOutput = self.stdoutReplacement.getStdoutBuffer()
+        returnValue = main(args + ["-j", "2", "--processes", "--chunk-size", "1"])
+        self.assertEqual(returnValue, None)
+        self.assertEqual(self.stdoutReplacement.getStdoutBuffer(), expectedOutput * 2)
+        self.assertRaises(SystemExit, main, ["-l", "--processes"])
+
+    def testUnordered(self):
+        """Exercise the --unordered option in batch mode"""
+
+        args = ["-a", "md5,sha-1,crc32b", "-b", self.hashInput, "bar"]
+        main(args)
+        expectedOutput = self.stdoutReplacement.getStdoutBuffer()
+        returnValue = main(args + ["-j", "2", "--unordered"])
+        self.assertEqual(returnValue, None)
+        unorderedOutput = self.stdoutReplacement.getStdoutBuffer()[len(expectedOutput):]
+        self.assertNotEqual(unorderedOutput, expectedOutput)
+        self.assertEqual(sorted(unorderedOutput.splitlines()), sorted(expectedOutput.splitlines()))
+        self.assertRaises(SystemExit, main, args + ["--unordered", "--sqlite", "foo.db"])
+
     def testListMode(self):
         """Exercise the --list option"""
 
@@ -171,6 +233,153 @@ class MainTest(unittest.TestCase):
         # Cleanup
         os.remove(absPathName)
 
+    def testStreamFile(self):
+        """Exercise the --file option together with --jobs"""
+
+        (fileHandle, absPathName) = tempfile.mkstemp()
+        os.write(fileHandle, b"x" * 100000)
+        os.close(fileHandle)
+        # All algorithms can hash a stream
+        args = ["-a", "md5,sha-1,crc32b", "-f", absPathName]
+        main(args)
+        expectedOutput = self.stdoutReplacement.getStdoutBuffer()
+        main(args + ["-j", "2"])
+        self.assertEqual(self.stdoutReplacement.getStdoutBuffer(), expectedOutput * 2)
+        # base64 cannot hash a stream, the file is read at once
+        outputLength = len(self.stdoutReplacement.getStdoutBuffer())
+        args = ["-a", "md5,base64", "-f", absPathName]
+        main(args)
+        expectedOutput = self.stdoutReplacement.getStdoutBuffer()[outputLength:]
+        main(args + ["-j", "2"])
+        self.assertEqual(self.stdoutReplacement.getStdoutBuffer()[outputLength:], expectedOutput * 2)
+        # Cleanup
+        os.remove(absPathName)
+
+    def testCsvMode(self):
+        """Exercise the --csv option"""
+
+        # This test is not relevant for Python 2.6 because there CSV mode is
+        # not supported
+        if not mkroesti.python2:
+            encoding = "utf-8"
+            (fileHandle, absPathName) = tempfile.mkstemp()
+            os.write(fileHandle, ("id,input\n1," + self.hashInput + "\n").encode(encoding))
+            os.close(fileHandle)
+            args = ["-a", self.hashAlgorithmName, "-c", encoding, "--csv", "input", "--csv-append", "-f", absPathName]
+            returnValue = main(args)
+            self.assertEqual(returnValue, None)
+            outputLines = self.stdoutReplacement.getStdoutBuffer().splitlines()
+            self.assertEqual(outputLines, ["id,input,input-" + self.hashAlgorithmName,
+                                           "1," + self.hashInput + "," + self.hashExpectedOutput[encoding]])
+            # Cleanup
+            os.remove(absPathName)
+
+    def testSqliteOutput(self):
+        """Exercise the --sqlite option"""
+
+        encoding = "utf-8"
+        directory = tempfile.mkdtemp()
+        fileName = os.path.join(directory, "hashes.db")
+        args = ["-a", self.hashAlgorithmName, "-b", self.hashInput, "-c", encoding, "--sqlite", fileName]
+        returnValue = main(args)
+        self.assertEqual(returnValue, None)
+        self.assertFalse(self.stdoutReplacement.getStdoutBuffer())
+        connection = sqlite3.connect(fileName)
+        try:
+            rows = connection.execute("SELECT input, algorithm, hash FROM hashes").fetchall()
+        finally:
+            connection.close()
+        self.assertEqual(rows, [(self.hashInput, self.hashAlgorithmName, self.hashExpectedOutput[encoding])])
+        # Cleanup
+        shutil.rmtree(directory)
+
+    def testHmacKeyFile(self):
+        """Exercise the --hmac-key-file option"""
+
+        (fileHandle, absPathName) = tempfile.mkstemp()
+        os.write(fileHandle, b"key")
+        os.close(fileHandle)
+        args = ["-a", "sha-256,crc32b", "-b", "msg", "--hmac-key-file", absPathName]
+        returnValue = main(args)
+        self.assertEqual(returnValue, None)
+        # crc32b cannot be used with a key and is skipped, so only one hash is
+        # printed
+        outputLines = self.stdoutReplacement.getStdoutBuffer().splitlines()
+        self.assertEqual(outputLines, ["2d93cbc1be167bcb1637a4a23cbff01a7878f0c50ee833954ea5221bb1b8c628"])
+        args = ["-a", "crc32b", "-b", "msg", "--hmac-key-file", absPathName]
+        self.assertRaises(MKRoestiError, main, args)
+        # Cleanup
+        os.remove(absPathName)
+
+    def testHmacKeyFd(self):
+        """Exercise the --hmac-key-fd option"""
+
+        (readFd, writeFd) = os.pipe()
+        os.write(writeFd, b"key")
+        os.close(writeFd)
+        args = ["-a", "sha-256", "-b", "msg", "--hmac-key-fd", str(readFd)]
+        try:
+            returnValue = main(args)
+        finally:
+            os.close(readFd)
+        self.assertEqual(returnValue, None)
+        outputLines = self.stdoutReplacement.getStdoutBuffer().splitlines()
+        self.assertEqual(outputLines, ["2d93cbc1be167bcb1637a4a23cbff01a7878f0c50ee833954ea5221bb1b8c628"])
+
+    def testPrefixFile(self):
+        """Exercise the --prefix-file option"""
+
+        (fileHandle, absPathName) = tempfile.mkstemp()
+        os.write(fileHandle, b"foo")
+        os.close(fileHandle)
+        args = ["-a", "md5", "-b", "bar", "--prefix-file", absPathName]
+        returnValue = main(args)
+        self.assertEqual(returnValue, None)
+        outputLines = self.stdoutReplacement.getStdoutBuffer().splitlines()
+        # md5("foobar")
+        self.assertEqual(outputLines, ["3858f62230ac3c915f300c664312c63f"])
+        args = ["-a", "md5", "-b", "bar", "--prefix-file", absPathName, "--hmac-key-file", absPathName]
+        self.assertRaises(SystemExit, main, args)
+        # Cleanup
+        os.remove(absPathName)
+
+    def testDigestIndex(self):
+        """Exercise the --build-index and --check-index options"""
+
+        # This test is not relevant for Python 2.6 because there index build
+        # mode is not supported
+        if not mkroesti.python2:
+            directory = tempfile.mkdtemp()
+            digestsFileName = os.path.join(directory, "digests.txt")
+            indexFileName = os.path.join(directory, "digests.idx")
+            digestsFile = open(digestsFileName, "w")
+            # md5("foo") in the format of md5sum
+            digestsFile.write("acbd18db4cc2f85cedef654fccc4a4d8  foo.txt\n\n")
+            digestsFile.close()
+            args = ["--build-index", indexFileName, "-f", digestsFileName]
+            returnValue = main(args)
+            self.assertEqual(returnValue, None)
+            # Hashes of a different width (sha-1) are not printed
+            args = ["-a", "md5,sha-1", "-b", "foo", "bar", "--check-index", indexFileName]
+            returnValue = main(args)
+            self.assertEqual(returnValue, None)
+            outputLines = self.stdoutReplacement.getStdoutBuffer().splitlines()
+            self.assertEqual(outputLines, ["foo: md5: acbd18db4cc2f85cedef654fccc4a4d8: found",
+                                           "bar: md5: 37b51d194a7513e45b56f6524f2d51f2: not found"])
+            # Cleanup
+            shutil.rmtree(directory)
+
+    def testIdentify(self):
+        """Exercise the --identify option"""
+
+        args = ["-a", "md5,sha-1,crc32b", "-b", "foo", "--identify", "acbd18db4cc2f85cedef654fccc4a4d8"]
+        returnValue = main(args)
+        self.assertEqual(returnValue, None)
+        outputLines = self.stdoutReplacement.getStdoutBuffer().splitlines()
+        self.assertEqual(outputLines, ["md5"])
+        args = ["-a", "md5", "-b", "foo", "bar", "--identify", "acbd18db4cc2f85cedef654fccc4a4d8"]
+        self.assertRaises(SystemExit, main, args)
+
     def testProviderModule(self):
         """Exercise the --providers option"""
 
@@ -0,0 +1,124 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.passwd.py"""
+
+# PSL
+import unittest
+import crypt
+import io
+
+# mkroesti
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.main import registerProviders
+from mkroesti.names import * #@UnusedWildImport
+from mkroesti.passwd import (PasswordFileGenerator, FORMAT_HTPASSWD, FORMAT_SHADOW,
+                             identifyCryptAlgorithm, verifyPasswords)
+from mkroesti.registry import ProviderRegistry
+
+
+class PasswordFileGeneratorTest(unittest.TestCase):
+    """Exercise mkroesti.passwd.PasswordFileGenerator"""
+
+    def setUp(self):
+        registerProviders(["mkroesti.provider"])
+        self.records = [("user" + str(i), "password:" + str(i)) for i in range(10)]
+
+    def tearDown(self):
+        ProviderRegistry.deleteInstance()
+
+    def assertLines(self, lines, fieldCount):
+        self.assertEqual(len(lines), len(self.records))
+        for (line, (user, password)) in zip(lines, self.records):
+            fields = line.split(":")
+            self.assertEqual(len(fields), fieldCount)
+            self.assertEqual(fields[0], user)
+            self.assertEqual(fields[1][:3], "$1$")
+            self.assertEqual(crypt.crypt(password, fields[1]), fields[1])
+
+    def testHtpasswd(self):
+        generator = PasswordFileGenerator(ALGORITHM_CRYPT_MD5, FORMAT_HTPASSWD, chunkSize = 3)
+        self.assertLines(list(generator.generate(self.records)), 2)
+
+    def testShadow(self):
+        generator = PasswordFileGenerator(ALGORITHM_CRYPT_MD5, FORMAT_SHADOW)
+        lines = list(generator.generate(self.records))
+        self.assertLines(lines, 9)
+        self.assertEqual(lines[0].split(":", 2)[2], str(generator.lastChange) + ":0:99999:7:::")
+
+    def testWorkerProcesses(self):
+        # Lines must be generated in the order of the records
+        generator = PasswordFileGenerator(ALGORITHM_CRYPT_MD5, jobs = 2, chunkSize = 4)
+        self.assertLines(list(generator.generate(self.records)), 2)
+
+    def testProcess(self):
+        generator = PasswordFileGenerator(ALGORITHM_CRYPT_MD5)
+        inputFile = io.StringIO("\n".join([user + ":" + password for (user, password) in self.records]) + "\n\n")
+        outputFile = io.StringIO()
+        self.assertEqual(generator.process(inputFile, outputFile), len(self.records))
+        self.assertLines(outputFile.getvalue().splitlines(), 2)
+
+    def testReadRecords(self):
+        inputFile = io.StringIO("foo:bar\r\n\nbaz:a:b\n")
+        self.assertEqual(list(PasswordFileGenerator.readRecords(inputFile)), [("foo", "bar"), ("baz", "a:b")])
+        inputFile = io.StringIO("foo\n")
+        self.assertRaises(MKRoestiError, list, PasswordFileGenerator.readRecords(inputFile))
+
+    def testInvalidArguments(self):
+        self.assertRaises(MKRoestiError, PasswordFileGenerator, ALGORITHM_MD5)
+        self.assertRaises(MKRoestiError, PasswordFileGenerator, ALGORITHM_CRYPT_MD5, "foo")
+        self.assertRaises(MKRoestiError, PasswordFileGenerator, ALGORITHM_CRYPT_MD5, jobs = 0)
+        self.assertRaises(MKRoestiError, PasswordFileGenerator, ALGORITHM_CRYPT_MD5, chunkSize = 0)
+
+
+class VerifyPasswordsTest(unittest.TestCase):
+    """Exercise mkroesti.passwd.verifyPasswords()"""
+
+    def setUp(self):
+        registerProviders(["mkroesti.provider"])
+        hashes = [line.split(":", 1)[1] for line in PasswordFileGenerator(ALGORITHM_CRYPT_MD5).generate([("user", "secret")] * 5)]
+        # Alternate between correct and wrong passwords
+        self.records = [(("secret", "wrong")[i % 2], hashes[i]) for i in range(len(hashes))]
+        self.expectedResults = [(i % 2) == 0 for i in range(len(hashes))]
+
+    def tearDown(self):
+        ProviderRegistry.deleteInstance()
+
+    def testVerifyPasswords(self):
+        self.assertEqual(list(verifyPasswords(self.records, chunkSize = 2)), self.expectedResults)
+
+    def testWorkerProcesses(self):
+        self.assertEqual(list(verifyPasswords(self.records, jobs = 2, chunkSize = 2)), self.expectedResults)
+
+    def testUnidentifiedHash(self):
+        self.assertEqual(list(verifyPasswords([("secret", "not-a-crypt-hash")])), [False])
+
+    def testIdentifyCryptAlgorithm(self):
+        self.assertEqual(identifyCryptAlgorithm("$1$abcdefgh$0123456789012345678901"), ALGORITHM_CRYPT_MD5)
+        self.assertEqual(identifyCryptAlgorithm("$5$salt$hash"), ALGORITHM_CRYPT_SHA_256)
+        self.assertEqual(identifyCryptAlgorithm("$6$salt$hash"), ALGORITHM_CRYPT_SHA_512)
+        self.assertEqual(identifyCryptAlgorithm("$apr1$salt$hash"), ALGORITHM_CRYPT_APR1)
+        self.assertEqual(identifyCryptAlgorithm("$2b$12$hash"), ALGORITHM_CRYPT_BLOWFISH)
+        self.assertEqual(identifyCryptAlgorithm("abJnggxhB/yWI"), ALGORITHM_CRYPT_DES)
+        self.assertEqual(identifyCryptAlgorithm("acbd18db4cc2f85cedef654fccc4a4d8"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.sqlitestore.py"""
+
+# PSL
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+# mkroesti
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.sqlitestore import SqliteResultStore
+
+
+class SqliteResultStoreTest(unittest.TestCase):
+    """Exercise mkroesti.sqlitestore.SqliteResultStore"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "hashes.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def query(self, statement):
+        connection = sqlite3.connect(self.fileName)
+        try:
+            return connection.execute(statement).fetchall()
+        finally:
+            connection.close()
+
+    def testStore(self):
+        # Use a batch size that does not evenly divide the number of rows
+        store = SqliteResultStore(self.fileName, batchSize = 2, transactionSize = 2)
+        store.addResult("foo", "md5", "hashlib", "acbd18db4cc2f85cedef654fccc4a4d8")
+        store.addResults([("bar", "md5", "hashlib", "37b51d194a7513e45b56f6524f2d51f2"),
+                          ("foo", "sha1", "hashlib", "0beec7b5ea3f0fdbc95d0dd47f3c5bc275da8a33")])
+        self.assertEqual(store.close(), 3)
+        rows = self.query("SELECT input, algorithm, source, hash FROM hashes ORDER BY rowid")
+        self.assertEqual(rows, [("foo", "md5", "hashlib", "acbd18db4cc2f85cedef654fccc4a4d8"),
+                                ("bar", "md5", "hashlib", "37b51d194a7513e45b56f6524f2d51f2"),
+                                ("foo", "sha1", "hashlib", "0beec7b5ea3f0fdbc95d0dd47f3c5bc275da8a33")])
+        self.assertEqual(self.query("PRAGMA journal_mode"), [("wal",)])
+
+    def testIndexesAreBuiltOnClose(self):
+        store = SqliteResultStore(self.fileName)
+        store.addResult("foo", "md5", "hashlib", "acbd18db4cc2f85cedef654fccc4a4d8")
+        self.assertEqual(self.query("SELECT name FROM sqlite_master WHERE type = 'index'"), [])
+        store.close()
+        indexNames = [row[0] for row in self.query("SELECT name FROM sqlite_master WHERE type = 'index' ORDER BY name")]
+        self.assertEqual(indexNames, ["hashes_hash", "hashes_input"])
+        # Rows from a previous run are kept
+        store = SqliteResultStore(self.fileName)
+        store.addResult("bar", "md5", "hashlib", "37b51d194a7513e45b56f6524f2d51f2")
+        store.close()
+        self.assertEqual(self.query("SELECT COUNT(*) FROM hashes"), [(2,)])
+
+    def testInvalidSizes(self):
+        self.assertRaises(MKRoestiError, SqliteResultStore, self.fileName, 0)
+        self.assertRaises(MKRoestiError, SqliteResultStore, self.fileName, 10, 5)
+
+    def testCannotOpen(self):
+        fileName = os.path.join(self.directory, "no-such-directory", "hashes.db")
+        self.assertRaises(MKRoestiError, SqliteResultStore, fileName)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# encoding=utf-8
+
+# Copyright 2009 Patrick Näf
+# 
+# This file is part of mkroesti
+#
+# mkroesti is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mkroesti is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mkroesti. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for mkroesti.stdioserver.py"""
+
+# PSL
+import unittest
+import io
+import struct
+
+# mkroesti
+from mkroesti.errorhandling import MKRoestiError
+from mkroesti.registry import ProviderRegistry
+from mkroesti.stdioserver import StdioServer, STATUS_OK, STATUS_ERROR
+import mkroesti
+from tests.helpers import * #@UnusedWildImport
+
+
+class StdioServerTest(unittest.TestCase):
+    """Exercise mkroesti.stdioserver.StdioServer"""
+
+    def setUp(self):
+        self.provider = TestProvider({ALIAS_NAME_1 : [ALGORITHM_NAME_1, ALGORITHM_NAME_2],
+                                      None : [ALGORITHM_NAME_UNAVAILABLE]})
+        mkroesti.registerProvider(self.provider)
+        self.server = StdioServer(encoding = "utf-8")
+
+    def tearDown(self):
+        ProviderRegistry.deleteInstance()
+
+    def frame(self, data):
+        return struct.pack(">I", len(data)) + data
+
+    def request(self, specification, payload):
+        return self.frame(specification.encode("utf-8")) + self.frame(payload)
+
+    def readResponses(self, outputFile):
+        outputFile.seek(0)
+        responses = list()
+        while True:
+            status = StdioServer.readFrame(outputFile)
+            if status is None:
+                return responses
+            result = StdioServer.readFrame(outputFile)
+            responses.append((status.decode("utf-8"), result.decode("utf-8")))
+
+    def testServe(self):
+        inputFile = io.BytesIO(self.request(ALGORITHM_NAME_1, b"foo") +
+                               self.request(ALIAS_NAME_1, b"bar") +
+                               self.request(ALGORITHM_NAME_1, b"baz"))
+        outputFile = io.BytesIO()
+        self.assertEqual(self.server.serve(inputFile, outputFile), 3)
+        responses = self.readResponses(outputFile)
+        line1 = ALGORITHM_NAME_1 + "\t" + ALGORITHM_SOURCE_1 + "\t" + ALGORITHM_RESULT_1 + "\n"
+        line2 = ALGORITHM_NAME_2 + "\t" + ALGORITHM_SOURCE_2 + "\t" + ALGORITHM_RESULT_2 + "\n"
+        self.assertEqual(responses[0], (STATUS_OK, line1))
+        self.assertEqual(responses[1][0], STATUS_OK)
+        self.assertEqual(sorted(responses[1][1].splitlines(True)), sorted([line1, line2]))
+        self.assertEqual(responses[2], (STATUS_OK, line1))
+        # Algorithm objects are reused for the same specification
+        self.assertEqual(len(self.server.algorithmCache), 2)
+
+    def testErrorResponse(self):
+        # An error does not terminate the server
+        inputFile = io.BytesIO(self.request(ALGORITHM_NAME_UNKNOWN, b"foo") +
+                               self.request(ALGORITHM_NAME_UNAVAILABLE, b"foo") +
+                               self.request(ALGORITHM_NAME_1, b"foo"))
+        outputFile = io.BytesIO()
+        self.assertEqual(self.server.serve(inputFile, outputFile), 3)
+        statuses = [status for (status, result) in self.readResponses(outputFile)]
+        self.assertEqual(statuses, [STATUS_ERROR, STATUS_ERROR, STATUS_OK])
+
+    def testEmptyInput(self):
+        outputFile = io.BytesIO()
+        self.assertEqual(self.server.serve(io.BytesIO(), outputFile), 0)
+        self.assertEqual(outputFile.getvalue(), b"")
+
+    def testTruncatedInput(self):
+        request = self.request(ALGORITHM_NAME_1, b"foo")
+        # Request without payload
+        inputFile = io.BytesIO(self.frame(ALGORITHM_NAME_1.encode("utf-8")))
+        self.assertRaises(MKRoestiError, self.server.serve, inputFile, io.BytesIO())
+        # Incomplete length prefix, incomplete frame data
+        for truncatedLength in (2, len(request) - 1):
+            inputFile = io.BytesIO(request[:truncatedLength])
+            self.assertRaises(MKRoestiError, self.server.serve, inputFile, io.BytesIO())
+
+
+if __name__ == "__main__":
+    unittest.main()